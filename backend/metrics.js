@@ -0,0 +1,162 @@
+// Minimal metrics registry for the backend, rendered in the Prometheus text format.
+// Python-side metrics arrive as JSON snapshots ({ metrics: [...] }) in the same shape
+// as this registry's own snapshot, so both go through one renderer.
+
+const DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120];
+
+function labelKey(labels) {
+  return JSON.stringify(Object.keys(labels).sort().map((name) => [name, labels[name]]));
+}
+
+class Counter {
+  constructor(name, help, type = "counter") {
+    this.name = name;
+    this.help = help;
+    this.type = type;
+    this.values = new Map();
+  }
+
+  inc(labels = {}, amount = 1) {
+    const key = labelKey(labels);
+    const entry = this.values.get(key);
+    if (entry) {
+      entry.value += amount;
+    } else {
+      this.values.set(key, { labels, value: amount });
+    }
+  }
+
+  set(labels = {}, value) {
+    this.values.set(labelKey(labels), { labels, value });
+  }
+
+  snapshot() {
+    return { name: this.name, type: this.type, help: this.help, samples: [...this.values.values()] };
+  }
+}
+
+class Histogram {
+  constructor(name, help, buckets = DEFAULT_BUCKETS) {
+    this.name = name;
+    this.help = help;
+    this.type = "histogram";
+    this.buckets = buckets;
+    this.series = new Map();
+  }
+
+  observe(labels = {}, value) {
+    const key = labelKey(labels);
+    let series = this.series.get(key);
+    if (!series) {
+      series = { labels, counts: new Array(this.buckets.length).fill(0), count: 0, sum: 0 };
+      this.series.set(key, series);
+    }
+    const index = this.buckets.findIndex((bound) => value <= bound);
+    if (index !== -1) {
+      series.counts[index] += 1;
+    }
+    series.count += 1;
+    series.sum += value;
+  }
+
+  snapshot() {
+    const samples = [...this.series.values()].map((series) => {
+      let cumulative = 0;
+      const buckets = this.buckets.map((bound, i) => {
+        cumulative += series.counts[i];
+        return [bound, cumulative];
+      });
+      return { labels: series.labels, buckets, count: series.count, sum: series.sum };
+    });
+    return { name: this.name, type: this.type, help: this.help, samples };
+  }
+}
+
+export class MetricsRegistry {
+  constructor() {
+    this.metrics = new Map();
+  }
+
+  register(metric) {
+    if (!this.metrics.has(metric.name)) {
+      this.metrics.set(metric.name, metric);
+    }
+    return this.metrics.get(metric.name);
+  }
+
+  counter(name, help) {
+    return this.register(new Counter(name, help));
+  }
+
+  gauge(name, help) {
+    return this.register(new Counter(name, help, "gauge"));
+  }
+
+  histogram(name, help, buckets) {
+    return this.register(new Histogram(name, help, buckets));
+  }
+
+  snapshot() {
+    return { metrics: [...this.metrics.values()].map((metric) => metric.snapshot()) };
+  }
+}
+
+function escapeLabelValue(value) {
+  return String(value).replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, '\\"');
+}
+
+function formatLabels(labels, extra = null) {
+  const pairs = Object.entries(labels || {});
+  if (extra) {
+    pairs.push(extra);
+  }
+  if (pairs.length === 0) {
+    return "";
+  }
+  return `{${pairs.map(([name, value]) => `${name}="${escapeLabelValue(value)}"`).join(",")}}`;
+}
+
+function formatNumber(value) {
+  if (value === Infinity) return "+Inf";
+  if (value === -Infinity) return "-Inf";
+  return Number.isFinite(value) ? String(value) : "NaN";
+}
+
+/**
+ * Render metric snapshots in the Prometheus text exposition format
+ * @param {Array<Object>} snapshots - { metrics: [...] } objects (backend registry, Python server)
+ * @returns {string}
+ */
+export function renderPrometheus(snapshots) {
+  const lines = [];
+  const seen = new Set();
+  for (const snapshot of snapshots) {
+    for (const metric of (snapshot && snapshot.metrics) || []) {
+      // A name may only be declared once per exposition
+      if (seen.has(metric.name)) {
+        continue;
+      }
+      seen.add(metric.name);
+      lines.push(`# HELP ${metric.name} ${metric.help}`);
+      lines.push(`# TYPE ${metric.name} ${metric.type}`);
+      for (const sample of metric.samples) {
+        if (metric.type === "histogram") {
+          for (const [bound, count] of sample.buckets) {
+            lines.push(`${metric.name}_bucket${formatLabels(sample.labels, ["le", formatNumber(bound)])} ${count}`);
+          }
+          lines.push(`${metric.name}_bucket${formatLabels(sample.labels, ["le", "+Inf"])} ${sample.count}`);
+          lines.push(`${metric.name}_sum${formatLabels(sample.labels)} ${formatNumber(sample.sum)}`);
+          lines.push(`${metric.name}_count${formatLabels(sample.labels)} ${sample.count}`);
+        } else {
+          lines.push(`${metric.name}${formatLabels(sample.labels)} ${formatNumber(sample.value)}`);
+        }
+      }
+    }
+  }
+  return lines.join("\n") + "\n";
+}
+
+export const metrics = new MetricsRegistry();
+
+export const httpRequestSeconds = metrics.histogram("http_request_duration_seconds", "Backend HTTP request latency, by route, method and status");
+export const httpRequests = metrics.counter("http_requests_total", "Backend HTTP requests, by route, method and status");
@@ -0,0 +1,232 @@
+// In-memory cache of single-position analysis results in front of the Python analysis server.
+// Identical concurrent requests share one search (singleflight), and a result searched to a
+// deeper depth answers any shallower request for the same position.
+
+import { metrics } from "./metrics.js";
+
+const DEFAULT_MAX_ENTRIES = 5000;
+
+const cacheRequests = metrics.counter("position_cache_requests_total", "Backend position cache lookups, by result (hit, coalesced, miss)");
+const cacheEntries = metrics.gauge("position_cache_entries", "Positions held in the backend position cache");
+const cacheEvictions = metrics.counter("position_cache_evictions_total", "Positions evicted from the backend position cache (least recently used)");
+
+/**
+ * Expand a FEN piece placement into board[rank][file] (rank 0 is the first rank, empty squares null)
+ * @param {string} placement - FEN piece placement field
+ * @returns {Array<Array<string|null>>|null} null when the placement is malformed
+ */
+function parsePlacement(placement) {
+  const rows = String(placement).split("/");
+  if (rows.length !== 8) {
+    return null;
+  }
+  const board = [];
+  for (const row of rows.reverse()) {
+    const squares = [];
+    for (const symbol of row) {
+      if (symbol >= "1" && symbol <= "8") {
+        squares.push(...new Array(Number(symbol)).fill(null));
+      } else {
+        squares.push(symbol);
+      }
+    }
+    if (squares.length !== 8) {
+      return null;
+    }
+    board.push(squares);
+  }
+  return board;
+}
+
+const KNIGHT_STEPS = [[1, 2], [2, 1], [2, -1], [1, -2], [-1, -2], [-2, -1], [-2, 1], [-1, 2]];
+const KING_STEPS = [[1, 1], [1, 0], [1, -1], [0, 1], [0, -1], [-1, 1], [-1, 0], [-1, -1]];
+const STRAIGHT_RAYS = [[1, 0], [-1, 0], [0, 1], [0, -1]];
+const DIAGONAL_RAYS = [[1, 1], [1, -1], [-1, 1], [-1, -1]];
+
+/**
+ * Whether the king of the given side is attacked on board
+ * @param {Array<Array<string|null>>} board - From parsePlacement
+ * @param {string} turn - "w" or "b", the side whose king is tested
+ * @returns {boolean}
+ */
+function kingInCheck(board, turn) {
+  const own = (piece) => (turn === "w" ? piece.toUpperCase() : piece.toLowerCase());
+  const enemy = (piece) => (turn === "w" ? piece.toLowerCase() : piece.toUpperCase());
+  const at = (rank, file) => (rank >= 0 && rank < 8 && file >= 0 && file < 8 ? board[rank][file] : undefined);
+  let kingRank = -1;
+  let kingFile = -1;
+  board.forEach((squares, rank) => squares.forEach((piece, file) => {
+    if (piece === own("k")) {
+      kingRank = rank;
+      kingFile = file;
+    }
+  }));
+  if (kingRank < 0) {
+    return false;
+  }
+  const attackedBy = (steps, pieces) => steps.some(([dr, df]) => pieces.includes(at(kingRank + dr, kingFile + df)));
+  const rayAttacked = (rays, pieces) => rays.some(([dr, df]) => {
+    for (let rank = kingRank + dr, file = kingFile + df; at(rank, file) !== undefined; rank += dr, file += df) {
+      if (at(rank, file) !== null) {
+        return pieces.includes(at(rank, file));
+      }
+    }
+    return false;
+  });
+  const forward = turn === "w" ? 1 : -1;
+  return attackedBy([[forward, 1], [forward, -1]], [enemy("p")])
+    || attackedBy(KNIGHT_STEPS, [enemy("n")])
+    || attackedBy(KING_STEPS, [enemy("k")])
+    || rayAttacked(STRAIGHT_RAYS, [enemy("r"), enemy("q")])
+    || rayAttacked(DIAGONAL_RAYS, [enemy("b"), enemy("q")]);
+}
+
+/**
+ * Whether the side to move has a legal en passant capture on the target square, pins and
+ * discovered checks along the capture rank included (python-chess's has_legal_en_passant)
+ * @param {string} placement - FEN piece placement field
+ * @param {string} turn - "w" or "b"
+ * @param {string} square - En passant target square (e.g. "e3")
+ * @returns {boolean}
+ */
+function canCaptureEnPassant(placement, turn, square) {
+  const file = square.charCodeAt(0) - 97;
+  // The capturing pawn stands on the rank of the pawn that just moved
+  const rank = turn === "w" ? 4 : 3;
+  const board = parsePlacement(placement);
+  if (board === null || file < 0 || file > 7) {
+    return true;
+  }
+  // The target and the square the pawn came from are empty, the pawn stands in front of them
+  const ahead = turn === "w" ? 1 : -1;
+  const pawn = turn === "w" ? "P" : "p";
+  const pushed = turn === "w" ? "p" : "P";
+  if (square[1] !== String(rank + ahead + 1) || board[rank][file] !== pushed
+      || board[rank + ahead][file] !== null || board[rank + 2 * ahead][file] !== null) {
+    return false;
+  }
+  return [file - 1, file + 1].some((from) => {
+    if (board[rank][from] !== pawn) {
+      return false;
+    }
+    const after = board.map((squares) => [...squares]);
+    after[rank][from] = null;
+    after[rank][file] = null;
+    after[rank + ahead][file] = pawn;
+    return !kingInCheck(after, turn);
+  });
+}
+
+/**
+ * Cache key for a position: FEN without move clocks, en passant only when a legal capture exists
+ * (matches python/eval_cache.py, so transposed move orders share one entry)
+ * @param {string} fen - FEN string
+ * @returns {string}
+ */
+export function normalizeFen(fen) {
+  const [placement, turn = "w", castling = "-", enPassant = "-"] = String(fen).trim().split(/\s+/);
+  const ep = enPassant !== "-" && canCaptureEnPassant(placement, turn, enPassant) ? enPassant : "-";
+  return `${placement} ${turn} ${castling} ${ep}`;
+}
+
+/**
+ * Bounded LRU of analysis results keyed by normalized FEN, plus the searches currently in flight.
+ * Set POSITION_CACHE_SIZE=0 to turn caching off (concurrent identical requests are still coalesced).
+ */
+export class PositionCache {
+  constructor(maxEntries = Number(process.env.POSITION_CACHE_SIZE || DEFAULT_MAX_ENTRIES)) {
+    this.maxEntries = Number.isFinite(maxEntries) && maxEntries >= 0 ? maxEntries : DEFAULT_MAX_ENTRIES;
+    // Map iteration order doubles as recency order (oldest first)
+    this.entries = new Map();
+    this.inFlight = new Map();
+    this.counts = { hits: 0, coalesced: 0, misses: 0, evictions: 0 };
+  }
+
+  get(key, depth) {
+    const entry = this.entries.get(key);
+    if (!entry || entry.depth < depth) {
+      return null;
+    }
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.result;
+  }
+
+  set(key, depth, result) {
+    if (this.maxEntries === 0) {
+      return;
+    }
+    const existing = this.entries.get(key);
+    if (existing && existing.depth > depth) {
+      return;
+    }
+    this.entries.delete(key);
+    this.entries.set(key, { depth, result });
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value);
+      this.counts.evictions += 1;
+      cacheEvictions.inc();
+    }
+    cacheEntries.set({}, this.entries.size);
+  }
+
+  count(result) {
+    this.counts[result === "hit" ? "hits" : result === "miss" ? "misses" : "coalesced"] += 1;
+    cacheRequests.inc({ result });
+  }
+
+  /**
+   * Answer from the cache, join an identical (or deeper) search in flight, or start a new one
+   * @param {string} fen - FEN string of the position
+   * @param {number} depth - Requested depth
+   * @param {Function} search - (fen, depth) => Promise<Object> running the actual analysis
+   * @returns {Promise<Object>} The result, with cached: true unless it came from a new search
+   */
+  async analyze(fen, depth, search) {
+    const key = normalizeFen(fen);
+    const cached = this.get(key, depth);
+    if (cached) {
+      this.count("hit");
+      return { ...cached, fen, cached: true };
+    }
+
+    const running = this.inFlight.get(key);
+    if (running && running.depth >= depth) {
+      this.count("coalesced");
+      return { ...(await running.promise), fen };
+    }
+
+    this.count("miss");
+    const flight = { depth, promise: null };
+    // Registered before the search starts, so the cleanup below always finds it
+    this.inFlight.set(key, flight);
+    flight.promise = (async () => {
+      try {
+        const result = await search(fen, depth);
+        // Only complete answers are worth keeping
+        if (result && result.success !== false && result.best_move) {
+          this.set(key, result.depth || depth, result);
+        }
+        return result;
+      } finally {
+        if (this.inFlight.get(key) === flight) {
+          this.inFlight.delete(key);
+        }
+      }
+    })();
+    return { ...(await flight.promise) };
+  }
+
+  stats() {
+    const lookups = this.counts.hits + this.counts.coalesced + this.counts.misses;
+    return {
+      entries: this.entries.size,
+      max_entries: this.maxEntries,
+      in_flight: this.inFlight.size,
+      ...this.counts,
+      hit_rate: lookups ? Math.round(((this.counts.hits + this.counts.coalesced) / lookups) * 1000) / 1000 : 0
+    };
+  }
+}
+
+export const positionCache = new PositionCache();
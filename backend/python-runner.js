@@ -1,71 +1,306 @@
 import { spawn } from "child_process";
 import path from "path";
 import { fileURLToPath } from "url";
+import { nowMicros } from "./tracing.js";
+import { positionCache } from "./position-cache.js";
+import { FRAME_COLUMNS, decodeColumns } from "./wire-format.js";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
 
+// Frame layout shared with python/analysis_server.py: u32 BE payload length, u8 kind, payload.
+// Kind 0 is JSON; kind 1 is columnar ply results (see wire-format.js), sent only when asked for.
+const FRAME_HEADER_SIZE = 5;
+const FRAME_JSON = 0;
+
 /**
- * Analyzes a chess position using Stockfish via Python
- * @param {string} fen - The FEN string of the position
- * @param {number} depth - Analysis depth (default: 10)
- * @returns {Promise<Object>} Analysis result with best move and evaluation
+ * Supervises one long-lived Python analysis server (python/analysis_server.py).
+ * Requests are multiplexed over its stdin/stdout by request ID, so many can be
+ * in flight at once. If the process dies, pending requests are rejected and the
+ * server is restarted with exponential backoff.
  */
-async function analyzeWithPython(fen, depth = 10) {
-  return new Promise((resolve, reject) => {
-    // Path to Python executable (adjust if needed)
-    const pythonPath = "python"; // or "python3" on some systems
-    const scriptPath = path.join(__dirname, "..", "python", "engine_safe.py");
-    
-    console.log(`Spawning Python process: ${pythonPath} ${scriptPath}`);
-    console.log(`Analyzing FEN: ${fen} at depth ${depth}`);
-    
-    const py = spawn(pythonPath, [scriptPath], {
+class AnalysisDaemon {
+  constructor(options = {}) {
+    this.pythonPath = options.pythonPath || process.env.PYTHON_PATH || "python"; // or "python3" on some systems
+    this.scriptPath = options.scriptPath || path.join(__dirname, "..", "python", "analysis_server.py");
+    // Pool size and threads default to the Python placement plan (ENGINE_PLACEMENT, ENGINE_POOL_SIZE)
+    this.args = options.args || (process.env.ENGINE_PLACEMENT ? ["--placement", process.env.ENGINE_PLACEMENT] : []);
+    this.requestTimeoutMs = options.requestTimeoutMs || 10 * 60 * 1000;
+    this.process = null;
+    this.buffer = Buffer.alloc(0);
+    this.pending = new Map();
+    this.nextId = 1;
+    this.restartDelayMs = 500;
+    this.restarts = 0;
+    this.startedAt = null;
+    this.stopping = false;
+    this.restartTimer = null;
+  }
+
+  start() {
+    if (this.process || this.stopping) {
+      return;
+    }
+
+    console.log(`🚀 Starting Python analysis server: ${this.pythonPath} ${this.scriptPath}`);
+    const py = spawn(this.pythonPath, [this.scriptPath, ...this.args], {
       stdio: ['pipe', 'pipe', 'pipe']
     });
-    
-    let output = "";
-    let error = "";
-    
-    py.stdout.on("data", (data) => {
-      output += data.toString();
-    });
-    
+    this.process = py;
+    this.buffer = Buffer.alloc(0);
+    this.startedAt = Date.now();
+
+    py.stdout.on("data", (data) => this.onData(data));
+
     py.stderr.on("data", (data) => {
-      error += data.toString();
+      const stderrData = data.toString().trim();
+      if (stderrData) {
+        console.log(`[PYTHON] ${stderrData}`);
+      }
     });
-    
-    py.on("close", (code) => {
-      if (code !== 0) {
-        console.error(`Python process exited with code ${code}`);
-        console.error(`Error output: ${error}`);
-        console.error(`Standard output: ${output}`);
-        return reject(new Error(`Python failed (code ${code}): ${error || "Unknown error"}`));
+
+    py.on("error", (err) => {
+      console.error(`Failed to start Python analysis server: ${err.message}`);
+    });
+
+    py.on("close", (code, signal) => this.onExit(py, code, signal));
+
+    // Avoid crashing Node on EPIPE when the child dies mid-write
+    py.stdin.on("error", (err) => {
+      console.error(`Python analysis server stdin error: ${err.message}`);
+    });
+  }
+
+  onExit(py, code, signal) {
+    if (this.process !== py) {
+      return;
+    }
+    this.process = null;
+
+    const error = new Error(`Python analysis server exited (code ${code}, signal ${signal})`);
+    for (const [, entry] of this.pending) {
+      clearTimeout(entry.timer);
+      entry.reject(error);
+    }
+    this.pending.clear();
+
+    if (this.stopping) {
+      return;
+    }
+
+    // Reset backoff after a stable run, otherwise back off up to 10s
+    const uptimeMs = Date.now() - this.startedAt;
+    this.restartDelayMs = uptimeMs > 30000 ? 500 : Math.min(this.restartDelayMs * 2, 10000);
+    this.restarts += 1;
+    console.error(`❌ ${error.message} - restarting in ${this.restartDelayMs}ms`);
+    this.restartTimer = setTimeout(() => {
+      this.restartTimer = null;
+      this.start();
+    }, this.restartDelayMs);
+  }
+
+  onData(data) {
+    this.buffer = this.buffer.length ? Buffer.concat([this.buffer, data]) : data;
+
+    while (this.buffer.length >= FRAME_HEADER_SIZE) {
+      const length = this.buffer.readUInt32BE(0);
+      const kind = this.buffer.readUInt8(4);
+      if (this.buffer.length < FRAME_HEADER_SIZE + length) {
+        break;
       }
-      
+      const payload = this.buffer.subarray(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + length);
+      this.buffer = this.buffer.subarray(FRAME_HEADER_SIZE + length);
+
+      if (kind !== FRAME_JSON && kind !== FRAME_COLUMNS) {
+        console.error(`Ignoring unsupported frame kind ${kind} from Python`);
+        continue;
+      }
+
+      let message;
+      const decodeStart = nowMicros();
       try {
-        const parsed = JSON.parse(output);
-        if (parsed.success === false) {
-          return reject(new Error(parsed.error || "Analysis failed"));
-        }
-        resolve(parsed);
+        message = kind === FRAME_JSON ? JSON.parse(payload.toString("utf8")) : decodeColumns(payload);
       } catch (err) {
-        console.error(`Failed to parse Python output: ${output}`);
-        reject(new Error(`Invalid JSON from Python: ${err.message}`));
+        console.error(`Invalid ${kind === FRAME_JSON ? "JSON" : "columnar"} frame from Python: ${err.message}`);
+        continue;
       }
+      this.onMessage(message, { ts: decodeStart, dur: nowMicros() - decodeStart, bytes: length, kind });
+    }
+  }
+
+  onMessage(message, decode = null) {
+    const entry = this.pending.get(message.id);
+    if (!entry) {
+      if (message.ok === false) {
+        console.error(`Python analysis server error: ${message.error}`);
+      }
+      return;
+    }
+
+    if (entry.trace && decode) {
+      entry.trace.add(message.event ? `decode ${message.event} event` : "decode response", decode.ts, decode.dur, { bytes: decode.bytes, kind: decode.kind });
+    }
+
+    if (message.event) {
+      if (message.event === "trace" && entry.trace) {
+        entry.trace.addPythonEvents(message.data.events);
+      } else if (entry.onEvent) {
+        entry.onEvent(message.event, message.data);
+      }
+      return;
+    }
+
+    this.pending.delete(message.id);
+    clearTimeout(entry.timer);
+    if (entry.endSpan) {
+      entry.endSpan({ ok: Boolean(message.ok) });
+    }
+    if (message.ok) {
+      entry.resolve(message.result);
+    } else {
+      entry.reject(new Error(message.error || "Analysis failed"));
+    }
+  }
+
+  /**
+   * Send a request to the analysis server
+   * @param {string} method - Server method name (e.g. "analyze", "analyze_pgn")
+   * @param {Object} params - Method parameters
+   * @param {Object} options - { timeoutMs, onEvent(event, data), trace } where trace is a
+   *   RequestTrace (tracing.js) that receives the bridge spans and the server's own spans
+   * @returns {Promise<Object>} The method result
+   */
+  request(method, params = {}, options = {}) {
+    // While a restart is backing off, leave the respawn to its timer so a crash-looping
+    // server restarts at the backoff rate rather than once per request
+    if (!this.restartTimer) {
+      this.start();
+    }
+
+    return new Promise((resolve, reject) => {
+      if (this.restartTimer) {
+        return reject(new Error(`Python analysis server is restarting (retry in ${this.restartDelayMs}ms)`));
+      }
+      if (!this.process) {
+        return reject(new Error("Python analysis server is not running"));
+      }
+
+      const id = String(this.nextId++);
+      const timeoutMs = options.timeoutMs || this.requestTimeoutMs;
+      const timer = setTimeout(() => {
+        const entry = this.pending.get(id);
+        if (entry && entry.endSpan) {
+          entry.endSpan({ ok: false, timed_out: true });
+        }
+        this.pending.delete(id);
+        reject(new Error(`Python analysis request ${method} timed out after ${timeoutMs}ms`));
+      }, timeoutMs);
+
+      const trace = options.trace || null;
+      const endEncode = trace ? trace.span("encode request", { method }) : null;
+      const payload = Buffer.from(JSON.stringify({ id, method, params: trace ? { ...params, trace: true } : params }), "utf8");
+      const header = Buffer.alloc(FRAME_HEADER_SIZE);
+      header.writeUInt32BE(payload.length, 0);
+      header.writeUInt8(FRAME_JSON, 4);
+      if (endEncode) {
+        endEncode({ bytes: payload.length });
+      }
+
+      const endSpan = trace ? trace.span(`python ${method}`, { request_id: id }) : null;
+      this.pending.set(id, { resolve, reject, timer, onEvent: options.onEvent, trace, endSpan });
+      this.process.stdin.write(Buffer.concat([header, payload]));
     });
-    
-    py.on("error", (err) => {
-      console.error(`Failed to start Python process: ${err.message}`);
-      reject(new Error(`Failed to start Python: ${err.message}`));
-    });
-    
-    // Send data to Python via stdin
-    const inputData = JSON.stringify({ fen, depth });
-    py.stdin.write(inputData);
-    py.stdin.end();
-  });
+  }
+
+  status() {
+    return {
+      running: Boolean(this.process),
+      pid: this.process ? this.process.pid : null,
+      pending: this.pending.size,
+      restarts: this.restarts,
+      uptime_ms: this.process ? Date.now() - this.startedAt : 0
+    };
+  }
+
+  stop() {
+    this.stopping = true;
+    if (this.restartTimer) {
+      clearTimeout(this.restartTimer);
+      this.restartTimer = null;
+    }
+    if (this.process) {
+      this.process.stdin.end();
+      this.process.kill();
+    }
+  }
+}
+
+const analysisDaemon = new AnalysisDaemon();
+
+/**
+ * Get the shared, supervised Python analysis server
+ * @returns {AnalysisDaemon}
+ */
+export function getAnalysisDaemon() {
+  analysisDaemon.start();
+  return analysisDaemon;
+}
+
+/**
+ * Fetch the Python analysis server's metrics snapshot (engine pools, searches, caches, requests)
+ * @returns {Promise<Object>} { metrics: [...] } as produced by python/metrics.py
+ */
+export async function getPythonMetrics() {
+  return await getAnalysisDaemon().request("metrics", {}, { timeoutMs: 5000 });
+}
+
+/**
+ * Stop the Python analysis server (used on backend shutdown)
+ */
+export function shutdownAnalysisDaemon() {
+  analysisDaemon.stop();
+}
+
+/**
+ * Analyzes a chess position using Stockfish via the Python analysis server
+ * @param {string} fen - The FEN string of the position
+ * @param {number} depth - Analysis depth (default: 10)
+ * @returns {Promise<Object>} Analysis result with best move and evaluation
+ */
+async function analyzeWithPython(fen, depth = 10) {
+  console.log(`Analyzing FEN: ${fen} at depth ${depth}`);
+  const parsed = await getAnalysisDaemon().request("analyze", { fen, depth });
+  if (parsed.success === false) {
+    throw new Error(parsed.error || "Analysis failed");
+  }
+  return parsed;
+}
+
+/**
+ * Analyze a chess position, reporting each completed search depth as it arrives
+ * @param {string} fen - The FEN string of the position
+ * @param {number} depth - Target analysis depth (default: 10)
+ * @param {Function} onDepth - Called with each intermediate result (best move, evaluation, depth, pv)
+ * @returns {Promise<Object>} Final analysis result at the target depth
+ */
+export async function analyzeWithStockfishStream(fen, depth = 10, onDepth = () => {}) {
+  console.log(`🌊 Streaming analysis of FEN: ${fen} up to depth ${depth}`);
+  const parsed = await getAnalysisDaemon().request(
+    "analyze",
+    { fen, depth, stream: true },
+    {
+      onEvent: (event, data) => {
+        if (event === "depth") {
+          onDepth(data);
+        }
+      }
+    }
+  );
+  if (parsed.success === false) {
+    throw new Error(parsed.error || "Analysis failed");
+  }
+  return parsed;
 }
 
 /**
@@ -73,80 +308,42 @@ async function analyzeWithPython(fen, depth = 10) {
  * @param {string} pgn - The PGN string of the game
  * @param {number} depth - Analysis depth (default: 10)
  * @param {number} maxWorkers - Maximum number of workers (default: auto-detect)
+ * @param {string} sessionId - session_id of an earlier analysis of this game (optional)
+ * @param {RequestTrace} trace - Trace receiving the bridge and analysis server spans (optional)
+ * @param {string} format - "columns" for a columnar result (optional)
  * @returns {Promise<Object>} Analysis result with evaluations for all positions
  */
-async function analyzePGNUltraFastInternal(pgn, depth = 10, maxWorkers = null) {
-  return new Promise((resolve, reject) => {
-    // Path to Python executable (adjust if needed)
-    const pythonPath = "python"; // or "python3" on some systems
-    const scriptPath = path.join(__dirname, "..", "python", "ultra_fast_pgn_analyzer.py");
-    
-    console.log(`🚀 Spawning ULTRA-FAST Python PGN analyzer: ${pythonPath} ${scriptPath}`);
-    console.log(`⚡ Analyzing PGN game with depth ${depth}, workers: ${maxWorkers || 'auto'}`);
-    console.log(`📋 Python process started - watching for detailed worker logs...`);
-    
-    const py = spawn(pythonPath, [scriptPath], {
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-    
-    let output = "";
-    let error = "";
-    
-    py.stdout.on("data", (data) => {
-      output += data.toString();
-    });
-    
-    py.stderr.on("data", (data) => {
-      const stderrData = data.toString();
-      error += stderrData;
-      // Show stderr output in real-time for debugging
-      if (stderrData.trim()) {
-        console.log(`[PYTHON] ${stderrData.trim()}`);
-      }
-    });
-    
-    py.on("close", (code) => {
-      if (code !== 0) {
-        console.error(`❌ Python ULTRA-FAST analyzer exited with code ${code}`);
-        console.error(`Error output: ${error}`);
-        console.error(`Standard output: ${output}`);
-        return reject(new Error(`Python ULTRA-FAST analysis failed: ${error || "Unknown error"}`));
-      }
-      
-      try {
-        const parsed = JSON.parse(output);
-        if (parsed.success === false) {
-          return reject(new Error(parsed.error || "ULTRA-FAST PGN analysis failed"));
-        }
-        console.log(`✅ Python ULTRA-FAST analysis completed successfully!`);
-        resolve(parsed);
-      } catch (err) {
-        console.error(`Failed to parse Python ULTRA-FAST output: ${output}`);
-        reject(new Error(`Invalid JSON from Python ULTRA-FAST analyzer: ${err.message}`));
-      }
-    });
-    
-    py.on("error", (err) => {
-      console.error(`Failed to start Python ULTRA-FAST analyzer: ${err.message}`);
-      reject(new Error(`Failed to start Python ULTRA-FAST analyzer: ${err.message}`));
-    });
-    
-    // Send data to Python via stdin
-    const inputData = JSON.stringify({ pgn, depth, max_workers: maxWorkers });
-    py.stdin.write(inputData);
-    py.stdin.end();
-  });
+async function analyzePGNUltraFastInternal(pgn, depth = 10, maxWorkers = null, sessionId = null, trace = null, format = null) {
+  console.log(`⚡ Analyzing PGN game with depth ${depth}, workers: ${maxWorkers || 'auto'}`);
+  const params = { pgn, depth, max_workers: maxWorkers, session_id: sessionId };
+  if (format) {
+    params.format = format;
+  }
+  const parsed = await getAnalysisDaemon().request("analyze_pgn", params, { trace });
+  if (parsed.success === false) {
+    throw new Error(parsed.error || "ULTRA-FAST PGN analysis failed");
+  }
+  console.log(`✅ Python ULTRA-FAST analysis completed successfully!`);
+  return parsed;
 }
 
 /**
- * Main analysis function using Python
+ * Main analysis function using Python. Results are cached per position (a deeper result answers
+ * shallower requests) and identical concurrent requests share one search; see position-cache.js.
  * @param {string} fen - The FEN string of the position
  * @param {number} depth - Analysis depth (default: 10)
  * @returns {Promise<Object>} Analysis result with best move and evaluation
  */
 export async function analyzeWithStockfish(fen, depth = 10) {
-  console.log(`[Python] Using Python process for analysis`);
-  return await analyzeWithPython(fen, depth);
+  return await positionCache.analyze(fen, depth, analyzeWithPython);
+}
+
+/**
+ * Hit/miss counters and size of the backend position cache
+ * @returns {Object}
+ */
+export function getPositionCacheStats() {
+  return positionCache.stats();
 }
 
 /**
@@ -154,11 +351,47 @@ export async function analyzeWithStockfish(fen, depth = 10) {
  * @param {string} pgn - The PGN string of the game
  * @param {number} depth - Analysis depth (default: 10)
  * @param {number} maxWorkers - Maximum number of workers (default: auto-detect)
+ * @param {string} sessionId - session_id of an earlier analysis of this game; only changed plies are re-searched
+ * @param {RequestTrace} trace - Trace receiving the bridge and analysis server spans (optional)
+ * @param {string} format - "columns" to get the per-ply results as typed arrays in result.columns
+ *   (see wire-format.js) instead of the results object (optional)
  * @returns {Promise<Object>} Analysis result with evaluations for all positions
  */
-export async function analyzePGNUltraFast(pgn, depth = 10, maxWorkers = null) {
+export async function analyzePGNUltraFast(pgn, depth = 10, maxWorkers = null, sessionId = null, trace = null, format = null) {
   console.log(`🚀 [Python] Using ULTRA-FAST multi-worker PGN analysis`);
-  return await analyzePGNUltraFastInternal(pgn, depth, maxWorkers);
+  return await analyzePGNUltraFastInternal(pgn, depth, maxWorkers, sessionId, trace, format);
+}
+
+/**
+ * Stream a PGN analysis ply by ply as results become available
+ * @param {string} pgn - The PGN string of the game
+ * @param {number} depth - Analysis depth (default: 10)
+ * @param {number} maxWorkers - Maximum number of workers (default: auto-detect)
+ * @param {Function} onPly - Called with each per-ply result, in game order
+ * @param {string} sessionId - session_id of an earlier analysis of this game (optional)
+ * @param {boolean} anytime - Emit a quick low-depth pass first, then each ply again as it is refined to depth
+ * @param {RequestTrace} trace - Trace receiving the bridge and analysis server spans (optional)
+ * @returns {Promise<Object>} Summary of the analysis (results are not retained)
+ */
+export async function analyzePGNUltraFastStream(pgn, depth = 10, maxWorkers = null, onPly = () => {}, sessionId = null, anytime = false, trace = null) {
+  console.log(`🌊 Streaming PGN analysis with depth ${depth}, workers: ${maxWorkers || 'auto'}${anytime ? ' (anytime)' : ''}`);
+  const summary = await getAnalysisDaemon().request(
+    "analyze_pgn",
+    { pgn, depth, max_workers: maxWorkers, stream: true, session_id: sessionId, anytime },
+    {
+      onEvent: (event, data) => {
+        if (event === "ply") {
+          onPly(data);
+        }
+      },
+      trace
+    }
+  );
+  if (summary.success === false) {
+    throw new Error(summary.error || "Streaming PGN analysis failed");
+  }
+  console.log(`✅ Streaming PGN analysis completed - ${summary.total_positions} positions`);
+  return summary;
 }
 
 /**
@@ -1,6 +1,9 @@
 import express from "express";
 import cors from "cors";
-import { analyzeWithStockfish, testIntegration, analyzePGNUltraFast, evaluateGame } from "./python-runner.js";
+import { analyzeWithStockfish, analyzeWithStockfishStream, testIntegration, analyzePGNUltraFast, analyzePGNUltraFastStream, evaluateGame, getAnalysisDaemon, getPythonMetrics, getPositionCacheStats, shutdownAnalysisDaemon } from "./python-runner.js";
+import { metrics, renderPrometheus, httpRequestSeconds, httpRequests } from "./metrics.js";
+import { startTrace, traceStore } from "./tracing.js";
+import { COLUMNS_CONTENT_TYPE, COLUMNS_JSON_CONTENT_TYPE, columnsToJSON, encodeColumnsBody } from "./wire-format.js";
 
 const app = express();
 const PORT = process.env.PORT || 5000;
@@ -9,6 +12,21 @@ const PORT = process.env.PORT || 5000;
 app.use(cors());
 app.use(express.json());
 
+// Per-endpoint latency for /metrics (recorded when the response, or stream, finishes)
+app.use((req, res, next) => {
+  const started = process.hrtime.bigint();
+  res.on("finish", () => {
+    const labels = {
+      route: req.route ? req.route.path : "unmatched",
+      method: req.method,
+      status: String(res.statusCode)
+    };
+    httpRequestSeconds.observe(labels, Number(process.hrtime.bigint() - started) / 1e9);
+    httpRequests.inc(labels);
+  });
+  next();
+});
+
 // Health check endpoint
 app.get("/", (req, res) => {
   res.json({
@@ -21,8 +39,13 @@ app.get("/", (req, res) => {
     ],
     endpoints: {
       "POST /analyze": "Analyze chess position",
+      "POST /analyze/stream": "Stream a position analysis depth by depth (Server-Sent Events)",
+      "POST /analyze-pgn": `Analyze a PGN game (Accept: ${COLUMNS_CONTENT_TYPE} or ${COLUMNS_JSON_CONTENT_TYPE} for columnar results)`,
+      "POST /analyze-pgn/stream": "Stream PGN analysis ply by ply (Server-Sent Events)",
       "POST /api/stockfish/analyze": "Frontend AI endpoint",
       "GET /test": "Test Python/Stockfish integration",
+      "GET /metrics": "Prometheus metrics (backend and analysis server)",
+      "GET /traces/:id": "Chrome Trace / Perfetto timeline of a request made with trace: true",
       "GET /health": "Health check"
     }
   });
@@ -34,10 +57,86 @@ app.get("/health", (req, res) => {
     status: "healthy",
     service: "Chess AI Backend",
     multithreaded: true,
+    analysis_server: getAnalysisDaemon().status(),
+    position_cache: getPositionCacheStats(),
     timestamp: new Date().toISOString()
   });
 });
 
+// Prometheus metrics: backend HTTP latency plus the analysis server's engine and search statistics
+const analysisServerUp = metrics.gauge("analysis_server_up", "Whether the Python analysis server answered the metrics request");
+const analysisServerRestarts = metrics.gauge("analysis_server_restarts", "Times the Python analysis server has been restarted");
+const analysisServerPending = metrics.gauge("analysis_server_pending_requests", "Requests sent to the Python analysis server and not yet answered");
+
+app.get("/metrics", async (req, res) => {
+  const daemonStatus = getAnalysisDaemon().status();
+  analysisServerRestarts.set({}, daemonStatus.restarts);
+  analysisServerPending.set({}, daemonStatus.pending);
+
+  let pythonMetrics = null;
+  try {
+    pythonMetrics = await getPythonMetrics();
+    analysisServerUp.set({}, 1);
+  } catch (error) {
+    console.error("❌ Failed to collect analysis server metrics:", error.message);
+    analysisServerUp.set({}, 0);
+  }
+
+  res.set("Content-Type", "text/plain; version=0.0.4; charset=utf-8");
+  res.send(renderPrometheus([metrics.snapshot(), pythonMetrics]));
+});
+
+// Request timelines recorded for /analyze-pgn calls made with "trace": true (or ?trace=1)
+app.get("/traces", (req, res) => {
+  res.json({ traces: traceStore.list() });
+});
+
+app.get("/traces/:id", (req, res) => {
+  const trace = traceStore.get(req.params.id);
+  if (!trace) {
+    return res.status(404).json({ error: "Trace not found (only the most recent traces are kept)", success: false });
+  }
+  res.set("Content-Disposition", `attachment; filename="trace-${req.params.id}.json"`);
+  res.json(trace);
+});
+
+/**
+ * Send a JSON body, timing its serialization when the request is traced
+ * @param {Object} res - Express response
+ * @param {Object} body - Response body
+ * @param {RequestTrace|null} trace - Active trace, if any
+ */
+function sendJSON(res, body, trace) {
+  if (!trace) {
+    return res.json(body);
+  }
+  const endSerialize = trace.span("serialize HTTP response");
+  const payload = JSON.stringify(body);
+  endSerialize({ bytes: Buffer.byteLength(payload) });
+  res.set("X-Trace-Id", trace.id);
+  res.type("application/json").send(payload);
+}
+
+/**
+ * Send a columnar PGN analysis result in the negotiated media type
+ * @param {Object} res - Express response
+ * @param {Object} result - Result decoded by wire-format.js (with its "columns" field)
+ * @param {string} type - COLUMNS_CONTENT_TYPE or COLUMNS_JSON_CONTENT_TYPE
+ * @param {RequestTrace|null} trace - Active trace, if any
+ */
+function sendColumns(res, result, type, trace) {
+  const endSerialize = trace ? trace.span("serialize HTTP response") : null;
+  const body = type === COLUMNS_CONTENT_TYPE
+    ? encodeColumnsBody(result)
+    : Buffer.from(JSON.stringify({ ...result, columns: columnsToJSON(result.columns) }), "utf8");
+  if (endSerialize) {
+    endSerialize({ bytes: body.length });
+    res.set("X-Trace-Id", trace.id);
+  }
+  res.vary("Accept");
+  res.type(type).send(body);
+}
+
 // Test endpoint to verify Python/Stockfish integration
 app.get("/test", async (req, res) => {
   try {
@@ -98,6 +197,61 @@ app.post("/analyze", async (req, res) => {
   }
 });
 
+// Streaming position analysis - relays every completed search depth over Server-Sent Events
+app.post("/analyze/stream", async (req, res) => {
+  const { fen, depth = 15 } = req.body;
+  
+  // Validate input
+  if (!fen) {
+    return res.status(400).json({ 
+      error: "FEN string is required",
+      success: false
+    });
+  }
+  
+  if (depth < 1 || depth > 25) {
+    return res.status(400).json({ 
+      error: "Depth must be between 1 and 25",
+      success: false
+    });
+  }
+  
+  console.log(`🌊 Streaming position analysis: ${fen} up to depth ${depth}`);
+  
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+  });
+  res.flushHeaders();
+  
+  let clientGone = false;
+  req.on("close", () => {
+    clientGone = true;
+  });
+  
+  const sendEvent = (event, data) => {
+    if (clientGone || res.writableEnded) {
+      return;
+    }
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+  
+  try {
+    const result = await analyzeWithStockfishStream(fen, depth, (partial) => sendEvent("depth", partial));
+    console.log(`✅ Streamed analysis complete: ${result.best_move} at depth ${result.depth}`);
+    sendEvent("result", result);
+  } catch (error) {
+    console.error("❌ Streaming analysis error:", error.message);
+    sendEvent("error", { error: `Analysis failed: ${error.message}`, success: false });
+  } finally {
+    if (!res.writableEnded) {
+      res.end();
+    }
+  }
+});
+
 // Frontend AI endpoint (matches the frontend expectation)
 app.get("/api/stockfish/analyze", async (req, res) => {
   try {
@@ -143,8 +297,9 @@ app.get("/api/stockfish/analyze", async (req, res) => {
 
 // Direct PGN analysis endpoint - analyze entire PGN game using multi-worker analysis
 app.post("/analyze-pgn", async (req, res) => {
+  const trace = startTrace(req);
   try {
-    const { pgn, depth = 10, useMultiWorker = true } = req.body;
+    const { pgn, depth = 10, useMultiWorker = true, sessionId = null } = req.body;
     
     // Validate input
     if (!pgn || typeof pgn !== 'string' || pgn.trim().length === 0) {
@@ -167,12 +322,23 @@ app.post("/analyze-pgn", async (req, res) => {
     if (useMultiWorker) {
       // Use ULTRA-FAST multi-worker PGN analysis
       console.log(`🚀 Using ULTRA-FAST multi-worker PGN analysis`);
-      const result = await analyzePGNUltraFast(pgn, depth, null);
+      // Clients that accept a columnar media type get the results column by column (plain JSON stays the default)
+      const accepted = req.accepts(["application/json", COLUMNS_CONTENT_TYPE, COLUMNS_JSON_CONTENT_TYPE]);
+      const columnar = accepted === COLUMNS_CONTENT_TYPE || accepted === COLUMNS_JSON_CONTENT_TYPE;
+      const result = await analyzePGNUltraFast(pgn, depth, null, sessionId, trace, columnar ? "columns" : null);
       
       if (result.success) {
         console.log(`✅ Multi-worker PGN analysis complete - ${result.total_positions} positions in ${result.analysis_time}s`);
+        if (result.session_hits) {
+          const change = result.divergence_ply === null ? "no changes" : `first change at ply ${result.divergence_ply}`;
+          console.log(`♻️  Session reuse: ${result.session_hits} positions from earlier analysis (${change})`);
+        }
         console.log(`📈 Speed: ${result.positions_per_second} positions/second`);
-        res.json(result);
+        if (columnar && result.columns) {
+          sendColumns(res, trace ? { ...result, trace_id: trace.id } : result, accepted, trace);
+        } else {
+          sendJSON(res, trace ? { ...result, trace_id: trace.id } : result, trace);
+        }
       } else {
         throw new Error(result.error || "Multi-worker PGN analysis failed");
       }
@@ -202,9 +368,82 @@ app.post("/analyze-pgn", async (req, res) => {
     console.error("❌ PGN analysis error:", error.message);
     res.status(500).json({ 
       error: `PGN analysis failed: ${error.message}`,
+      success: false,
+      ...(trace ? { trace_id: trace.id } : {})
+    });
+  } finally {
+    if (trace) {
+      traceStore.finish(trace, { status: res.statusCode });
+    }
+  }
+});
+
+// Streaming PGN analysis endpoint - relays each ply over Server-Sent Events as soon as it is analyzed
+app.post("/analyze-pgn/stream", async (req, res) => {
+  const { pgn, depth = 10, sessionId = null, anytime = false } = req.body;
+  
+  // Validate input
+  if (!pgn || typeof pgn !== 'string' || pgn.trim().length === 0) {
+    return res.status(400).json({ 
+      error: "PGN string is required and must not be empty",
+      success: false
+    });
+  }
+  
+  if (depth < 1 || depth > 25) {
+    return res.status(400).json({ 
+      error: "Depth must be between 1 and 25",
       success: false
     });
   }
+  
+  console.log(`🌊 Streaming PGN analysis request - Depth: ${depth}, Anytime: ${anytime}, PGN length: ${pgn.length} characters`);
+  
+  const trace = startTrace(req, { depth, anytime });
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    ...(trace ? { "X-Trace-Id": trace.id } : {})
+  });
+  res.flushHeaders();
+  
+  let clientGone = false;
+  req.on("close", () => {
+    clientGone = true;
+  });
+  
+  const sendEvent = (event, data) => {
+    if (clientGone || res.writableEnded) {
+      return;
+    }
+    const endWrite = trace ? trace.span(`send ${event}`, data && data.move_number !== undefined ? { ply: data.move_number } : {}) : null;
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+    if (endWrite) {
+      endWrite();
+    }
+  };
+  
+  try {
+    let plies = 0;
+    const summary = await analyzePGNUltraFastStream(pgn, depth, null, (ply) => {
+      plies++;
+      sendEvent("ply", ply);
+    }, sessionId, anytime, trace);
+    console.log(`✅ Streamed ${plies} plies in ${summary.analysis_time}s`);
+    sendEvent("summary", trace ? { ...summary, trace_id: trace.id } : summary);
+  } catch (error) {
+    console.error("❌ Streaming PGN analysis error:", error.message);
+    sendEvent("error", { error: `PGN analysis failed: ${error.message}`, success: false });
+  } finally {
+    if (trace) {
+      traceStore.finish(trace, { client_gone: clientGone });
+    }
+    if (!res.writableEnded) {
+      res.end();
+    }
+  }
 });
 
 // Game evaluation endpoint - analyze entire game using multi-worker PGN analysis
@@ -329,21 +568,30 @@ app.listen(PORT, () => {
   console.log(`   GET  http://localhost:${PORT}/`);
   console.log(`   GET  http://localhost:${PORT}/health`);
   console.log(`   GET  http://localhost:${PORT}/test`);
+  console.log(`   GET  http://localhost:${PORT}/metrics`);
+  console.log(`   GET  http://localhost:${PORT}/traces/:id`);
   console.log(`   POST http://localhost:${PORT}/analyze`);
+  console.log(`   POST http://localhost:${PORT}/analyze/stream`);
   console.log(`   GET  http://localhost:${PORT}/api/stockfish/analyze`);
   console.log(`   POST http://localhost:${PORT}/analyze-pgn`);
+  console.log(`   POST http://localhost:${PORT}/analyze-pgn/stream`);
   console.log(`   POST http://localhost:${PORT}/evaluate-game`);
   console.log(`\n🎯 Ready for multithreaded chess analysis!`);
+
+  // Boot the Python analysis server (and its engines) before the first request
+  getAnalysisDaemon();
   console.log(`🧠 AI Features: Python process integration, ULTRA-FAST PGN analysis`);
 });
 
 // Graceful shutdown
 process.on('SIGINT', () => {
   console.log('\n🛑 Shutting down server...');
+  shutdownAnalysisDaemon();
   process.exit(0);
 });
 
 process.on('SIGTERM', () => {
   console.log('\n🛑 Shutting down server...');
+  shutdownAnalysisDaemon();
   process.exit(0);
 });
\ No newline at end of file
@@ -0,0 +1,144 @@
+// Per-request trace timelines in the Chrome Trace Event format (chrome://tracing, ui.perfetto.dev).
+// The backend records its own spans (HTTP handling, the Python bridge, SSE writes) and merges in
+// the spans the Python analysis server sends back for the same request (python/tracing.py).
+// Both sides stamp events with wall-clock microseconds, so they line up on one timeline.
+
+import { randomUUID } from "crypto";
+import fs from "fs";
+import path from "path";
+import { performance } from "perf_hooks";
+
+const MAX_STORED_TRACES = 50;
+const BACKEND_TID = 1;
+
+export function nowMicros() {
+  return Math.round((performance.timeOrigin + performance.now()) * 1000);
+}
+
+export class RequestTrace {
+  constructor(name, args = {}) {
+    this.id = randomUUID();
+    this.name = name;
+    this.args = args;
+    this.events = [];
+    this.pythonEvents = [];
+    this.start = nowMicros();
+    this.ended = false;
+  }
+
+  /**
+   * Close the request's top-level span (only the first call counts)
+   * @param {Object} args - Extra arguments, e.g. the response status
+   */
+  end(args = {}) {
+    if (!this.ended) {
+      this.ended = true;
+      this.add(this.name, this.start, nowMicros() - this.start, { ...this.args, ...args });
+    }
+  }
+
+  /**
+   * Start a span on the backend's row
+   * @param {string} name - Span name
+   * @param {Object} args - Span arguments shown in the viewer
+   * @returns {Function} Call to end the span, optionally with more arguments
+   */
+  span(name, args = {}) {
+    const start = nowMicros();
+    return (extra = {}) => this.add(name, start, nowMicros() - start, { ...args, ...extra });
+  }
+
+  add(name, ts, dur, args = {}, category = "backend") {
+    this.events.push({ name, cat: category, ph: "X", ts, dur, pid: process.pid, tid: BACKEND_TID, args });
+  }
+
+  /**
+   * Merge spans recorded by the Python analysis server for this request
+   * @param {Array<Object>} events - Chrome Trace events from the "trace" event
+   */
+  addPythonEvents(events) {
+    this.pythonEvents.push(...(events || []));
+  }
+
+  toJSON() {
+    const metadata = [
+      { name: "process_name", ph: "M", pid: process.pid, tid: 0, args: { name: `backend (${process.pid})` } },
+      { name: "thread_name", ph: "M", pid: process.pid, tid: BACKEND_TID, args: { name: "event loop" } }
+    ];
+    return {
+      traceEvents: [...metadata, ...this.events, ...this.pythonEvents],
+      displayTimeUnit: "ms",
+      otherData: { trace_id: this.id, request: this.name, ...this.args }
+    };
+  }
+}
+
+/**
+ * Keeps the most recent traces in memory for GET /traces/:id (a trace can be
+ * fetched while its request is still running) and, when TRACE_DIR is set,
+ * writes each finished one to <TRACE_DIR>/<id>.json.
+ */
+class TraceStore {
+  constructor(limit = MAX_STORED_TRACES, directory = process.env.TRACE_DIR || null) {
+    this.limit = limit;
+    this.directory = directory;
+    this.traces = new Map();
+  }
+
+  add(trace) {
+    this.traces.set(trace.id, trace);
+    while (this.traces.size > this.limit) {
+      this.traces.delete(this.traces.keys().next().value);
+    }
+    return trace;
+  }
+
+  finish(trace, args = {}) {
+    trace.end(args);
+    if (!this.directory) {
+      return;
+    }
+    const file = path.join(this.directory, `${trace.id}.json`);
+    fs.promises.mkdir(this.directory, { recursive: true })
+      .then(() => fs.promises.writeFile(file, JSON.stringify(trace.toJSON())))
+      .catch((err) => console.error(`Failed to write trace ${file}: ${err.message}`));
+  }
+
+  get(id) {
+    const trace = this.traces.get(id);
+    return trace ? trace.toJSON() : null;
+  }
+
+  list() {
+    return [...this.traces.values()].map((trace) => ({
+      id: trace.id,
+      request: trace.name,
+      events: trace.events.length + trace.pythonEvents.length
+    }));
+  }
+}
+
+export const traceStore = new TraceStore();
+
+/**
+ * Whether a request asked to be traced (body "trace": true or ?trace=1)
+ * @param {Object} req - Express request
+ * @returns {boolean}
+ */
+export function wantsTrace(req) {
+  const flag = (req.body && req.body.trace) ?? req.query.trace;
+  return flag === true || flag === "1" || flag === "true";
+}
+
+/**
+ * Start tracing an HTTP request if it asked for it
+ * @param {Object} req - Express request
+ * @param {Object} args - Arguments recorded on the request's top-level span
+ * @returns {RequestTrace|null}
+ */
+export function startTrace(req, args = {}) {
+  if (!wantsTrace(req)) {
+    return null;
+  }
+  return traceStore.add(new RequestTrace(`${req.method} ${req.path}`, args));
+}
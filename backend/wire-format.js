@@ -0,0 +1,125 @@
+// Columnar analysis results (frame kind 1), the layout written by python/wire_format.py:
+//   magic "CCOL" | version u16 | reserved u16 | meta length u32 | meta JSON | 4-byte aligned columns
+// All numbers are little-endian. Only Uint8Array, DataView and TextDecoder are used, so the decoder
+// runs unchanged in the browser on a fetch() ArrayBuffer.
+
+export const FRAME_COLUMNS = 1;
+
+// Media types of the /analyze-pgn variants a client can ask for with Accept
+export const COLUMNS_CONTENT_TYPE = "application/vnd.chess-analysis.columns";
+export const COLUMNS_JSON_CONTENT_TYPE = "application/vnd.chess-analysis.columns+json";
+
+const MAGIC = "CCOL";
+const VERSION = 1;
+const HEADER_SIZE = 12;
+
+export const NULL_I32 = -2147483648;
+export const NULL_U16 = 0xffff;
+
+const TYPED_ARRAYS = { i32: Int32Array, u16: Uint16Array, u8: Uint8Array };
+const EVALUATION_COLUMNS = ["evaluation", "previous_position_evaluation", "move_played_evaluation", "best_move_evaluation"];
+const STRING_COLUMNS = ["move_played", "worker_id", "opening", "terminal", "error"];
+const PROMOTIONS = ["", "", "n", "b", "r", "q"];
+
+const textDecoder = new TextDecoder();
+const textEncoder = new TextEncoder();
+
+/**
+ * Unpack a 16-bit move (from | to << 6 | promotion << 12, as in python/opening_book.py) to UCI
+ * @param {number} value - Packed move
+ * @returns {string|null} UCI move, or null for "no move"
+ */
+export function decodeMove(value) {
+  if (value === 0) {
+    return null;
+  }
+  const square = (index) => String.fromCharCode(97 + (index & 7)) + String((index >> 3) + 1);
+  return square(value & 0x3f) + square((value >> 6) & 0x3f) + PROMOTIONS[(value >> 12) & 0x7];
+}
+
+/**
+ * Decode a columnar payload into its message, with the per-ply results as typed arrays
+ * @param {Uint8Array} payload - Frame payload (a Buffer works too)
+ * @returns {Object} The message (e.g. { id, ok, result }); result (or data, for events) gets a
+ *   "columns" field: { plies, start_fen, dictionary, layout, bytes, values: { name: TypedArray } }
+ */
+export function decodeColumns(payload) {
+  const view = new DataView(payload.buffer, payload.byteOffset, payload.byteLength);
+  const magic = textDecoder.decode(payload.subarray(0, 4));
+  const version = view.getUint16(4, true);
+  if (magic !== MAGIC || version !== VERSION) {
+    throw new Error(`Not a columnar payload (version ${VERSION})`);
+  }
+  const metaLength = view.getUint32(8, true);
+  const message = JSON.parse(textDecoder.decode(payload.subarray(HEADER_SIZE, HEADER_SIZE + metaLength)));
+  const described = message.columns;
+  delete message.columns;
+
+  // Typed array views need aligned offsets, which pipe chunks do not guarantee: copy once if needed
+  let bytes = payload.subarray(HEADER_SIZE + metaLength);
+  if (bytes.byteOffset % 4 !== 0) {
+    bytes = new Uint8Array(bytes);
+  }
+  const values = {};
+  for (const [name, type, offset, count] of described.layout) {
+    values[name] = new TYPED_ARRAYS[type](bytes.buffer, bytes.byteOffset + offset, count);
+  }
+
+  const key = message.event ? "data" : "result";
+  message[key] = {
+    ...message[key],
+    columns: { plies: described.plies, start_fen: described.start_fen, dictionary: described.dictionary, layout: described.layout, bytes, values }
+  };
+  return message;
+}
+
+/**
+ * Re-encode a decoded result as a columnar HTTP body (same layout, no request id); the column
+ * bytes are passed through as they came from Python
+ * @param {Object} result - A result returned by decodeColumns (with its "columns" field)
+ * @returns {Buffer}
+ */
+export function encodeColumnsBody(result) {
+  const { columns, ...summary } = result;
+  const { plies, start_fen, dictionary, layout, bytes } = columns;
+  let meta = textEncoder.encode(JSON.stringify({ result: summary, columns: { plies, start_fen, dictionary, layout } }));
+  const padding = (4 - (meta.length % 4)) % 4;
+  const header = Buffer.alloc(HEADER_SIZE);
+  header.write(MAGIC, 0, "latin1");
+  header.writeUInt16LE(VERSION, 4);
+  header.writeUInt32LE(meta.length + padding, 8);
+  return Buffer.concat([header, meta, Buffer.alloc(padding, " "), bytes]);
+}
+
+/**
+ * Plain-JSON form of the columns: one array per field, moves as UCI, nulls instead of sentinels;
+ * string columns stay indexes into "dictionary"
+ * @param {Object} columns - The "columns" field of a decoded result
+ * @returns {Object}
+ */
+export function columnsToJSON(columns) {
+  const { plies, start_fen, dictionary, values } = columns;
+  const nullable = (array, missing) => Array.from(array, (value) => (value === missing ? null : value));
+  const body = {
+    plies,
+    start_fen,
+    dictionary,
+    move_number: Array.from(values.move_number),
+    success: Array.from(values.success, Boolean),
+    depth: Array.from(values.depth),
+    best_move: Array.from(values.best_move, decodeMove)
+  };
+  for (const name of EVALUATION_COLUMNS) {
+    body[name] = nullable(values[name], NULL_I32);
+  }
+  for (const name of STRING_COLUMNS) {
+    body[name] = nullable(values[name], NULL_U16);
+  }
+  let start = 0;
+  body.pv = Array.from(values.pv_length, (length) => {
+    const pv = Array.from(values.pv.subarray(start, start + length), decodeMove);
+    start += length;
+    return pv;
+  });
+  return body;
+}
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Minimal UCI engine for the tests: answers the handshake and isready, and
+"searches" any position by reporting one info line per depth (score
+cp 10 * depth, pv e2e4 e7e5) and bestmove e2e4. FAKE_ENGINE_DELAY sets
+the seconds spent per depth.
+"""
+
+import os
+import sys
+import time
+import threading
+
+DELAY = float(os.environ.get("FAKE_ENGINE_DELAY", "0.01"))
+
+stop = threading.Event()
+
+def search(depth):
+    for d in range(1, depth + 1):
+        if stop.is_set():
+            break
+        time.sleep(DELAY)
+        print(f"info depth {d} seldepth {d} multipv 1 score cp {10 * d} nodes {d * 100} nps 1000 time {d} pv e2e4 e7e5", flush=True)
+    print("bestmove e2e4 ponder e7e5", flush=True)
+
+def main():
+    searching = None
+    for line in sys.stdin:
+        command = line.split()
+        if not command:
+            continue
+        if command[0] == "uci":
+            print("id name Fake\noption name Hash type spin\noption name Threads type spin\nuciok", flush=True)
+        elif command[0] == "isready":
+            print("readyok", flush=True)
+        elif command[0] == "go":
+            stop.clear()
+            depth = int(command[2]) if len(command) > 2 and command[1] == "depth" else 10
+            searching = threading.Thread(target=search, args=(depth,))
+            searching.start()
+        elif command[0] == "stop":
+            stop.set()
+        elif command[0] == "quit":
+            break
+    stop.set()
+    if searching is not None:
+        searching.join()
+
+if __name__ == "__main__":
+    main()
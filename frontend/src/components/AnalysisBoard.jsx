@@ -122,6 +122,7 @@ const AnalysisBoard = () => {
   const [bulkAnalysisResults, setBulkAnalysisResults] = useState({});
   const [isBulkAnalyzing, setIsBulkAnalyzing] = useState(false);
   const [bulkAnalysisProgress, setBulkAnalysisProgress] = useState(0);
+  const bulkSessionIdRef = useRef(null); // Backend session of the last bulk analysis, lets edits re-use unchanged plies
   const [useBulkResults, setUseBulkResults] = useState(false);
   const [lastEvaluation, setLastEvaluation] = useState(0);
   
@@ -435,8 +436,8 @@ const AnalysisBoard = () => {
       console.log('🚀 Starting bulk PGN analysis...');
       console.log(`📊 Analyzing ${allMoves.length + 1} positions`);
       
-      // Send PGN to backend for bulk analysis
-      const response = await fetch('http://localhost:5000/analyze-pgn', {
+      // Stream PGN analysis from the backend; each ply arrives as a Server-Sent Event
+      const response = await fetch('http://localhost:5000/analyze-pgn/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -444,46 +445,80 @@ const AnalysisBoard = () => {
         body: JSON.stringify({
           pgn: pgnString,
           depth: 10,
-          useMultiWorker: true
+          anytime: true, // Quick low-depth pass first, then each ply is refined to full depth
+          sessionId: bulkSessionIdRef.current
         })
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Backend analysis failed: ${response.status}`);
       }
 
-      const result = await response.json();
-      
-      if (result.success) {
-        console.log(`✅ Bulk analysis complete: ${result.total_positions} positions in ${result.analysis_time}s`);
-        console.log(`📈 Speed: ${result.positions_per_second} positions/second`);
-        
-        // Convert backend results to frontend format
-        const analysisResults = {};
-        Object.keys(result.results).forEach(moveKey => {
-          const analysis = result.results[moveKey];
-          if (analysis.success) {
-            console.log(`📊 Position ${moveKey} - best_move from previous:`, analysis.best_move);
-            console.log(`📊 Position ${moveKey} - evaluation:`, analysis.evaluation);
-            analysisResults[analysis.fen] = {
-              evaluation: analysis.evaluation || 0, // Raw centipawn values from backend
-              depth: analysis.depth || 10,
-              bestLine: analysis.best_move || '',
-              mate: '', // No separate mate handling needed
-              movePlayed: analysis.move_played || null, // Track which move was actually played
-              movePlayedEvaluation: analysis.move_played_evaluation || null, // Evaluation of move played
-              bestMoveEvaluation: analysis.best_move_evaluation || null, // Evaluation of best move
-              previousPositionEvaluation: analysis.previous_position_evaluation ?? null // Evaluation of previous position
-            };
+      // Convert one backend ply result to the frontend format
+      const applyPlyResult = (analysis) => {
+        if (!analysis.success) return;
+        setBulkAnalysisResults(prev => ({
+          ...prev,
+          [analysis.fen]: {
+            evaluation: analysis.evaluation || 0, // Raw centipawn values from backend
+            depth: analysis.depth || 18,
+            bestLine: analysis.best_move || '',
+            mate: '', // No separate mate handling needed
+            movePlayed: analysis.move_played || null, // Track which move was actually played
+            movePlayedEvaluation: analysis.move_played_evaluation || null, // Evaluation of move played
+            bestMoveEvaluation: analysis.best_move_evaluation || null, // Evaluation of best move
+            previousPositionEvaluation: analysis.previous_position_evaluation ?? null // Evaluation of previous position
           }
-        });
-        
-        setBulkAnalysisResults(analysisResults);
-        setBulkAnalysisProgress(result.total_positions);
-        setUseBulkResults(true); // Enable showing bulk results after completion
-      } else {
-        throw new Error(result.error || 'Bulk analysis failed');
+        }));
+        // Progress counts plies that reached full depth; earlier passes only refresh the graph
+        if (analysis.final !== false) {
+          setBulkAnalysisProgress(prev => prev + 1);
+        }
+        setUseBulkResults(true); // Show results on the board as soon as they arrive
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let summary = null;
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventName = 'message';
+          let data = '';
+          rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) eventName = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+          });
+          if (!data) continue;
+
+          const payload = JSON.parse(data);
+          if (eventName === 'ply') {
+            applyPlyResult(payload);
+          } else if (eventName === 'summary') {
+            summary = payload;
+          } else if (eventName === 'error') {
+            throw new Error(payload.error || 'Bulk analysis failed');
+          }
+        }
+      }
+
+      if (!summary || !summary.success) {
+        throw new Error((summary && summary.error) || 'Bulk analysis ended unexpectedly');
       }
+      bulkSessionIdRef.current = summary.session_id || null;
+      console.log(`✅ Bulk analysis complete: ${summary.total_positions} positions in ${summary.analysis_time}s`);
+      console.log(`📈 Speed: ${summary.positions_per_second} positions/second`);
+      setBulkAnalysisProgress(summary.total_positions);
       
     } catch (error) {
       console.error('❌ Bulk analysis failed:', error);
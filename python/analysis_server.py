@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Long-lived analysis daemon for the Node backend.
+
+Keeps the Python interpreter, python-chess and a pool of warm Stockfish
+engines alive between requests. Requests and responses are length-prefixed
+frames over stdin/stdout (default) or a Unix socket (--socket PATH):
+
+    +------------------+---------+------------------+
+    | length (u32, BE) | kind u8 | payload (length) |
+    +------------------+---------+------------------+
+
+``length`` counts the payload only. Kind 0 is a UTF-8 JSON object. Kind 1
+is a columnar response or event (see wire_format.py): requests with
+``"format": "columns"`` in their params get messages that carry per-ply
+results (analyze_pgn responses, analyze_corpus "game" events) in that
+form, everything else stays JSON. Requests
+look like {"id": "...", "method": "analyze", "params": {...}} and every
+response echoes the request id, so many requests can be in flight at once
+and may complete in any order. A request with ``"trace": true`` in its
+params gets a "trace" event (Chrome Trace Event spans, see tracing.py)
+just before its response.
+"""
+
+import os
+import sys
+import json
+import struct
+import time
+import argparse
+import threading
+import traceback
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from metrics import get_registry, set_ply_logging
+from wire_format import encode_columns
+import tracing
+
+REQUEST_SECONDS = get_registry().histogram("analysis_request_seconds", "Analysis server request latency, by method")
+REQUESTS = get_registry().counter("analysis_requests_total", "Analysis server requests, by method and status (ok, error)")
+REQUESTS_QUEUED = get_registry().gauge("analysis_requests_queued", "Requests received but not yet picked up by a request thread")
+REQUESTS_RUNNING = get_registry().gauge("analysis_requests_in_flight", "Requests currently being handled")
+
+FRAME_HEADER = struct.Struct(">IB")
+FRAME_JSON = 0
+FRAME_COLUMNS = 1
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+def read_exact(stream, size):
+    """Read exactly ``size`` bytes, or return None on a clean EOF"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise EOFError("Connection closed in the middle of a frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def read_frame(stream):
+    """Read one frame; returns (kind, payload) or None at EOF"""
+    header = read_exact(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+    length, kind = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {length} bytes")
+    payload = read_exact(stream, length) if length else b""
+    if payload is None:
+        raise EOFError("Connection closed before frame payload")
+    return kind, payload
+
+def write_frame(stream, kind, payload):
+    """Write one frame and flush it"""
+    stream.write(FRAME_HEADER.pack(len(payload), kind) + payload)
+    stream.flush()
+
+def encode_json(message):
+    return json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+def encode_message(message, columns=False):
+    """(kind, payload) of a response or event; with ``columns``, one carrying ply results goes out columnar"""
+    key = "data" if "event" in message else "result"
+    body = message.get(key)
+    if columns and isinstance(body, dict) and body.get("results"):
+        return FRAME_COLUMNS, encode_columns(message, key)
+    return FRAME_JSON, encode_json(message)
+
+class AnalysisServer:
+    """Dispatch framed requests to the analyzers on a thread pool"""
+
+    def __init__(self, pool_size=None, hash_mb=256, threads=None, max_concurrency=None, placement=None, engine_backend=None):
+        # Configure the shared engine pool before any analyzer touches it;
+        # unset sizes come from the CPU placement plan
+        from engine_pool import get_shared_pool
+        from worker_placement import plan_placement
+        from async_engine import get_engine_backend, get_shared_async_pool
+        self.placement = plan_placement(placement)
+        pool_size = pool_size or self.placement.workers
+        threads = threads or self.placement.threads
+        self.engine_backend = get_engine_backend(engine_backend)
+        self.pool = get_shared_pool(size=pool_size, hash_mb=hash_mb, threads=threads, placement=self.placement)
+        # The asyncio backend drives its own engines from one event loop thread
+        self.async_pool = None
+        if self.engine_backend == "asyncio":
+            self.async_pool = get_shared_async_pool(size=pool_size, hash_mb=hash_mb, threads=threads, placement=self.placement)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency or max(4, pool_size * 2),
+            thread_name_prefix="request"
+        )
+        self.handlers = {
+            "ping": self.handle_ping,
+            "stats": self.handle_stats,
+            "analyze": self.handle_analyze,
+            "analyze_pgn": self.handle_analyze_pgn,
+            "analyze_corpus": self.handle_analyze_corpus,
+            "metrics": self.handle_metrics
+        }
+        get_registry().add_collector(self.collect_pool_metrics)
+
+    def handle_ping(self, params, emit):
+        return {"pong": True}
+
+    def handle_stats(self, params, emit):
+        from eval_cache import get_shared_cache
+        from game_sessions import get_session_store
+        cache = get_shared_cache()
+        return {
+            "pool": self.pool.stats(),
+            "engine_backend": self.engine_backend,
+            "async_pool": self.async_pool.stats() if self.async_pool else None,
+            "placement": self.placement.to_dict(),
+            "sessions": get_session_store().stats() if get_session_store() else None,
+            "cache": cache.stats() if cache else None
+        }
+
+    def handle_metrics(self, params, emit):
+        return get_registry().snapshot()
+
+    def collect_pool_metrics(self):
+        """Engine pool occupancy, sampled whenever metrics are read"""
+        samples = {"engine_pool_size": [], "engine_pool_alive": [], "engine_pool_idle": []}
+        pools = [("threads", self.pool)]
+        if self.async_pool is not None:
+            pools.append(("asyncio", self.async_pool))
+        for backend, pool in pools:
+            stats = pool.stats()
+            samples["engine_pool_size"].append({"labels": {"backend": backend}, "value": stats["size"]})
+            samples["engine_pool_alive"].append({"labels": {"backend": backend}, "value": stats["alive"]})
+            samples["engine_pool_idle"].append({"labels": {"backend": backend}, "value": stats["idle"]})
+        return [
+            {"name": "engine_pool_size", "type": "gauge", "help": "Maximum engines per pool", "samples": samples["engine_pool_size"]},
+            {"name": "engine_pool_alive", "type": "gauge", "help": "Engine processes currently running", "samples": samples["engine_pool_alive"]},
+            {"name": "engine_pool_idle", "type": "gauge", "help": "Engines waiting in the pool for work", "samples": samples["engine_pool_idle"]}
+        ]
+
+    def handle_analyze(self, params, emit):
+        from engine_safe import analyze_position
+        # With "stream", every completed iteration is sent as a "depth" event
+        on_update = (lambda partial: emit("depth", partial)) if params.get("stream") else None
+        return analyze_position(
+            params["fen"],
+            params.get("depth", 10),
+            on_update=on_update,
+            engine_backend=params.get("engine_backend") or self.engine_backend
+        )
+
+    def handle_analyze_pgn(self, params, emit):
+        from ultra_fast_pgn_analyzer import analyze_pgn_ultra_fast
+        on_result = None
+        if params.get("stream"):
+            # Send each ply as a "ply" event; the final response is the summary.
+            # With "anytime" every ply is sent once per deepening pass.
+            on_result = lambda ply_result: emit("ply", ply_result)
+        return analyze_pgn_ultra_fast(
+            params["pgn"],
+            params.get("depth", 10),
+            params.get("max_workers"),
+            params.get("mode", "single_pass"),
+            on_result=on_result,
+            placement=params.get("placement"),
+            session_id=params.get("session_id"),
+            anytime=params.get("anytime", False),
+            engine_backend=params.get("engine_backend") or self.engine_backend,
+            job_id=params.get("job_id"),
+            resume=params.get("resume", False)
+        )
+
+    def handle_analyze_corpus(self, params, emit):
+        from ultra_fast_pgn_analyzer import analyze_corpus
+        from job_journal import truncate_torn_line
+        # Each finished game is sent as a "game" event and/or written to params["output"]
+        on_game = None if params.get("quiet") else (lambda record: emit("game", record))
+        kwargs = {
+            "depth": params.get("depth", 10),
+            # Distributed runs size themselves from the connected worker hosts
+            "max_workers": params.get("max_workers") or (None if params.get("distributed") else self.pool.size),
+            "placement": params.get("placement"),
+            "on_game": on_game,
+            "max_games_in_flight": params.get("max_games_in_flight"),
+            "job_id": params.get("job_id"),
+            "resume": params.get("resume", False),
+            "distributed": params.get("distributed", False)
+        }
+        if params.get("output"):
+            # A resumed job appends to the output it wrote before the interruption
+            resume = kwargs["resume"] and os.path.exists(params["output"])
+            if resume:
+                truncate_torn_line(params["output"])
+            with open(params["output"], "a" if resume else "w", encoding="utf-8") as output:
+                return analyze_corpus(params["paths"], output=output, **kwargs)
+        return analyze_corpus(params["paths"], **kwargs)
+
+    def run_traced(self, trace, request_id, method, handler, params, emit, received=None):
+        """Run a handler with tracing on and return its encoded response.
+
+        The spans go out as a "trace" event before the response, so the
+        client has them by the time the request completes (or fails).
+        """
+        if received is not None:
+            read_at, decoded_at = received
+            trace.add("decode request", read_at, decoded_at - read_at, track="protocol reader", category="server")
+            trace.add("queued", decoded_at, time.time() - decoded_at, track="request queue", category="server")
+        try:
+            with tracing.activate(trace):
+                with tracing.span(method, category="server"):
+                    result = handler(params, emit)
+                with tracing.span("serialize response", category="server") as serialize:
+                    kind, payload = encode_message({"id": request_id, "ok": True, "result": result}, params.get("format") == "columns")
+                    serialize.set(bytes=len(payload), kind=kind)
+            return kind, payload
+        finally:
+            emit("trace", {"events": trace.events()})
+
+    def dispatch(self, message, send, received=None):
+        """Run one request and send its response through ``send``.
+
+        ``received`` is the (read, decoded) wall-clock times of the request
+        frame, used for the queueing spans of traced requests.
+        """
+        request_id = message.get("id")
+        method = message.get("method")
+        params = message.get("params") or {}
+        columns = params.get("format") == "columns"
+
+        def emit(event, data):
+            # Intermediate events for long-running requests
+            send(encode_message({"id": request_id, "event": event, "data": data}, columns))
+
+        REQUESTS_RUNNING.inc()
+        start_time = time.perf_counter()
+        status = "ok"
+        try:
+            handler = self.handlers.get(method)
+            if handler is None:
+                raise ValueError(f"Unknown method: {method}")
+            if params.get("trace"):
+                send(self.run_traced(tracing.Trace(method), request_id, method, handler, params, emit, received))
+            else:
+                result = handler(params, emit)
+                send(encode_message({"id": request_id, "ok": True, "result": result}, columns))
+        except Exception as e:
+            status = "error"
+            print(f"SERVER: Request {request_id} ({method}) failed: {e}", file=sys.stderr)
+            print(traceback.format_exc(), file=sys.stderr)
+            send({"id": request_id, "ok": False, "error": str(e)})
+        finally:
+            REQUESTS_RUNNING.dec()
+            # Unknown methods share one label so clients cannot grow the series without bound
+            label = method if method in self.handlers else "unknown"
+            REQUEST_SECONDS.observe(time.perf_counter() - start_time, method=label)
+            REQUESTS.inc(method=label, status=status)
+
+    def dispatch_queued(self, message, send, received=None):
+        """Executor entry point: the request leaves the queue as it starts running"""
+        REQUESTS_QUEUED.dec()
+        self.dispatch(message, send, received)
+
+    def serve_stream(self, reader, writer):
+        """Serve one framed connection until EOF"""
+        write_lock = threading.Lock()
+
+        def send(message):
+            # Responses and events arrive already encoded as (kind, payload) unless they are plain JSON
+            kind, payload = message if isinstance(message, tuple) else (FRAME_JSON, encode_json(message))
+            with write_lock:
+                write_frame(writer, kind, payload)
+
+        while True:
+            frame = read_frame(reader)
+            if frame is None:
+                break
+            kind, payload = frame
+            read_at = time.time()
+            if kind != FRAME_JSON:
+                send({"id": None, "ok": False, "error": f"Unsupported frame kind {kind}"})
+                continue
+            try:
+                message = json.loads(payload.decode("utf-8"))
+            except ValueError as e:
+                send({"id": None, "ok": False, "error": f"Invalid JSON request: {e}"})
+                continue
+            if message.get("method") == "shutdown":
+                send({"id": message.get("id"), "ok": True, "result": {"shutdown": True}})
+                return False
+            REQUESTS_QUEUED.inc()
+            self.executor.submit(self.dispatch_queued, message, send, (read_at, time.time()))
+        return True
+
+    def close(self):
+        from engine_pool import close_shared_pool
+        from async_engine import close_engine_loop
+        from distributed import close_shared_coordinator
+        self.executor.shutdown(wait=True)
+        close_shared_pool()
+        close_engine_loop()
+        close_shared_coordinator()
+
+def serve_unix_socket(server, path):
+    """Accept framed connections on a Unix socket (one thread per connection)"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            if server.serve_stream(self.rfile, self.wfile) is False:
+                threading.Thread(target=unix_server.shutdown, daemon=True).start()
+
+    class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(path):
+        os.unlink(path)
+    unix_server = ThreadingUnixServer(path, Handler)
+    print(f"SERVER: Listening on {path}", file=sys.stderr)
+    try:
+        unix_server.serve_forever()
+    finally:
+        unix_server.server_close()
+        os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent chess analysis server")
+    parser.add_argument("--socket", help="Serve on a Unix socket instead of stdin/stdout")
+    parser.add_argument("--pool-size", type=int, default=None, help="Number of warm engines (default: from placement)")
+    parser.add_argument("--hash", type=int, default=256, help="Hash per engine in MB")
+    parser.add_argument("--threads", type=int, default=None, help="Search threads per engine (default: from placement)")
+    parser.add_argument("--placement", choices=("throughput", "latency"), default=None,
+                        help="throughput: many 1-thread engines; latency: few multi-thread engines")
+    parser.add_argument("--engine-backend", choices=("threads", "asyncio"), default=None,
+                        help="threads: one blocking thread per search; asyncio: all engines on one event loop (default: ENGINE_BACKEND or threads)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Skip per-ply progress lines on stderr (same as ANALYSIS_PLY_LOG=0)")
+    args = parser.parse_args()
+    if args.quiet:
+        set_ply_logging(False)
+
+    # stdout carries protocol frames; route stray prints to stderr
+    protocol_in = sys.stdin.buffer
+    protocol_out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    server = AnalysisServer(pool_size=args.pool_size, hash_mb=args.hash, threads=args.threads, placement=args.placement, engine_backend=args.engine_backend)
+    print(f"SERVER: Analysis server ready (pool size {server.pool.size}, {server.placement.mode} placement, {server.engine_backend} engines)", file=sys.stderr)
+    from distributed import get_shared_coordinator
+    # Listen for worker hosts right away (DISTRIBUTED_LISTEN) so they are connected before the first distributed job
+    get_shared_coordinator()
+    try:
+        if args.socket:
+            serve_unix_socket(server, args.socket)
+        else:
+            server.serve_stream(protocol_in, protocol_out)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print("SERVER: Shut down", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
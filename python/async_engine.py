@@ -0,0 +1,571 @@
+"""
+asyncio engine layer: many Stockfish processes driven from one event loop.
+
+``AsyncUciEngine`` talks UCI over ``asyncio.create_subprocess_exec`` pipes,
+so a waiting search costs a pending read instead of a blocked thread and
+reader thread per engine. ``AsyncEnginePool`` mirrors ``EnginePool`` (lazy
+spawn, health checks, CPU placement) for async callers, and
+``EngineLoop`` runs the shared loop on a background thread so the
+synchronous analyzers can submit coroutines to it.
+
+Select it with ENGINE_BACKEND=asyncio (the default is "threads").
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from uci_engine import UciError, SearchAccumulator, go_command, white_relative
+from engine_pool import DEFAULT_ENGINE_PARAMETERS, get_stockfish_path, _env_int
+from tablebase import get_syzygy_path
+from worker_placement import pin_process
+from metrics import ENGINE_SPAWNS, ENGINE_DISCARDS, ENGINE_WAITING
+import tracing
+
+ENGINE_BACKENDS = ("threads", "asyncio")
+
+def get_engine_backend(backend=None):
+    """Resolve the engine backend from an explicit choice or ENGINE_BACKEND"""
+    backend = backend or os.environ.get("ENGINE_BACKEND") or "threads"
+    if backend not in ENGINE_BACKENDS:
+        print(f"WARNING: Unknown engine backend {backend!r}, using threads", file=sys.stderr)
+        return "threads"
+    return backend
+
+class AsyncUciEngine:
+    """UCI client for one engine process whose every wait is a coroutine.
+
+    Create it with ``await AsyncUciEngine.start(path, options)``. Searches
+    return the same result dict as ``UciEngine.go()``. Cancelling the task
+    awaiting a search sends ``stop`` and drains the engine up to its
+    ``bestmove`` before the cancellation propagates, so the engine stays in
+    sync and can be reused.
+    """
+
+    def __init__(self, path, process):
+        self.path = path
+        self.name = None
+        self.supported_options = set()
+        self._process = process
+        self._stdout_closed = False
+
+    @classmethod
+    async def start(cls, path, options=None, startup_timeout=10):
+        process = await asyncio.create_subprocess_exec(
+            path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        engine = cls(path, process)
+        try:
+            await engine._handshake(options, startup_timeout)
+        except BaseException:
+            await engine.quit()
+            raise
+        return engine
+
+    async def _handshake(self, options, timeout):
+        self.send("uci")
+        deadline = time.time() + timeout
+        while True:
+            line = await self._read_line(max(0, deadline - time.time()))
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+            elif line.startswith("option name "):
+                # option name <Name with spaces> type <t> ...
+                option = line[len("option name "):].split(" type ")[0]
+                self.supported_options.add(option)
+            elif line == "uciok":
+                break
+
+        for name, value in (options or {}).items():
+            self.set_option(name, value)
+        await self.is_ready(timeout)
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    async def _read_line(self, timeout=None):
+        if self._stdout_closed:
+            raise UciError("Engine process terminated")
+        try:
+            raw = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out waiting for engine output")
+        if not raw:
+            self._stdout_closed = True
+            raise UciError("Engine process terminated")
+        return raw.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def send(self, command):
+        """Queue one raw UCI command (the pipe is flushed by the event loop)"""
+        if self._process.returncode is not None or self._process.stdin.is_closing():
+            raise UciError("Engine process terminated")
+        try:
+            self._process.stdin.write((command + "\n").encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError, OSError) as e:
+            raise UciError(f"Failed to write to engine: {e}")
+
+    def set_option(self, name, value):
+        """Set a UCI option; options unknown to this engine build are skipped"""
+        if self.supported_options and name not in self.supported_options:
+            return False
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        self.send(f"setoption name {name} value {value}")
+        return True
+
+    def is_alive(self):
+        return self._process.returncode is None and not self._stdout_closed
+
+    async def is_ready(self, timeout=10):
+        """Round-trip ``isready``; raises on timeout or a dead engine"""
+        self.send("isready")
+        deadline = time.time() + timeout
+        while await self._read_line(max(0, deadline - time.time())) != "readyok":
+            pass
+        return True
+
+    async def new_game(self):
+        """Clear hash and history (``ucinewgame``)"""
+        self.send("ucinewgame")
+        await self.is_ready()
+
+    def set_position(self, fen=None, moves=None):
+        """Set the position from a FEN (or the start position) plus optional UCI moves"""
+        command = f"position fen {fen}" if fen else "position startpos"
+        if moves:
+            command += " moves " + " ".join(moves)
+        self.send(command)
+
+    async def go(self, depth=None, nodes=None, movetime=None, timeout=None, on_info=None):
+        """Run one search; same limits, timeout and ``on_info`` semantics as ``UciEngine.go()``"""
+        search = SearchAccumulator(on_info)
+        self.send(go_command(depth, nodes, movetime))
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else max(0, deadline - time.time())
+                try:
+                    line = await self._read_line(remaining)
+                except TimeoutError:
+                    if search.stopped:
+                        raise
+                    # Ask the engine to finish; it still answers with bestmove
+                    self.stop()
+                    search.stopped = True
+                    deadline = time.time() + 5
+                    continue
+                if search.feed(line):
+                    return search.result
+        except asyncio.CancelledError:
+            if not search.stopped:
+                self.stop()
+                search.stopped = True
+            # Consume the rest of the search so the next request starts clean
+            await asyncio.shield(self._drain_search())
+            raise
+
+    async def _drain_search(self, timeout=5):
+        try:
+            deadline = time.time() + timeout
+            while not (await self._read_line(max(0, deadline - time.time()))).startswith("bestmove"):
+                pass
+        except (TimeoutError, UciError):
+            pass
+
+    async def analyse(self, fen, depth=None, nodes=None, movetime=None, timeout=None, on_info=None):
+        """Search ``fen`` once; adds a white-relative ``evaluation`` to the result (and to each ``on_info`` snapshot)"""
+        self.set_position(fen)
+        if on_info is not None:
+            callback = on_info
+            on_info = lambda snapshot: callback(dict(snapshot, evaluation=white_relative(snapshot, fen)))
+        result = await self.go(depth=depth, nodes=nodes, movetime=movetime, timeout=timeout, on_info=on_info)
+        result["evaluation"] = white_relative(result, fen)
+        return result
+
+    def stop(self):
+        self.send("stop")
+
+    async def quit(self, timeout=2):
+        """Ask the engine to exit, killing it if it does not"""
+        try:
+            if self.is_alive():
+                self.send("quit")
+                await asyncio.wait_for(self._process.wait(), timeout)
+        except Exception:
+            pass
+        if self._process.returncode is None:
+            try:
+                self._process.kill()
+                await asyncio.wait_for(self._process.wait(), timeout)
+            except Exception as e:
+                print(f"WARNING: Failed to kill engine {self.pid}: {e}", file=sys.stderr)
+
+class AsyncEnginePool:
+    """Pool of warm ``AsyncUciEngine`` processes bound to one event loop.
+
+    Same contract as ``EnginePool``: engines start lazily up to ``size``,
+    are reset with ``ucinewgame`` on checkout, health-checked before reuse,
+    pinned to their placement slot's CPUs and handed to queued checkouts in
+    arrival order. All methods must run on the pool's event loop.
+    """
+
+    def __init__(self, size=1, hash_mb=128, threads=1, parameters=None, stockfish_path=None, placement=None):
+        if size < 1:
+            raise ValueError("Engine pool size must be at least 1")
+        self.size = size
+        self.hash_mb = hash_mb
+        self.threads = threads
+        self.stockfish_path = stockfish_path
+        self.placement = placement
+        self.parameters = dict(DEFAULT_ENGINE_PARAMETERS)
+        if parameters:
+            self.parameters.update(parameters)
+        self.parameters["Hash"] = hash_mb
+        self.parameters["Threads"] = threads
+        # Let searches probe the same tablebases the analyzers answer from
+        syzygy_path = get_syzygy_path()
+        if syzygy_path is not None:
+            self.parameters.setdefault("SyzygyPath", syzygy_path)
+
+        self._idle = []
+        # Futures of queued checkouts, resolved with (engine, spawn) in arrival order
+        self._waiters = deque()
+        self._created = 0
+        self._closed = False
+        # Engine -> placement slot, so a replacement engine reuses the freed CPUs
+        self._slots = {}
+        self._stats = {
+            "spawned": 0,
+            "discarded": 0,
+            "checkouts": 0,
+            "resets": 0
+        }
+
+    async def _spawn(self):
+        """Start a new Stockfish process with the pool's parameters"""
+        if self.stockfish_path is None:
+            self.stockfish_path = get_stockfish_path()
+        start_time = time.time()
+        with tracing.span("engine boot", hash_mb=self.hash_mb, threads=self.threads) as boot:
+            engine = await AsyncUciEngine.start(self.stockfish_path, options=self.parameters)
+            boot.set(engine=engine.pid)
+            boot.set_track(f"engine {engine.pid}")
+        self._stats["spawned"] += 1
+        ENGINE_SPAWNS.inc(backend="asyncio")
+        cpus = None
+        if self.placement is not None:
+            used = set(self._slots.values())
+            slot = next(i for i in range(len(used) + 1) if i not in used)
+            self._slots[engine] = slot
+            cpus = self.placement.cpus_for_slot(slot)
+        pinned = pin_process(engine.pid, cpus) if cpus else False
+        placement = f", CPUs={cpus}" if pinned else ""
+        print(f"ASYNC POOL: Started engine in {time.time() - start_time:.2f}s (Hash={self.hash_mb}MB, Threads={self.threads}{placement})", file=sys.stderr)
+        return engine
+
+    async def _destroy(self, engine):
+        """Terminate an engine process and free its pool slot"""
+        await engine.quit()
+        self._slots.pop(engine, None)
+        self._created -= 1
+        self._stats["discarded"] += 1
+        ENGINE_DISCARDS.inc(backend="asyncio")
+        self._grant_spawns()
+
+    def _next_waiter(self):
+        """Oldest queued checkout that is still waiting, or None"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                return waiter
+        return None
+
+    def _grant_spawns(self):
+        """Let the oldest waiters start engines while below capacity"""
+        while self._created < self.size:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._created += 1
+            waiter.set_result((None, True))
+
+    def _hand_off(self, engine):
+        """Give a returned engine to the oldest waiter, or park it as idle"""
+        waiter = self._next_waiter()
+        if waiter is not None:
+            waiter.set_result((engine, False))
+        else:
+            self._idle.append(engine)
+
+    async def _wait_turn(self, deadline):
+        """Queue behind earlier checkouts until granted (engine, spawn)"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        ENGINE_WAITING.inc(backend="asyncio")
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), remaining)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller gave up: pass the grant on
+                engine, spawn = waiter.result()
+                if spawn:
+                    self._created -= 1
+                    self._grant_spawns()
+                else:
+                    self._hand_off(engine)
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise TimeoutError("Timed out waiting for a free engine")
+            raise
+        finally:
+            ENGINE_WAITING.dec(backend="asyncio")
+
+    async def is_healthy(self, engine):
+        """Check the process is alive and still answers isready"""
+        try:
+            if not engine.is_alive():
+                return False
+            with tracing.span("engine health check", track=f"engine {engine.pid}", engine=engine.pid):
+                return await engine.is_ready(timeout=5)
+        except Exception:
+            return False
+
+    async def checkout(self, timeout=None, new_game=True):
+        """Take an engine from the pool, starting one if below capacity"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("Engine pool is closed")
+
+            engine = None
+            spawn = False
+            # Nobody overtakes a queued checkout
+            if self._waiters:
+                engine, spawn = await self._wait_turn(deadline)
+            elif self._idle:
+                engine = self._idle.pop()
+            elif self._created < self.size:
+                # Reserve the slot before the (slow) spawn
+                self._created += 1
+                spawn = True
+            else:
+                engine, spawn = await self._wait_turn(deadline)
+
+            if spawn:
+                try:
+                    engine = await self._spawn()
+                except BaseException:
+                    self._created -= 1
+                    self._grant_spawns()
+                    raise
+            if engine is None:
+                # Woken by close()
+                continue
+
+            if not await self.is_healthy(engine):
+                print("ASYNC POOL: Discarding unhealthy engine", file=sys.stderr)
+                await self._destroy(engine)
+                continue
+
+            if new_game:
+                with tracing.span("ucinewgame", track=f"engine {engine.pid}", engine=engine.pid):
+                    await engine.new_game()
+                self._stats["resets"] += 1
+            self._stats["checkouts"] += 1
+            return engine
+
+    async def checkin(self, engine, healthy=True):
+        """Return an engine to the pool (or discard it if it misbehaved); health is probed at checkout"""
+        if self._closed or not healthy:
+            await self._destroy(engine)
+            return
+        self._hand_off(engine)
+
+    @asynccontextmanager
+    async def engine(self, timeout=None, new_game=True):
+        """Async context manager wrapping checkout/checkin for a single job"""
+        engine = await self.checkout(timeout=timeout, new_game=new_game)
+        healthy = True
+        try:
+            yield engine
+        except BaseException:
+            healthy = await self.is_healthy(engine)
+            raise
+        finally:
+            await self.checkin(engine, healthy=healthy)
+
+    @asynccontextmanager
+    async def lease(self, count, timeout=None):
+        """Reserve up to ``count`` engines for one game (checked out lazily, see ``EnginePool.lease``)"""
+        lease = AsyncEngineLease(self, max(1, min(count, self.size)), timeout=timeout)
+        try:
+            yield lease
+        finally:
+            await lease.release()
+
+    def resize(self, size):
+        """Grow the pool; shrinking only takes effect as engines are returned"""
+        self.size = max(1, size)
+        self._grant_spawns()
+
+    def stats(self):
+        """Snapshot of pool counters"""
+        snapshot = dict(self._stats)
+        snapshot["size"] = self.size
+        snapshot["alive"] = self._created
+        snapshot["idle"] = len(self._idle)
+        snapshot["waiting"] = sum(1 for waiter in self._waiters if not waiter.done())
+        snapshot["placement"] = self.placement.mode if self.placement else None
+        return snapshot
+
+    async def close(self):
+        """Shut down every idle engine; busy engines are stopped on checkin"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        # Queued checkouts wake up and see the pool is closed
+        waiter = self._next_waiter()
+        while waiter is not None:
+            waiter.set_result((None, False))
+            waiter = self._next_waiter()
+        await asyncio.gather(*(self._destroy(engine) for engine in idle), return_exceptions=True)
+
+class AsyncEngineLease:
+    """Engines checked out from an ``AsyncEnginePool`` for the duration of one game"""
+
+    def __init__(self, pool, count, timeout=None):
+        self._pool = pool
+        self._count = count
+        self._timeout = timeout
+        self._engines = []
+        self._idle = asyncio.Queue()
+        self._reserved = 0
+
+    def __len__(self):
+        return len(self._engines)
+
+    async def _acquire(self):
+        while True:
+            if self._idle.empty() and len(self._engines) + self._reserved < self._count:
+                self._reserved += 1
+                try:
+                    engine = await self._pool.checkout(timeout=self._timeout)
+                finally:
+                    self._reserved -= 1
+                self._engines.append(engine)
+                return engine
+
+            engine = await self._idle.get()
+            if engine is not None:
+                return engine
+            # A crashed engine freed its slot; loop to check out a replacement
+
+    @asynccontextmanager
+    async def engine(self):
+        """Borrow one of the leased engines for a single position"""
+        engine = await self._acquire()
+        try:
+            yield engine
+        except BaseException:
+            # Drop a crashed engine; the next borrower checks out a replacement
+            if not await self._pool.is_healthy(engine):
+                self._engines.remove(engine)
+                await self._pool.checkin(engine, healthy=False)
+                # Wake a waiting borrower so it can take the freed slot
+                self._idle.put_nowait(None)
+                engine = None
+            raise
+        finally:
+            if engine is not None:
+                self._idle.put_nowait(engine)
+
+    async def release(self):
+        """Return every leased engine to the pool"""
+        engines, self._engines = self._engines, []
+        for engine in engines:
+            await self._pool.checkin(engine)
+
+class EngineLoop:
+    """A background thread running the event loop that owns the async engines.
+
+    Synchronous callers (the analysis server's request threads, the CLI)
+    hand coroutines to ``run()``; every engine of the shared
+    ``AsyncEnginePool`` is driven from this one loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.pool = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name="engine-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine, timeout=None):
+        """Run ``coroutine`` on the engine loop and wait for its result"""
+        # The loop thread has its own context; carry the caller's request trace over
+        future = asyncio.run_coroutine_threadsafe(tracing.bind(coroutine), self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Caller gave up (timeout or interrupt): cancel the search so the engine stops
+            future.cancel()
+            raise
+
+    def get_pool(self, size=None, hash_mb=None, threads=None, placement=None):
+        """Return this loop's engine pool (ENGINE_POOL_SIZE etc. apply as in ``get_shared_pool``)"""
+        size = _env_int("ENGINE_POOL_SIZE", size or 1)
+        if self.pool is None:
+            # asyncio primitives bind to the running loop lazily, so this is safe from any thread
+            self.pool = AsyncEnginePool(
+                size=size,
+                hash_mb=_env_int("ENGINE_HASH_MB", hash_mb or DEFAULT_ENGINE_PARAMETERS["Hash"]),
+                threads=_env_int("ENGINE_THREADS", threads or DEFAULT_ENGINE_PARAMETERS["Threads"]),
+                placement=placement
+            )
+        elif size > self.pool.size:
+            self.pool.resize(size)
+        return self.pool
+
+    def close(self):
+        """Stop every engine and the loop thread"""
+        if self.pool is not None:
+            try:
+                self.run(self.pool.close(), timeout=30)
+            except Exception as e:
+                print(f"WARNING: Failed to close async engine pool: {e}", file=sys.stderr)
+            self.pool = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop.close()
+
+_shared_loop = None
+_shared_loop_lock = threading.Lock()
+
+def get_engine_loop():
+    """Return the process-wide engine loop, starting its thread on first use"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = EngineLoop()
+        return _shared_loop
+
+def get_shared_async_pool(size=None, hash_mb=None, threads=None, placement=None):
+    """Return the async engine pool on the shared engine loop"""
+    engine_loop = get_engine_loop()
+    with _shared_loop_lock:
+        return engine_loop.get_pool(size=size, hash_mb=hash_mb, threads=threads, placement=placement)
+
+def close_engine_loop():
+    """Stop the shared engine loop and its engines"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is not None:
+            _shared_loop.close()
+            _shared_loop = None
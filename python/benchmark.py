@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Reproducible performance benchmarks for the analysis pipeline.
+
+Every entry point is measured against the fixed corpus in
+benchmarks/corpus.json (openings, middlegames, endgames, mates and full
+games). Python entry points run in a fresh interpreter each, so peak RSS
+and engine start-up are measured from a cold start; the evaluation cache,
+opening book and game sessions are disabled so every number reflects
+engine work.
+
+    python benchmark.py run --depth 10 --output before.json
+    python benchmark.py run --url http://localhost:5000 --entries http_analyze http_analyze_pgn
+    python benchmark.py compare before.json after.json --threshold 0.10
+
+``compare`` exits with status 1 when any metric regressed by more than
+the threshold.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import subprocess
+import urllib.request
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_PATH = os.path.join(SCRIPT_DIR, "benchmarks", "corpus.json")
+RESULT_SCHEMA_VERSION = 1
+
+# Caches would turn repeated runs into lookups; benchmarks measure the engines
+BENCHMARK_ENV = {
+    "EVAL_CACHE": "0",
+    "OPENING_BOOK": "0",
+    "GAME_SESSIONS_MAX": "0"
+}
+
+# Metric name -> True when a larger value is better
+METRIC_DIRECTIONS = {
+    "positions_per_second": True,
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "startup_ms": False,
+    "nodes_per_search": False,
+    "peak_rss_mb.python": False,
+    "peak_rss_mb.engines": False
+}
+
+def load_corpus(path=DEFAULT_CORPUS_PATH):
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values`` (``fraction`` in 0..1)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def latency_summary(latencies_ms):
+    if not latencies_ms:
+        return None
+    return {
+        "p50": round(percentile(latencies_ms, 0.50), 2),
+        "p95": round(percentile(latencies_ms, 0.95), 2),
+        "p99": round(percentile(latencies_ms, 0.99), 2),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 2),
+        "max": round(max(latencies_ms), 2)
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (reaped) children, in MB"""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "python": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "engines": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+class Measurement:
+    """Collects request latencies and position counts for one entry point"""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.positions = 0
+        self.errors = 0
+        # Engine work reported by the PGN analyzers (engine_nodes / engine_searches)
+        self.nodes = 0
+        self.searches = 0
+        self.startup_ms = None
+        self.start_time = None
+        self.end_time = None
+
+    def time_request(self, function, positions=1):
+        """Run one request, recording its latency; returns the function's result"""
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        started = time.perf_counter()
+        try:
+            result = function()
+        except Exception as e:
+            print(f"BENCH: request failed: {e}", file=sys.stderr)
+            self.errors += 1
+            return None
+        finally:
+            self.end_time = time.perf_counter()
+        self.latencies_ms.append((self.end_time - started) * 1000)
+        if isinstance(result, dict) and result.get("success") is False:
+            self.errors += 1
+        else:
+            self.positions += positions
+        return result
+
+    def to_dict(self):
+        wall_time = (self.end_time - self.start_time) if self.start_time is not None else 0
+        return {
+            "requests": len(self.latencies_ms),
+            "errors": self.errors,
+            "positions": self.positions,
+            "wall_time_s": round(wall_time, 3),
+            "positions_per_second": round(self.positions / wall_time, 2) if wall_time > 0 else 0,
+            "latency_ms": latency_summary(self.latencies_ms),
+            "startup_ms": round(self.startup_ms, 2) if self.startup_ms is not None else None,
+            "engine_nodes": self.nodes or None,
+            "nodes_per_search": round(self.nodes / self.searches, 1) if self.nodes and self.searches else None
+        }
+
+def game_positions(pgn):
+    """Number of positions (start + one per move) the analyzers will report for a game"""
+    import io
+    import chess.pgn
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    return 1 + sum(1 for _ in game.mainline_moves())
+
+def warm_start(measurement, function):
+    """Time the first request separately: it pays for engine boot"""
+    started = time.perf_counter()
+    function()
+    measurement.startup_ms = (time.perf_counter() - started) * 1000
+
+# ---------------------------------------------------------------------------
+# Entry points (each runs inside its own interpreter, see run_entry_subprocess)
+# ---------------------------------------------------------------------------
+
+def bench_engine_startup(corpus, depth, repeat, workers):
+    """Cold UciEngine boot: spawn, uci handshake, options and isready"""
+    from engine_pool import get_stockfish_path, DEFAULT_ENGINE_PARAMETERS
+    from uci_engine import UciEngine
+    path = get_stockfish_path()
+    measurement = Measurement()
+    for _ in range(max(3, repeat)):
+        engine = measurement.time_request(lambda: UciEngine(path, options=DEFAULT_ENGINE_PARAMETERS), positions=0)
+        if engine is not None:
+            engine.quit()
+    measurement.startup_ms = percentile(measurement.latencies_ms, 0.5)
+    return measurement
+
+def _bench_single_position(analyze, corpus, depth, repeat):
+    positions = corpus["positions"]
+    measurement = Measurement()
+    warm_start(measurement, lambda: analyze(positions[0]["fen"], depth))
+    for _ in range(repeat):
+        for entry in positions:
+            measurement.time_request(lambda: analyze(entry["fen"], depth))
+    return measurement
+
+def bench_engine(corpus, depth, repeat, workers):
+    import engine
+    return _bench_single_position(engine.analyze_position, corpus, depth, repeat)
+
+def bench_engine_safe(corpus, depth, repeat, workers):
+    import engine_safe
+    return _bench_single_position(engine_safe.analyze_position, corpus, depth, repeat)
+
+def bench_engine_safe_asyncio(corpus, depth, repeat, workers):
+    import engine_safe
+    return _bench_single_position(
+        lambda fen, depth: engine_safe.analyze_position(fen, depth, engine_backend="asyncio"),
+        corpus, depth, repeat
+    )
+
+def _bench_games(analyze, corpus, depth, repeat):
+    games = corpus["games"]
+    measurement = Measurement()
+    warm_start(measurement, lambda: analyze(games[-1]["pgn"], depth))
+    for _ in range(repeat):
+        for entry in games:
+            result = measurement.time_request(lambda: analyze(entry["pgn"], depth), positions=game_positions(entry["pgn"]))
+            if isinstance(result, dict):
+                measurement.nodes += result.get("engine_nodes") or 0
+                measurement.searches += result.get("engine_searches") or 0
+    return measurement
+
+def bench_pgn_analyzer(corpus, depth, repeat, workers):
+    import pgn_analyzer
+    return _bench_games(lambda pgn, depth: pgn_analyzer.analyze_pgn_multithreaded(pgn, depth, workers), corpus, depth, repeat)
+
+def bench_ultra_fast(corpus, depth, repeat, workers):
+    import ultra_fast_pgn_analyzer
+    return _bench_games(lambda pgn, depth: ultra_fast_pgn_analyzer.analyze_pgn_ultra_fast(pgn, depth, workers), corpus, depth, repeat)
+
+def bench_ultra_fast_per_ply(corpus, depth, repeat, workers):
+    import ultra_fast_pgn_analyzer
+    return _bench_games(
+        lambda pgn, depth: ultra_fast_pgn_analyzer.analyze_pgn_ultra_fast(pgn, depth, workers, mode="per_ply"),
+        corpus, depth, repeat
+    )
+
+def bench_ultra_fast_game_order(corpus, depth, repeat, workers):
+    import ultra_fast_pgn_analyzer
+    return _bench_games(
+        lambda pgn, depth: ultra_fast_pgn_analyzer.analyze_pgn_ultra_fast(pgn, depth, workers, mode="game_order"),
+        corpus, depth, repeat
+    )
+
+def bench_ultra_fast_asyncio(corpus, depth, repeat, workers):
+    import ultra_fast_pgn_analyzer
+    return _bench_games(
+        lambda pgn, depth: ultra_fast_pgn_analyzer.analyze_pgn_ultra_fast(pgn, depth, workers, engine_backend="asyncio"),
+        corpus, depth, repeat
+    )
+
+PYTHON_ENTRIES = {
+    "engine_startup": bench_engine_startup,
+    "engine": bench_engine,
+    "engine_safe": bench_engine_safe,
+    "engine_safe_asyncio": bench_engine_safe_asyncio,
+    "pgn_analyzer": bench_pgn_analyzer,
+    "ultra_fast": bench_ultra_fast,
+    "ultra_fast_per_ply": bench_ultra_fast_per_ply,
+    "ultra_fast_game_order": bench_ultra_fast_game_order,
+    "ultra_fast_asyncio": bench_ultra_fast_asyncio
+}
+
+def close_engines():
+    from engine_pool import close_shared_pool
+    from async_engine import close_engine_loop
+    close_shared_pool()
+    close_engine_loop()
+
+def entry_main(argv):
+    """Child process: run one Python entry point and print its metrics as JSON"""
+    parser = argparse.ArgumentParser(prog="benchmark.py _entry")
+    parser.add_argument("name", choices=sorted(PYTHON_ENTRIES))
+    parser.add_argument("--depth", type=int, required=True)
+    parser.add_argument("--repeat", type=int, required=True)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_PATH)
+    args = parser.parse_args(argv)
+
+    # The analyzers print progress to stdout; keep it for the result only
+    result_out = sys.stdout
+    sys.stdout = sys.stderr
+    corpus = load_corpus(args.corpus)
+    try:
+        measurement = PYTHON_ENTRIES[args.name](corpus, args.depth, args.repeat, args.workers)
+    finally:
+        # Reap the engines so their peak RSS shows up in RUSAGE_CHILDREN
+        close_engines()
+    metrics = measurement.to_dict()
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    result_out.write(json.dumps(metrics) + "\n")
+    result_out.flush()
+
+def run_entry_subprocess(name, args):
+    """Run one Python entry point in a fresh interpreter"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "_entry", name,
+        "--depth", str(args.depth), "--repeat", str(args.repeat), "--corpus", args.corpus
+    ]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    env = dict(os.environ, **BENCHMARK_ENV)
+    stderr = None if args.verbose else subprocess.DEVNULL
+    completed = subprocess.run(command, cwd=SCRIPT_DIR, env=env, stdout=subprocess.PIPE, stderr=stderr, universal_newlines=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} exited with status {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# ---------------------------------------------------------------------------
+# HTTP entry points (against a running backend, measured from this process)
+# ---------------------------------------------------------------------------
+
+def post_json(url, body, timeout=600):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+def post_stream_first_event(url, body, timeout=600):
+    """POST to an SSE endpoint; returns (seconds to first event, total seconds)"""
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    first_event = None
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for line in response:
+            if first_event is None and line.startswith(b"data: "):
+                first_event = time.perf_counter() - started
+    return first_event, time.perf_counter() - started
+
+def bench_http_analyze(corpus, args):
+    url = args.url.rstrip("/") + "/analyze"
+    positions = corpus["positions"]
+    measurement = Measurement()
+    warm_start(measurement, lambda: post_json(url, {"fen": positions[0]["fen"], "depth": args.depth}))
+    for _ in range(args.repeat):
+        for entry in positions:
+            measurement.time_request(lambda: post_json(url, {"fen": entry["fen"], "depth": args.depth}))
+    return measurement.to_dict()
+
+def bench_http_analyze_pgn(corpus, args):
+    url = args.url.rstrip("/") + "/analyze-pgn"
+    measurement = Measurement()
+    for _ in range(args.repeat):
+        for entry in corpus["games"]:
+            measurement.time_request(
+                lambda: post_json(url, {"pgn": entry["pgn"], "depth": args.depth}),
+                positions=game_positions(entry["pgn"])
+            )
+    return measurement.to_dict()
+
+def bench_http_analyze_pgn_stream(corpus, args):
+    """Streaming endpoint: latency percentiles are time to the first ply"""
+    url = args.url.rstrip("/") + "/analyze-pgn/stream"
+    first_ply_ms = []
+    measurement = Measurement()
+    for _ in range(args.repeat):
+        for entry in corpus["games"]:
+            timings = measurement.time_request(
+                lambda: post_stream_first_event(url, {"pgn": entry["pgn"], "depth": args.depth}),
+                positions=game_positions(entry["pgn"])
+            )
+            if timings and timings[0] is not None:
+                first_ply_ms.append(timings[0] * 1000)
+    metrics = measurement.to_dict()
+    metrics["total_latency_ms"] = metrics["latency_ms"]
+    metrics["latency_ms"] = latency_summary(first_ply_ms)
+    return metrics
+
+HTTP_ENTRIES = {
+    "http_analyze": bench_http_analyze,
+    "http_analyze_pgn": bench_http_analyze_pgn,
+    "http_analyze_pgn_stream": bench_http_analyze_pgn_stream
+}
+
+DEFAULT_ENTRIES = ["engine_startup", "engine", "engine_safe", "pgn_analyzer", "ultra_fast"]
+
+def host_info():
+    info = {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count()
+    }
+    try:
+        from worker_placement import plan_placement
+        info["placement"] = plan_placement().to_dict()
+    except Exception:
+        pass
+    try:
+        from engine_pool import get_stockfish_path
+        info["stockfish_path"] = get_stockfish_path()
+    except Exception as e:
+        info["stockfish_path"] = None
+        info["stockfish_error"] = str(e)
+    return info
+
+def run_main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py run", description="Benchmark the analysis entry points on the fixed corpus")
+    parser.add_argument("--entries", nargs="+", choices=sorted(PYTHON_ENTRIES) + sorted(HTTP_ENTRIES), default=None,
+                        help=f"Entry points to measure (default: {' '.join(DEFAULT_ENTRIES)}, plus the HTTP entries when --url is given)")
+    parser.add_argument("--depth", type=int, default=10, help="Search depth for every request")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per entry point")
+    parser.add_argument("--workers", type=int, default=None, help="Engine workers for the PGN analyzers (default: placement plan)")
+    parser.add_argument("--url", default=None, help="Backend base URL for the HTTP entries, e.g. http://localhost:5000")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_PATH, help="Corpus JSON file")
+    parser.add_argument("--output", "-o", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show the analyzers' own logging")
+    args = parser.parse_args(argv)
+    args.corpus = os.path.abspath(args.corpus)
+
+    entries = args.entries or DEFAULT_ENTRIES + (sorted(HTTP_ENTRIES) if args.url else [])
+    corpus = load_corpus(args.corpus)
+    results = {
+        "schema": RESULT_SCHEMA_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": host_info(),
+        "config": {
+            "depth": args.depth,
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "corpus": os.path.relpath(args.corpus, SCRIPT_DIR),
+            "corpus_version": corpus.get("version"),
+            "env": BENCHMARK_ENV
+        },
+        "entries": {}
+    }
+
+    for name in entries:
+        print(f"BENCH: {name}...", file=sys.stderr)
+        try:
+            if name in HTTP_ENTRIES:
+                if not args.url:
+                    raise ValueError("--url is required for HTTP entries")
+                metrics = HTTP_ENTRIES[name](corpus, args)
+                metrics["peak_rss_mb"] = None
+            else:
+                metrics = run_entry_subprocess(name, args)
+        except Exception as e:
+            print(f"BENCH: {name} failed: {e}", file=sys.stderr)
+            metrics = {"error": str(e)}
+        results["entries"][name] = metrics
+        print(f"BENCH: {name} {format_metrics(metrics)}", file=sys.stderr)
+
+    nodes_saved = game_order_nodes_saved(results["entries"])
+    if nodes_saved is not None:
+        results["game_order_nodes_saved"] = nodes_saved
+        print(f"BENCH: game-order scheduling saved {nodes_saved['nodes']} engine nodes ({nodes_saved['fraction'] * 100:.1f}%)", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+def game_order_nodes_saved(entries):
+    """Engine nodes ultra_fast_game_order saved over ultra_fast, when both ran and reported nodes"""
+    spread = (entries.get("ultra_fast") or {}).get("engine_nodes")
+    game_order = (entries.get("ultra_fast_game_order") or {}).get("engine_nodes")
+    if not spread or game_order is None:
+        return None
+    return {"nodes": spread - game_order, "fraction": round((spread - game_order) / spread, 4)}
+
+def format_metrics(metrics):
+    if "error" in metrics:
+        return f"error: {metrics['error']}"
+    latency = metrics.get("latency_ms") or {}
+    return (f"{metrics.get('positions_per_second')} pos/s, p50 {latency.get('p50')}ms, p95 {latency.get('p95')}ms, "
+            f"p99 {latency.get('p99')}ms, startup {metrics.get('startup_ms')}ms")
+
+def metric_value(metrics, name):
+    value = metrics
+    for part in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) else None
+
+def compare_results(baseline, candidate, threshold):
+    """Per-metric relative change between two runs; regressions beyond ``threshold`` are flagged"""
+    rows = []
+    for entry in sorted(set(baseline["entries"]) & set(candidate["entries"])):
+        for metric, higher_is_better in METRIC_DIRECTIONS.items():
+            before = metric_value(baseline["entries"][entry], metric)
+            after = metric_value(candidate["entries"][entry], metric)
+            if before is None or after is None or before == 0:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            rows.append({
+                "entry": entry,
+                "metric": metric,
+                "baseline": before,
+                "candidate": after,
+                "change": round(change, 4),
+                "regression": worse > threshold,
+                "improvement": -worse > threshold
+            })
+    return rows
+
+def compare_main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py compare", description="Flag regressions between two benchmark runs")
+    parser.add_argument("baseline", help="Results JSON of the reference run")
+    parser.add_argument("candidate", help="Results JSON of the run to check")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression (default: 0.10)")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.candidate, encoding="utf-8") as handle:
+        candidate = json.load(handle)
+    if baseline.get("config", {}).get("depth") != candidate.get("config", {}).get("depth"):
+        print("WARNING: Runs used different depths; the comparison is not like for like", file=sys.stderr)
+
+    rows = compare_results(baseline, candidate, args.threshold)
+    regressions = [row for row in rows if row["regression"]]
+    if args.json:
+        print(json.dumps({"threshold": args.threshold, "regressions": len(regressions), "metrics": rows}, indent=2))
+    else:
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ("improved" if row["improvement"] else "")
+            print(f"{row['entry']:<24} {row['metric']:<22} {row['baseline']:>12} -> {row['candidate']:>12} {row['change'] * 100:+7.1f}% {flag}")
+        print(f"{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+def main():
+    commands = {"run": run_main, "compare": compare_main, "_entry": entry_main}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("usage: benchmark.py {run,compare} ...", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(commands[sys.argv[1]](sys.argv[2:]) or 0)
+
+if __name__ == "__main__":
+    main()
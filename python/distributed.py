@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""
+Distributed analysis: one coordinator hands positions to worker hosts over TCP.
+
+The coordinator listens on DISTRIBUTED_LISTEN (host:port) and behaves like
+an executor for searches: ``submit(fen, depth)`` returns a Future, so the
+single-pass analyzer (mode "distributed") and corpus runs use it where
+they would use local engines, and results are merged into the usual
+schema. Workers run ``python distributed.py worker HOST:PORT`` on each
+analysis box, with their own warm engine pool.
+
+Messages are JSON frames in the analysis server's framing (see
+analysis_server.py):
+
+    worker -> coordinator   {"type": "hello", "name", "slots", "token"}
+                            {"type": "ready", "count"}        free engine slots
+                            {"type": "result", "task", "search", "counts"}
+                            {"type": "heartbeat"}
+    coordinator -> worker   {"type": "unit", "unit", "tasks": [{"id", "fen", "depth", "draw"}]}
+                            {"type": "cancel", "tasks": [ids]}
+                            {"type": "rejected", "reason"}   bad token, then closes
+
+Any host that can reach DISTRIBUTED_LISTEN can offer itself as a worker
+and send back results, so set DISTRIBUTED_TOKEN to the same secret on the
+coordinator and every worker: a hello without it is turned away. The
+token only authenticates; frames are not encrypted, so listen on a
+trusted interface (or a VPN / SSH tunnel) all the same.
+
+Queued positions go out in work units of consecutive plies, which a
+worker searches last ply first on one engine (as in game-order mode).
+When the queue is empty an idle worker steals the front half of the
+busiest unit still being searched; the victim is told to skip those
+positions. A worker that disconnects or misses heartbeats for
+DISTRIBUTED_HEARTBEAT_TIMEOUT seconds has its unfinished positions put
+back at the front of the queue. The first result for a position wins.
+Positions fail (rather than wait forever) when no worker is connected
+for DISTRIBUTED_WORKER_WAIT seconds.
+
+DISTRIBUTED_LOCAL_WORKERS=n starts n worker processes on the loopback
+interface, which runs the whole setup on one machine.
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+from collections import deque
+from concurrent.futures import Future
+from metrics import get_registry
+from analysis_server import read_frame, write_frame, encode_json, FRAME_JSON
+
+DEFAULT_UNIT_SIZE = 8
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
+DEFAULT_HEARTBEAT_TIMEOUT = 30.0
+DEFAULT_WORKER_WAIT = 30.0
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+WORKERS = get_registry().gauge("distributed_workers", "Worker hosts connected to the coordinator")
+SLOTS = get_registry().gauge("distributed_worker_slots", "Engines offered by the connected workers")
+QUEUED = get_registry().gauge("distributed_positions_queued", "Positions waiting for a worker")
+STEALS = get_registry().counter("distributed_steals_total", "Work units split off a busy worker for an idle one")
+REQUEUED = get_registry().counter("distributed_requeued_total", "Positions handed out again after their worker was lost")
+
+def parse_address(address):
+    """("host", port) from "host:port" (IPv6 hosts in brackets)"""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, got {address!r}")
+    return host.strip("[]"), int(port)
+
+def _token_matches(expected, offered):
+    """Constant-time comparison of a worker's token with ours (no token set lets anyone in)"""
+    if not expected:
+        return True
+    if not isinstance(offered, str):
+        return False
+    return hmac.compare_digest(expected.encode("utf-8"), offered.encode("utf-8"))
+
+def _is_loopback(host):
+    return host in ("localhost", "::1") or host.startswith("127.")
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+class Task:
+    """One position to search, with the Future its caller waits on"""
+
+    __slots__ = ("id", "fen", "depth", "draw", "counter", "future", "unit")
+
+    def __init__(self, task_id, fen, depth, draw, counter):
+        self.id = task_id
+        self.fen = fen
+        self.depth = depth
+        self.draw = draw
+        self.counter = counter
+        self.future = Future()
+        self.unit = None
+
+    def to_message(self):
+        return {"id": self.id, "fen": self.fen, "depth": self.depth, "draw": self.draw}
+
+class Unit:
+    """Positions handed to one worker as a block; ``remaining`` keeps game order"""
+
+    def __init__(self, unit_id, worker, tasks):
+        self.id = unit_id
+        self.worker = worker
+        self.remaining = {}
+        for task in tasks:
+            task.unit = self
+            self.remaining[task.id] = task
+
+class RemoteWorker:
+    """Coordinator-side state of one connected worker"""
+
+    def __init__(self, worker_id, name, slots, connection, writer):
+        self.id = worker_id
+        self.name = name
+        self.slots = slots
+        self.connection = connection
+        self.writer = writer
+        self.write_lock = threading.Lock()
+        self.credits = 0
+        self.units = {}
+        self.last_seen = time.monotonic()
+        self.results = 0
+
+    def send(self, message):
+        try:
+            with self.write_lock:
+                write_frame(self.writer, FRAME_JSON, encode_json(message))
+        except OSError:
+            # The reader notices the broken connection and requeues this worker's positions
+            pass
+
+    def disconnect(self):
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class Coordinator:
+    """TCP server that shards searches across worker hosts (see module docstring)"""
+
+    def __init__(self, address, unit_size=DEFAULT_UNIT_SIZE, heartbeat_timeout=None, worker_wait=None, token=None):
+        self.unit_size = max(1, unit_size)
+        # Shared secret every worker's hello must carry
+        self.token = token if token is not None else os.environ.get("DISTRIBUTED_TOKEN") or None
+        self.heartbeat_timeout = heartbeat_timeout or _env_float("DISTRIBUTED_HEARTBEAT_TIMEOUT", DEFAULT_HEARTBEAT_TIMEOUT)
+        # How long queued positions may wait with no worker connected
+        self.worker_wait = _env_float("DISTRIBUTED_WORKER_WAIT", DEFAULT_WORKER_WAIT) if worker_wait is None else worker_wait
+        self._orphaned_since = None
+        self._lock = threading.Lock()
+        self._workers_changed = threading.Condition(self._lock)
+        self.queue = deque()
+        self.tasks = {}
+        self.workers = {}
+        self.next_id = 0
+        self.steals = 0
+        self.requeued = 0
+        self.local_workers = []
+        self._closed = threading.Event()
+
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.serve_worker(self.connection, self.rfile, self.wfile)
+
+        class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = ThreadingTCPServer(parse_address(address), Handler)
+        self.address = "%s:%d" % self.server.server_address[:2]
+        threading.Thread(target=self.server.serve_forever, name="coordinator", daemon=True).start()
+        threading.Thread(target=self._watch_heartbeats, name="coordinator heartbeats", daemon=True).start()
+        print(f"DISTRIBUTED: Coordinator listening on {self.address}", file=sys.stderr)
+        if not self.token and not _is_loopback(self.server.server_address[0]):
+            print("DISTRIBUTED: WARNING: No DISTRIBUTED_TOKEN set; any host that reaches this address can join as a worker", file=sys.stderr)
+
+    def _take_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def submit(self, fen, depth, counter=None, draw=None):
+        """Queue one position; the Future resolves to its search (as from search_position_worker)"""
+        return self.submit_many([fen], depth, counter, [draw])[0]
+
+    def submit_many(self, fens, depth, counter=None, draws=None):
+        """Queue positions (in game order, so units hold consecutive plies); returns their Futures.
+
+        Raises RuntimeError when no worker connects within ``worker_wait``.
+        """
+        self.require_workers()
+        with self._lock:
+            tasks = [
+                Task(self._take_id(), fen, depth, draws[i] if draws else None, counter)
+                for i, fen in enumerate(fens)
+            ]
+            for task in tasks:
+                self.tasks[task.id] = task
+            self.queue.extend(tasks)
+            if tasks and not self.workers:
+                # The last worker went away since require_workers(); the watchdog fails these in time
+                self._orphaned_since = self._orphaned_since or time.monotonic()
+                print(f"DISTRIBUTED: No workers connected; {len(self.queue)} positions wait in the queue", file=sys.stderr)
+            sends = self._dispatch()
+            QUEUED.set(len(self.queue))
+        self._send(sends)
+        return [task.future for task in tasks]
+
+    def _send(self, sends):
+        for worker, message in sends:
+            worker.send(message)
+
+    def _dispatch(self):
+        """Hand units to workers with free slots; returns the (worker, message) pairs to send"""
+        sends = []
+        progress = True
+        while progress:
+            progress = False
+            for worker in list(self.workers.values()):
+                if worker.credits <= 0:
+                    continue
+                tasks = self._take_queued() or self._steal(worker, sends)
+                if not tasks:
+                    continue
+                unit = Unit(self._take_id(), worker, tasks)
+                worker.units[unit.id] = unit
+                worker.credits -= 1
+                sends.append((worker, {"type": "unit", "unit": unit.id, "tasks": [task.to_message() for task in tasks]}))
+                progress = True
+        return sends
+
+    def _take_queued(self):
+        """Pop the next unit off the queue: consecutive positions of one depth, spread over the free slots"""
+        if not self.queue:
+            return None
+        free = sum(max(0, worker.credits) for worker in self.workers.values()) or 1
+        size = max(1, min(self.unit_size, -(-len(self.queue) // free)))
+        depth = self.queue[0].depth
+        tasks = []
+        while self.queue and len(tasks) < size and self.queue[0].depth == depth:
+            tasks.append(self.queue.popleft())
+        return tasks
+
+    def _steal(self, thief, sends):
+        """Split the front half off the busiest unit of another worker"""
+        victim = None
+        for worker in self.workers.values():
+            if worker is thief:
+                continue
+            for unit in worker.units.values():
+                if len(unit.remaining) >= 2 and (victim is None or len(unit.remaining) > len(victim.remaining)):
+                    victim = unit
+        if victim is None:
+            return None
+        # The victim searches its unit last ply first, so the front is what it reaches last
+        stolen = list(victim.remaining.values())[:len(victim.remaining) // 2]
+        for task in stolen:
+            del victim.remaining[task.id]
+        sends.append((victim.worker, {"type": "cancel", "tasks": [task.id for task in stolen]}))
+        self.steals += 1
+        STEALS.inc()
+        return stolen
+
+    def serve_worker(self, connection, reader, writer):
+        """Run one worker connection until it closes"""
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            frame = read_frame(reader)
+            hello = json.loads(frame[1].decode("utf-8")) if frame else {}
+        except (OSError, EOFError, ValueError):
+            return
+        if hello.get("type") != "hello":
+            return
+        if not _token_matches(self.token, hello.get("token")):
+            try:
+                print(f"DISTRIBUTED: Rejected worker {hello.get('name') or 'worker'} from {connection.getpeername()[0]}: wrong or missing token", file=sys.stderr)
+                write_frame(writer, FRAME_JSON, encode_json({"type": "rejected", "reason": "wrong or missing DISTRIBUTED_TOKEN"}))
+            except OSError:
+                pass
+            return
+        with self._lock:
+            worker = RemoteWorker(self._take_id(), hello.get("name") or "worker", max(1, int(hello.get("slots") or 1)), connection, writer)
+            self.workers[worker.id] = worker
+            self._orphaned_since = None
+            self._update_gauges()
+            self._workers_changed.notify_all()
+        print(f"DISTRIBUTED: Worker {worker.name} connected ({worker.slots} engines)", file=sys.stderr)
+        try:
+            while True:
+                frame = read_frame(reader)
+                if frame is None:
+                    break
+                worker.last_seen = time.monotonic()
+                message = json.loads(frame[1].decode("utf-8"))
+                kind = message.get("type")
+                if kind == "ready":
+                    with self._lock:
+                        worker.credits += int(message.get("count", 1))
+                        sends = self._dispatch()
+                        QUEUED.set(len(self.queue))
+                    self._send(sends)
+                elif kind == "result":
+                    self._complete(worker, message)
+        except (OSError, EOFError, ValueError) as e:
+            print(f"DISTRIBUTED: Worker {worker.name} failed: {e}", file=sys.stderr)
+        finally:
+            self._lost(worker)
+
+    def _complete(self, worker, message):
+        owner = None
+        with self._lock:
+            task = self.tasks.pop(message["task"], None)
+            if task is None:
+                # Already answered by the other side of a steal
+                return
+            unit = task.unit
+            if unit is not None:
+                unit.remaining.pop(task.id, None)
+                if not unit.remaining:
+                    unit.worker.units.pop(unit.id, None)
+                if unit.worker is not worker:
+                    # The victim got there before the thief: spare the thief the search
+                    owner = unit.worker
+            worker.results += 1
+        if owner is not None:
+            owner.send({"type": "cancel", "tasks": [task.id]})
+        if task.counter is not None:
+            for source, amount in (message.get("counts") or {}).items():
+                task.counter.count(source, amount)
+        task.future.set_result(message["search"])
+
+    def _lost(self, worker):
+        """Drop a worker and put its unfinished positions back at the front of the queue"""
+        with self._lock:
+            if self.workers.pop(worker.id, None) is None:
+                return
+            requeue = [task for unit in worker.units.values() for task in unit.remaining.values()]
+            for task in reversed(requeue):
+                task.unit = None
+                self.queue.appendleft(task)
+            worker.units.clear()
+            if not self.workers and self.queue:
+                self._orphaned_since = time.monotonic()
+            self.requeued += len(requeue)
+            REQUEUED.inc(len(requeue))
+            sends = self._dispatch()
+            QUEUED.set(len(self.queue))
+            self._update_gauges()
+        worker.disconnect()
+        if self._closed.is_set():
+            self._fail_queued("Coordinator closed")
+            return
+        print(f"DISTRIBUTED: Worker {worker.name} lost after {worker.results} results; {len(requeue)} positions requeued", file=sys.stderr)
+        self._send(sends)
+
+    def _update_gauges(self):
+        WORKERS.set(len(self.workers))
+        SLOTS.set(sum(worker.slots for worker in self.workers.values()))
+
+    def _watch_heartbeats(self):
+        while not self._closed.wait(min(self.heartbeat_timeout, self.worker_wait) / 3):
+            now = time.monotonic()
+            with self._lock:
+                silent = [worker for worker in self.workers.values() if now - worker.last_seen > self.heartbeat_timeout]
+                orphaned = self._orphaned_since is not None and now - self._orphaned_since > self.worker_wait
+            for worker in silent:
+                print(f"DISTRIBUTED: Worker {worker.name} missed its heartbeats", file=sys.stderr)
+                worker.disconnect()
+            if orphaned:
+                self._fail_queued(f"No distributed workers connected to {self.address} for {self.worker_wait:.0f}s")
+
+    def _fail_queued(self, reason):
+        """Fail every queued position (their callers get ``reason`` instead of waiting forever)"""
+        with self._lock:
+            failed = list(self.queue)
+            self.queue.clear()
+            for task in failed:
+                self.tasks.pop(task.id, None)
+            self._orphaned_since = None
+            QUEUED.set(0)
+        if failed:
+            print(f"DISTRIBUTED: {reason}; failing {len(failed)} queued positions", file=sys.stderr)
+        for task in failed:
+            task.future.set_exception(RuntimeError(reason))
+
+    def require_workers(self):
+        """Total engines of the connected workers, waiting up to ``worker_wait`` for the first one"""
+        slots = self.wait_for_workers(1, self.worker_wait)
+        if not slots:
+            raise RuntimeError(f"No distributed workers connected to {self.address} within {self.worker_wait:.0f}s")
+        return slots
+
+    def slots(self):
+        with self._lock:
+            return sum(worker.slots for worker in self.workers.values())
+
+    def wait_for_workers(self, count=1, timeout=None):
+        """Block until ``count`` workers are connected (or ``timeout``); returns their total engines"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while len(self.workers) < count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._workers_changed.wait(remaining)
+            return sum(worker.slots for worker in self.workers.values())
+
+    def start_local_workers(self, count, engines=1):
+        """Start ``count`` worker processes connected over loopback (single-machine setup)"""
+        port = self.server.server_address[1]
+        script = os.path.abspath(__file__)
+        # The token goes through the environment, not the command line other users can read
+        env = dict(os.environ, DISTRIBUTED_TOKEN=self.token) if self.token else None
+        for _ in range(count):
+            self.local_workers.append(subprocess.Popen(
+                [sys.executable, script, "worker", f"127.0.0.1:{port}", "--engines", str(engines), "--no-reconnect"],
+                # Never inherit the analysis server's protocol pipes
+                stdin=subprocess.DEVNULL, stdout=sys.stderr, env=env
+            ))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "address": self.address,
+                "workers": [{"name": worker.name, "slots": worker.slots, "units": len(worker.units), "results": worker.results}
+                            for worker in self.workers.values()],
+                "queued": len(self.queue),
+                "in_flight": len(self.tasks) - len(self.queue),
+                "steals": self.steals,
+                "requeued": self.requeued
+            }
+
+    def close(self):
+        self._closed.set()
+        self.server.shutdown()
+        self.server.server_close()
+        with self._lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.disconnect()
+        # Positions still out with the workers that were just dropped are back in the queue
+        self._fail_queued("Coordinator closed")
+        for process in self.local_workers:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.local_workers = []
+
+_shared_coordinator = None
+_shared_coordinator_lock = threading.Lock()
+
+def get_shared_coordinator(required=False):
+    """Process-wide coordinator listening on DISTRIBUTED_LISTEN, or None when it is not set.
+
+    DISTRIBUTED_LOCAL_WORKERS (with DISTRIBUTED_WORKER_ENGINES engines each)
+    also starts worker processes on this machine.
+    """
+    global _shared_coordinator
+    with _shared_coordinator_lock:
+        if _shared_coordinator is None:
+            listen = os.environ.get("DISTRIBUTED_LISTEN")
+            if not listen:
+                if required:
+                    raise ValueError("Distributed analysis needs a coordinator address (set DISTRIBUTED_LISTEN=host:port)")
+                return None
+            _shared_coordinator = Coordinator(listen, unit_size=int(os.environ.get("DISTRIBUTED_UNIT_SIZE", DEFAULT_UNIT_SIZE)))
+            local_workers = int(os.environ.get("DISTRIBUTED_LOCAL_WORKERS", 0))
+            if local_workers > 0:
+                _shared_coordinator.start_local_workers(local_workers, int(os.environ.get("DISTRIBUTED_WORKER_ENGINES", 1)))
+        return _shared_coordinator
+
+def close_shared_coordinator():
+    global _shared_coordinator
+    with _shared_coordinator_lock:
+        if _shared_coordinator is not None:
+            _shared_coordinator.close()
+            _shared_coordinator = None
+
+class DistributedWorker:
+    """Worker host: searches the units a coordinator sends on a local engine pool"""
+
+    def __init__(self, address, engines, name=None, placement=None, reconnect=True, token=None):
+        self.address = parse_address(address)
+        self.token = token if token is not None else os.environ.get("DISTRIBUTED_TOKEN") or None
+        self.engines = max(1, engines)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.placement = placement
+        self.reconnect = reconnect
+        self.heartbeat_interval = _env_float("DISTRIBUTED_HEARTBEAT_INTERVAL", DEFAULT_HEARTBEAT_INTERVAL)
+
+    def run(self):
+        """Serve coordinators until stopped, reconnecting with backoff unless ``reconnect`` is off"""
+        from ultra_fast_pgn_analyzer import get_engine_pool
+        pool = get_engine_pool(self.engines, self.placement)
+        attempt = 0
+        with pool.lease(self.engines) as lease:
+            while True:
+                try:
+                    self.serve(lease)
+                    attempt = 0
+                except OSError as e:
+                    print(f"WORKER {self.name}: Connection to coordinator failed: {e}", file=sys.stderr)
+                if not self.reconnect:
+                    return
+                delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+                attempt += 1
+                time.sleep(delay)
+
+    def serve(self, lease):
+        """One coordinator connection"""
+        connection = socket.create_connection(self.address)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = connection.makefile("rb")
+        writer = connection.makefile("wb")
+        write_lock = threading.Lock()
+        stopped = threading.Event()
+        units = deque()
+        units_ready = threading.Condition()
+        cancelled = set()
+
+        def send(message):
+            try:
+                with write_lock:
+                    write_frame(writer, FRAME_JSON, encode_json(message))
+            except (OSError, ValueError):
+                stopped.set()
+
+        def heartbeat():
+            while not stopped.wait(self.heartbeat_interval):
+                send({"type": "heartbeat"})
+
+        send({"type": "hello", "name": self.name, "slots": self.engines, "token": self.token})
+        print(f"WORKER {self.name}: Connected to {self.address[0]}:{self.address[1]} with {self.engines} engines", file=sys.stderr)
+        slots = [
+            threading.Thread(target=self.run_slot, args=(lease, units, units_ready, cancelled, send, stopped), name=f"{self.name}/{i}", daemon=True)
+            for i in range(self.engines)
+        ]
+        for slot in slots:
+            slot.start()
+        threading.Thread(target=heartbeat, daemon=True).start()
+        send({"type": "ready", "count": self.engines})
+        try:
+            while not stopped.is_set():
+                frame = read_frame(reader)
+                if frame is None:
+                    break
+                message = json.loads(frame[1].decode("utf-8"))
+                if message.get("type") == "unit":
+                    with units_ready:
+                        units.append(message)
+                        units_ready.notify()
+                elif message.get("type") == "cancel":
+                    with units_ready:
+                        cancelled.update(message["tasks"])
+                elif message.get("type") == "rejected":
+                    # Retrying with the same token cannot help
+                    print(f"WORKER {self.name}: Coordinator rejected this worker: {message.get('reason')}", file=sys.stderr)
+                    self.reconnect = False
+                    break
+        except (EOFError, ValueError) as e:
+            print(f"WORKER {self.name}: Bad frame from coordinator: {e}", file=sys.stderr)
+        finally:
+            stopped.set()
+            with units_ready:
+                units_ready.notify_all()
+            # A search in progress finishes before its engine goes back to the lease
+            for slot in slots:
+                slot.join()
+            connection.close()
+            print(f"WORKER {self.name}: Disconnected from coordinator", file=sys.stderr)
+
+    def run_slot(self, lease, units, units_ready, cancelled, send, stopped):
+        """Search units on one engine, last ply first, reporting each position as it finishes"""
+        from ultra_fast_pgn_analyzer import PinnedEngine, search_position_worker
+        from position_search import SearchCounter
+        worker_id = threading.current_thread().name
+        while True:
+            with units_ready:
+                while not units and not stopped.is_set():
+                    units_ready.wait()
+                if stopped.is_set():
+                    return
+                unit = units.popleft()
+            remaining = deque(reversed(unit["tasks"]))
+            while remaining and not stopped.is_set():
+                try:
+                    with lease.engine() as engine:
+                        pinned = PinnedEngine(engine)
+                        while remaining and not stopped.is_set():
+                            task = remaining[0]
+                            with units_ready:
+                                skip = task["id"] in cancelled
+                                cancelled.discard(task["id"])
+                            if not skip:
+                                counter = SearchCounter()
+                                search = search_position_worker(task["fen"], task["depth"], pinned, counter, None, task.get("draw"))
+                                send({"type": "result", "task": task["id"], "search": search, "counts": counter.snapshot()})
+                            remaining.popleft()
+                except Exception as e:
+                    task = remaining.popleft()
+                    print(f"WORKER {worker_id}: ERROR searching task {task['id']}: {e}", file=sys.stderr)
+                    send({"type": "result", "task": task["id"], "search": {"error": str(e)}, "counts": {}})
+            send({"type": "ready", "count": 1})
+
+def worker_main(argv):
+    parser = argparse.ArgumentParser(prog="distributed.py worker", description="Search positions for a distributed analysis coordinator")
+    parser.add_argument("coordinator", help="Coordinator address, HOST:PORT")
+    parser.add_argument("--engines", type=int, default=None, help="Engines on this host (default: from placement)")
+    parser.add_argument("--name", default=None, help="Worker name in results and logs (default: host:pid)")
+    parser.add_argument("--placement", choices=("throughput", "latency"), default=None,
+                        help="throughput: many 1-thread engines; latency: few multi-thread engines")
+    parser.add_argument("--no-reconnect", action="store_true", help="Exit when the coordinator goes away")
+    args = parser.parse_args(argv)
+    from ultra_fast_pgn_analyzer import get_optimal_worker_count
+    from engine_pool import close_shared_pool
+    engines = args.engines or get_optimal_worker_count(args.placement)
+    try:
+        DistributedWorker(args.coordinator, engines, args.name, args.placement, reconnect=not args.no_reconnect).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_shared_pool()
+
+def add_coordinator_arguments(parser):
+    parser.add_argument("--depth", type=int, default=10, help="Search depth per position")
+    parser.add_argument("--listen", default=os.environ.get("DISTRIBUTED_LISTEN", "127.0.0.1:0"), help="Coordinator address, HOST:PORT")
+    parser.add_argument("--local-workers", type=int, default=0, help="Worker processes to start on this machine")
+    parser.add_argument("--worker-engines", type=int, default=1, help="Engines per local worker")
+    parser.add_argument("--wait-workers", type=int, default=1, help="Workers to wait for before starting")
+
+def start_coordinator(args):
+    """Shared coordinator for a CLI run, once ``args.wait_workers`` workers are connected"""
+    os.environ["DISTRIBUTED_LISTEN"] = args.listen
+    os.environ["DISTRIBUTED_LOCAL_WORKERS"] = str(args.local_workers)
+    os.environ["DISTRIBUTED_WORKER_ENGINES"] = str(args.worker_engines)
+    coordinator = get_shared_coordinator(required=True)
+    coordinator.wait_for_workers(args.wait_workers)
+    return coordinator
+
+def pgn_main(argv):
+    """Analyze one PGN file across workers; prints the usual analyze_pgn_ultra_fast result"""
+    parser = argparse.ArgumentParser(prog="distributed.py pgn", description="Analyze a PGN game on distributed workers")
+    parser.add_argument("pgn", help="PGN file")
+    add_coordinator_arguments(parser)
+    args = parser.parse_args(argv)
+    from ultra_fast_pgn_analyzer import analyze_pgn_ultra_fast
+    try:
+        coordinator = start_coordinator(args)
+        with open(args.pgn, encoding="utf-8") as handle:
+            result = analyze_pgn_ultra_fast(handle.read(), args.depth, mode="distributed")
+        print(json.dumps(result))
+        print(json.dumps(coordinator.stats()), file=sys.stderr)
+    finally:
+        close_shared_coordinator()
+
+def corpus_main(argv):
+    """Analyze PGN files across workers; writes the usual corpus NDJSON records"""
+    parser = argparse.ArgumentParser(prog="distributed.py corpus", description="Analyze every game in PGN files or directories on distributed workers")
+    parser.add_argument("paths", nargs="+", help="PGN files or directories containing .pgn files")
+    parser.add_argument("--output", "-o", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--max-games-in-flight", type=int, default=None, help="Games held in memory at once (default: twice the connected engines)")
+    add_coordinator_arguments(parser)
+    args = parser.parse_args(argv)
+    from ultra_fast_pgn_analyzer import analyze_corpus
+    try:
+        coordinator = start_coordinator(args)
+        kwargs = {"max_games_in_flight": args.max_games_in_flight, "distributed": True}
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as output:
+                summary = analyze_corpus(args.paths, args.depth, output=output, **kwargs)
+        else:
+            summary = analyze_corpus(args.paths, args.depth, output=sys.stdout, **kwargs)
+        print(json.dumps(summary), file=sys.stderr)
+        print(json.dumps(coordinator.stats()), file=sys.stderr)
+    finally:
+        close_shared_coordinator()
+
+def main(argv):
+    commands = {"worker": worker_main, "pgn": pgn_main, "corpus": corpus_main}
+    if not argv or argv[0] not in commands:
+        print(f"Usage: distributed.py {{{','.join(commands)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    commands[argv[0]](argv[1:])
+
+if __name__ == "__main__":
+    # Go through the importable module so this CLI and the analyzer share one coordinator
+    import distributed
+    distributed.main(sys.argv[1:])
@@ -0,0 +1,424 @@
+import os
+import sys
+import threading
+import time
+import queue
+from collections import deque
+from contextlib import contextmanager
+from uci_engine import UciEngine
+from worker_placement import pin_process
+from tablebase import get_syzygy_path
+from metrics import ENGINE_SPAWNS, ENGINE_DISCARDS, ENGINE_WAITING
+import tracing
+
+# Dynamic path to stockfish.exe based on script location
+def get_stockfish_path():
+    # Explicit override (useful on Linux/macOS hosts and analysis boxes)
+    env_path = os.environ.get("STOCKFISH_PATH")
+    if env_path and os.path.exists(env_path):
+        return env_path
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    stockfish_path = os.path.join(project_root, "stockfish", "stockfish.exe")
+
+    # Check if stockfish.exe exists
+    if os.path.exists(stockfish_path):
+        return stockfish_path
+
+    # Fallback to original hardcoded path
+    fallback_path = "C:\\Users\\ragha\\Desktop\\Chess_0610\\stockfish\\stockfish.exe"
+    if os.path.exists(fallback_path):
+        return fallback_path
+
+    # Try to find stockfish in common locations
+    common_paths = [
+        os.path.join(project_root, "stockfish", "stockfish"),
+        os.path.join(project_root, "stockfish", "stockfish.exe"),
+        "stockfish",
+        "stockfish.exe"
+    ]
+
+    for path in common_paths:
+        if os.path.exists(path):
+            return path
+
+    raise FileNotFoundError("Stockfish executable not found. Please ensure stockfish.exe is in the stockfish directory.")
+
+# Defaults for every pooled engine; Hash/Threads are overridden per pool
+DEFAULT_ENGINE_PARAMETERS = {
+    "Threads": 1,                # One search thread per engine
+    "Hash": 128,                 # Per-engine hash in MB
+    "Skill Level": 20,           # Full engine strength
+    "Contempt": 0,               # Neutral evaluation
+    "Move Overhead": 0,          # No move delay
+    "Minimum Thinking Time": 0,  # No minimum thinking time
+    "Ponder": False,             # Disable pondering
+    "MultiPV": 1                 # Analyze only the best line
+}
+
+def _env_int(name, default):
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"WARNING: Ignoring invalid {name}={value!r}", file=sys.stderr)
+        return default
+
+class _Waiter:
+    """A checkout queued behind others: granted either a returned engine or the right to start one"""
+
+    __slots__ = ("event", "engine", "spawn")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.engine = None
+        self.spawn = False
+
+class EnginePool:
+    """Pool of warm Stockfish processes (``UciEngine``) shared by all analyzers.
+
+    Engines are started lazily (up to ``size``) and handed out with
+    ``checkout()``/``checkin()``. A checked-out engine is reset with
+    ``ucinewgame`` so no hash state leaks from one game into the next, and
+    every engine is health-checked before it is handed out again; dead
+    engines are discarded and replaced transparently. With a ``placement``
+    (see worker_placement.py) each engine is pinned to its slot's CPUs.
+
+    When every engine is busy, checkouts queue in arrival order: a returned
+    engine (or a freed slot) goes to the longest-waiting caller, never to a
+    newcomer.
+    """
+
+    def __init__(self, size=1, hash_mb=128, threads=1, parameters=None, stockfish_path=None, placement=None):
+        if size < 1:
+            raise ValueError("Engine pool size must be at least 1")
+        self.size = size
+        self.hash_mb = hash_mb
+        self.threads = threads
+        self.stockfish_path = stockfish_path
+        self.placement = placement
+        self.parameters = dict(DEFAULT_ENGINE_PARAMETERS)
+        if parameters:
+            self.parameters.update(parameters)
+        self.parameters["Hash"] = hash_mb
+        self.parameters["Threads"] = threads
+        # Let searches probe the same tablebases the analyzers answer from
+        syzygy_path = get_syzygy_path()
+        if syzygy_path is not None:
+            self.parameters.setdefault("SyzygyPath", syzygy_path)
+
+        # Most recently returned engine first (its caches are warmest)
+        self._idle = []
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # Engine -> placement slot, so a replacement engine reuses the freed CPUs
+        self._slots = {}
+        self._stats = {
+            "spawned": 0,
+            "discarded": 0,
+            "checkouts": 0,
+            "resets": 0
+        }
+
+    def _spawn(self):
+        """Start a new Stockfish process with the pool's parameters"""
+        if self.stockfish_path is None:
+            self.stockfish_path = get_stockfish_path()
+        start_time = time.time()
+        with tracing.span("engine boot", hash_mb=self.hash_mb, threads=self.threads) as boot:
+            engine = UciEngine(self.stockfish_path, options=self.parameters)
+            boot.set(engine=engine.pid)
+            boot.set_track(f"engine {engine.pid}")
+        ENGINE_SPAWNS.inc(backend="threads")
+        cpus = None
+        with self._lock:
+            self._stats["spawned"] += 1
+            if self.placement is not None:
+                used = set(self._slots.values())
+                slot = next(i for i in range(len(used) + 1) if i not in used)
+                self._slots[engine] = slot
+                cpus = self.placement.cpus_for_slot(slot)
+        pinned = pin_process(engine.pid, cpus) if cpus else False
+        placement = f", CPUs={cpus}" if pinned else ""
+        print(f"POOL: Started engine in {time.time() - start_time:.2f}s (Hash={self.hash_mb}MB, Threads={self.threads}{placement})", file=sys.stderr)
+        return engine
+
+    def _destroy(self, engine):
+        """Terminate an engine process and free its pool slot"""
+        engine.quit()
+        with self._lock:
+            self._slots.pop(engine, None)
+            self._created -= 1
+            self._stats["discarded"] += 1
+            self._grant_spawns()
+        ENGINE_DISCARDS.inc(backend="threads")
+
+    def _grant_spawns(self):
+        """Let the oldest waiters start engines while below capacity (lock held)"""
+        while self._waiters and self._created < self.size:
+            waiter = self._waiters.popleft()
+            self._created += 1
+            waiter.spawn = True
+            waiter.event.set()
+
+    def _hand_off(self, engine):
+        """Give a returned engine to the oldest waiter, or park it as idle (lock held)"""
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.engine = engine
+            waiter.event.set()
+        else:
+            self._idle.append(engine)
+
+    def _wait_turn(self, waiter, deadline):
+        """Block until ``waiter`` is granted an engine or a spawn; returns (engine, spawn)"""
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        ENGINE_WAITING.inc(backend="threads")
+        try:
+            waiter.event.wait(remaining)
+        finally:
+            ENGINE_WAITING.dec(backend="threads")
+        with self._lock:
+            # Grants happen under the lock, so this cannot race with one
+            if not waiter.event.is_set():
+                self._waiters.remove(waiter)
+                raise TimeoutError("Timed out waiting for a free engine")
+        return waiter.engine, waiter.spawn
+
+    def is_healthy(self, engine):
+        """Check the process is alive and still answers isready"""
+        try:
+            if not engine.is_alive():
+                return False
+            with tracing.span("engine health check", track=f"engine {engine.pid}", engine=engine.pid):
+                return engine.is_ready(timeout=5)
+        except Exception:
+            return False
+
+    def reset(self, engine):
+        """Clear hash and search state before the engine starts a new game"""
+        with tracing.span("ucinewgame", track=f"engine {engine.pid}", engine=engine.pid):
+            engine.new_game()
+        with self._lock:
+            self._stats["resets"] += 1
+
+    def checkout(self, timeout=None, new_game=True):
+        """Take an engine from the pool, starting one if below capacity"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("Engine pool is closed")
+
+            engine = None
+            spawn = False
+            waiter = None
+            with self._lock:
+                # Nobody overtakes a queued checkout
+                if self._waiters:
+                    waiter = _Waiter()
+                elif self._idle:
+                    engine = self._idle.pop()
+                elif self._created < self.size:
+                    self._created += 1
+                    spawn = True
+                else:
+                    waiter = _Waiter()
+                if waiter is not None:
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                engine, spawn = self._wait_turn(waiter, deadline)
+            if spawn:
+                try:
+                    engine = self._spawn()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                        self._grant_spawns()
+                    raise
+            if engine is None:
+                # Woken by close()
+                continue
+
+            if not self.is_healthy(engine):
+                print("POOL: Discarding unhealthy engine", file=sys.stderr)
+                self._destroy(engine)
+                continue
+
+            if new_game:
+                self.reset(engine)
+            with self._lock:
+                self._stats["checkouts"] += 1
+            return engine
+
+    def checkin(self, engine, healthy=True):
+        """Return an engine to the pool (or discard it if it misbehaved).
+
+        Health is only probed again at checkout, so a borrow costs one
+        ``isready`` round-trip rather than two.
+        """
+        if self._closed or not healthy:
+            self._destroy(engine)
+            return
+        with self._lock:
+            self._hand_off(engine)
+
+    @contextmanager
+    def engine(self, timeout=None, new_game=True):
+        """Context manager wrapping checkout/checkin for a single job"""
+        engine = self.checkout(timeout=timeout, new_game=new_game)
+        healthy = True
+        try:
+            yield engine
+        except Exception:
+            healthy = self.is_healthy(engine)
+            raise
+        finally:
+            self.checkin(engine, healthy=healthy)
+
+    @contextmanager
+    def lease(self, count, timeout=None):
+        """Reserve up to ``count`` engines for one game and share them between worker threads.
+
+        Engines are checked out lazily on first use, so a game served
+        entirely from caches never touches (or boots) an engine.
+        """
+        lease = EngineLease(self, max(1, min(count, self.size)), timeout=timeout)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def resize(self, size):
+        """Grow the pool; shrinking only takes effect as engines are returned"""
+        with self._lock:
+            self.size = max(1, size)
+            self._grant_spawns()
+
+    def stats(self):
+        """Snapshot of pool counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = self.size
+            snapshot["alive"] = self._created
+            snapshot["placement"] = self.placement.mode if self.placement else None
+            snapshot["idle"] = len(self._idle)
+            snapshot["waiting"] = len(self._waiters)
+        return snapshot
+
+    def close(self):
+        """Shut down every idle engine; busy engines are stopped on checkin"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+            # Queued checkouts wake up and see the pool is closed
+            while self._waiters:
+                self._waiters.popleft().event.set()
+        for engine in idle:
+            self._destroy(engine)
+
+class EngineLease:
+    """Engines checked out from the pool for the duration of one game"""
+
+    def __init__(self, pool, count, timeout=None):
+        self._pool = pool
+        self._count = count
+        self._timeout = timeout
+        self._engines = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                can_checkout = self._idle.empty() and len(self._engines) < self._count
+                if can_checkout:
+                    # Reserve the slot before the (slow) checkout
+                    self._engines.append(None)
+            if can_checkout:
+                try:
+                    engine = self._pool.checkout(timeout=self._timeout)
+                except Exception:
+                    with self._lock:
+                        self._engines.remove(None)
+                    raise
+                with self._lock:
+                    self._engines[self._engines.index(None)] = engine
+                return engine
+
+            engine = self._idle.get()
+            if engine is not None:
+                return engine
+            # A crashed engine freed its slot; loop to check out a replacement
+
+    @contextmanager
+    def engine(self):
+        """Borrow one of the leased engines for a single position"""
+        with tracing.span("engine checkout") as checkout:
+            engine = self._acquire()
+            checkout.set(engine=engine.pid)
+        try:
+            yield engine
+        except Exception:
+            # Drop a crashed engine; the next borrower checks out a replacement
+            if not self._pool.is_healthy(engine):
+                with self._lock:
+                    self._engines.remove(engine)
+                self._pool.checkin(engine, healthy=False)
+                # Wake a waiting borrower so it can take the freed slot
+                self._idle.put(None)
+                engine = None
+            raise
+        finally:
+            if engine is not None:
+                self._idle.put(engine)
+
+    def release(self):
+        """Return every leased engine to the pool"""
+        with self._lock:
+            engines = [engine for engine in self._engines if engine is not None]
+            self._engines = []
+        for engine in engines:
+            self._pool.checkin(engine)
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_shared_pool(size=None, hash_mb=None, threads=None, placement=None):
+    """Return the process-wide engine pool, creating it on first use.
+
+    ENGINE_POOL_SIZE, ENGINE_HASH_MB and ENGINE_THREADS override the values
+    requested by the calling analyzer. Later callers can grow the pool but
+    Hash/Threads/placement are fixed once the first engine configuration
+    is chosen.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        size = _env_int("ENGINE_POOL_SIZE", size or 1)
+        if _shared_pool is None:
+            _shared_pool = EnginePool(
+                size=size,
+                hash_mb=_env_int("ENGINE_HASH_MB", hash_mb or DEFAULT_ENGINE_PARAMETERS["Hash"]),
+                threads=_env_int("ENGINE_THREADS", threads or DEFAULT_ENGINE_PARAMETERS["Threads"]),
+                placement=placement
+            )
+        elif size > _shared_pool.size:
+            _shared_pool.resize(size)
+        return _shared_pool
+
+def close_shared_pool():
+    """Stop all engines held by the shared pool"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.close()
+            _shared_pool = None
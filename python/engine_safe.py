@@ -1,101 +1,139 @@
 import sys
 import json
-import threading
 import time
 import os
-from stockfish import Stockfish
+from engine_pool import get_stockfish_path, get_shared_pool, close_shared_pool
+from position_search import search_position, search_position_async
+from async_engine import get_engine_backend, get_engine_loop, get_shared_async_pool, close_engine_loop
+from worker_placement import plan_placement
 
-# Path to your stockfish.exe (update this path as needed)
-STOCKFISH_PATH = "C:\\Users\\ragha\\Desktop\\Chess_0610\\stockfish\\stockfish.exe"
+def get_engine_pool():
+    """Shared engine pool with safe parameters and error handling.
 
-# Global lock for thread safety
-stockfish_lock = threading.Lock()
-
-def create_stockfish_instance():
-    """Create a new Stockfish instance with safe parameters and error handling"""
+    Sized by the placement plan (one engine per usable core by default), so
+    that many positions are searched at once; engines still start lazily.
+    """
     try:
         # Check if Stockfish executable exists
-        if not os.path.exists(STOCKFISH_PATH):
-            raise FileNotFoundError(f"Stockfish executable not found at: {STOCKFISH_PATH}")
-        
-        return Stockfish(
-            STOCKFISH_PATH,
-            parameters={
-                "Threads": 1,                # Use 1 thread for stability
-                "Hash": 128,                 # Conservative hash size
-                "Skill Level": 20,           # Full engine strength
-                "Contempt": 0,               # Neutral evaluation
-                "Move Overhead": 0,          # No move delay
-                "Minimum Thinking Time": 0,  # No minimum thinking time
-                "Ponder": False,             # Disable pondering
-                "MultiPV": 1                # Analyze only the best line
-            }
-        )
+        get_stockfish_path()
+        plan = plan_placement()
+        return get_shared_pool(size=plan.workers, hash_mb=128, threads=plan.threads, placement=plan)
     except Exception as e:
         raise Exception(f"Failed to create Stockfish instance: {str(e)}")
 
-def analyze_position(fen, depth=10):
-    """Analyze a chess position using optimized Stockfish with comprehensive error handling"""
-    with stockfish_lock:
-        stockfish = None
-        try:
-            # Create Stockfish instance
-            stockfish = create_stockfish_instance()
-            
-            # Validate FEN string
-            if not fen or not isinstance(fen, str):
-                raise ValueError("Invalid FEN string provided")
-            
-            # Validate depth
-            if not isinstance(depth, int) or depth < 1 or depth > 25:
-                raise ValueError("Depth must be an integer between 1 and 25")
-            
-            # Optimized analysis - no unnecessary resets
-            stockfish.set_fen_position(fen)
-            stockfish.set_depth(depth)
-            
-            # Get analysis results with timeout protection
-            start_time = time.time()
-            best_move = stockfish.get_best_move()
-            evaluation = stockfish.get_evaluation()
-            
-            # Check if analysis took too long (safety measure)
-            analysis_time = time.time() - start_time
-            if analysis_time > 30:  # 30 second timeout
-                print(f"Warning: Analysis took {analysis_time:.2f} seconds")
-            
-            return {
-                "fen": fen,
-                "best_move": best_move,
-                "evaluation": evaluation,
-                "depth": depth,
-                "analysis_time": round(analysis_time, 2),
-                "optimized": True,
-                "success": True
-            }
-            
-        except Exception as e:
-            error_msg = f"Analysis failed: {str(e)}"
-            print(f"Error in analyze_position: {error_msg}")
-            
-            # Return error result instead of raising exception
-            return {
-                "fen": fen,
-                "best_move": None,
-                "evaluation": {"type": "cp", "value": 0},
-                "depth": depth,
-                "analysis_time": 0,
-                "error": error_msg,
-                "success": False
-            }
-        finally:
-            # Clean up Stockfish instance
-            if stockfish:
-                try:
-                    # Stockfish cleanup is handled automatically
-                    pass
-                except:
-                    pass
+def validate_request(fen, depth):
+    """Reject malformed FEN/depth before any engine is touched"""
+    # Validate FEN string
+    if not fen or not isinstance(fen, str):
+        raise ValueError("Invalid FEN string provided")
+    
+    # Validate depth
+    if not isinstance(depth, int) or depth < 1 or depth > 25:
+        raise ValueError("Depth must be an integer between 1 and 25")
+
+def partial_result_callback(fen, on_update):
+    """Adapt ``on_update`` to the engine's per-iteration snapshots (None when not streaming)"""
+    if on_update is None:
+        return None
+    return lambda partial: on_update({
+        "fen": fen,
+        "best_move": partial["best_move"],
+        "evaluation": partial["evaluation"],
+        "depth": partial["depth"],
+        "pv": partial["pv"],
+        "final": False
+    })
+
+def position_result(fen, depth, search, start_time):
+    """Shape a finished search into the response the backend expects"""
+    # Check if analysis took too long (safety measure)
+    analysis_time = time.time() - start_time
+    if analysis_time > 30:  # 30 second timeout
+        print(f"Warning: Analysis took {analysis_time:.2f} seconds")
+    
+    return {
+        "fen": fen,
+        "best_move": search["best_move"],
+        "evaluation": search["evaluation"],
+        "depth": search.get("depth") or depth,
+        "analysis_time": round(analysis_time, 2),
+        "ponder": search["ponder"],
+        "pv": search["pv"],
+        "seldepth": search["seldepth"],
+        "nodes": search["nodes"],
+        "nps": search["nps"],
+        "cached": search["cached"],
+        "opening": search.get("opening"),
+        "terminal": search.get("terminal"),
+        "forced": search.get("forced", False),
+        "final": True,
+        "optimized": True,
+        "success": True
+    }
+
+def error_result(fen, depth, error):
+    error_msg = f"Analysis failed: {str(error)}"
+    print(f"Error in analyze_position: {error_msg}")
+    
+    # Return error result instead of raising exception
+    return {
+        "fen": fen,
+        "best_move": None,
+        "evaluation": {"type": "cp", "value": 0},
+        "depth": depth,
+        "analysis_time": 0,
+        "error": error_msg,
+        "success": False
+    }
+
+def analyze_position(fen, depth=10, on_update=None, engine_backend=None):
+    """Analyze a chess position using optimized Stockfish with comprehensive error handling
+
+    Safe to call from many threads at once: each call searches on its own
+    engine from the shared pool, so concurrent positions run in parallel up
+    to the pool size and further calls queue in arrival order.
+
+    ``on_update`` (optional) receives an intermediate result each time the
+    search completes a deeper iteration, before the final result is returned.
+    With the asyncio engine backend (``engine_backend`` or ENGINE_BACKEND)
+    the search runs on the shared engine loop instead.
+    """
+    if get_engine_backend(engine_backend) == "asyncio":
+        return get_engine_loop().run(analyze_position_async(fen, depth, on_update))
+
+    try:
+        # Warm Stockfish instances come from the shared pool (crashed engines are discarded)
+        pool = get_engine_pool()
+        validate_request(fen, depth)
+        
+        # Get analysis results with timeout protection (cache hit or one search for move and score)
+        start_time = time.time()
+        on_info = partial_result_callback(fen, on_update)
+        search = search_position(fen, depth, pool.engine, timeout=30, on_info=on_info)
+        return position_result(fen, depth, search, start_time)
+        
+    except Exception as e:
+        return error_result(fen, depth, e)
+
+async def analyze_position_async(fen, depth=10, on_update=None):
+    """Awaitable ``analyze_position`` on the asyncio engine pool.
+
+    Must run on the shared engine loop (``get_engine_loop()``). Cancelling
+    the awaiting task stops the engine's search.
+    """
+    try:
+        get_stockfish_path()
+        plan = plan_placement()
+        pool = get_shared_async_pool(size=plan.workers, hash_mb=128, threads=plan.threads, placement=plan)
+        validate_request(fen, depth)
+        
+        start_time = time.time()
+        on_info = partial_result_callback(fen, on_update)
+        search = await search_position_async(fen, depth, pool.engine, timeout=30, on_info=on_info)
+        return position_result(fen, depth, search, start_time)
+        
+    except Exception as e:
+        return error_result(fen, depth, e)
 
 def main():
     """Main function with comprehensive error handling"""
@@ -124,6 +162,8 @@ def main():
         # Output JSON result to Node.js
         print(json.dumps(result))
         sys.stdout.flush()
+        close_shared_pool()
+        close_engine_loop()
         
     except Exception as e:
         error_result = {
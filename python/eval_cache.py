@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+import chess
+
+# Default on-disk location (python/analysis_cache/ is git-ignored)
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache", "evals.sqlite3")
+DEFAULT_MAX_ENTRIES = 200000
+
+# Evict down to this fraction of max_entries so eviction runs in batches
+EVICTION_TARGET = 0.9
+EVICTION_CHECK_INTERVAL = 256
+
+def normalize_position(fen):
+    """Cache key for a position: FEN without move clocks, en passant only when legal"""
+    return chess.Board(fen).epd()
+
+class EvalCache:
+    """Persistent evaluation store shared by all analyzers.
+
+    Entries are keyed by the normalized position and hold the engine's
+    score, best move, ponder move, PV, depth, seldepth and nodes. A stored
+    result satisfies any request for the same or a lower depth. The store
+    is a SQLite database in WAL mode, so several worker processes can read
+    and write it concurrently; size is bounded by least-recently-used
+    eviction once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        with connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    position TEXT PRIMARY KEY,
+                    depth INTEGER NOT NULL,
+                    score_type TEXT NOT NULL,
+                    score_value INTEGER NOT NULL,
+                    best_move TEXT,
+                    ponder TEXT,
+                    pv TEXT,
+                    seldepth INTEGER,
+                    nodes INTEGER,
+                    last_used REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)")
+
+    def _connection(self):
+        """One SQLite connection per thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, fen, depth):
+        """Return a cached search result at >= ``depth`` for ``fen``, or None"""
+        position = normalize_position(fen)
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT depth, score_type, score_value, best_move, ponder, pv, seldepth, nodes "
+            "FROM evaluations WHERE position = ? AND depth >= ?",
+            (position, depth)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        connection.execute("UPDATE evaluations SET last_used = ? WHERE position = ?", (time.time(), position))
+        self._count("hits")
+        stored_depth, score_type, score_value, best_move, ponder, pv, seldepth, nodes = row
+        return {
+            "best_move": best_move,
+            "ponder": ponder,
+            "score_type": score_type,
+            "score_value": score_value,
+            "depth": stored_depth,
+            "seldepth": seldepth or 0,
+            "nodes": nodes or 0,
+            "nps": 0,
+            "time_ms": 0,
+            "pv": pv.split() if pv else [],
+            "cached": True
+        }
+
+    def put(self, fen, result):
+        """Store a search result unless a deeper one is already cached"""
+        if not result.get("best_move") and not result.get("pv"):
+            return
+        position = normalize_position(fen)
+        connection = self._connection()
+        connection.execute(
+            """
+            INSERT INTO evaluations (position, depth, score_type, score_value, best_move, ponder, pv, seldepth, nodes, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(position) DO UPDATE SET
+                depth = excluded.depth,
+                score_type = excluded.score_type,
+                score_value = excluded.score_value,
+                best_move = excluded.best_move,
+                ponder = excluded.ponder,
+                pv = excluded.pv,
+                seldepth = excluded.seldepth,
+                nodes = excluded.nodes,
+                last_used = excluded.last_used
+            WHERE excluded.depth >= evaluations.depth
+            """,
+            (
+                position,
+                result["depth"],
+                result["score_type"],
+                result["score_value"],
+                result.get("best_move"),
+                result.get("ponder"),
+                " ".join(result.get("pv") or []),
+                result.get("seldepth"),
+                result.get("nodes"),
+                time.time()
+            )
+        )
+        self._count("stores")
+
+        with self._lock:
+            self._puts_since_check += 1
+            check = self._puts_since_check >= EVICTION_CHECK_INTERVAL
+            if check:
+                self._puts_since_check = 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Drop least-recently-used entries once the store exceeds max_entries"""
+        connection = self._connection()
+        count = connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        if count <= self.max_entries:
+            return 0
+        excess = count - int(self.max_entries * EVICTION_TARGET)
+        connection.execute(
+            "DELETE FROM evaluations WHERE position IN "
+            "(SELECT position FROM evaluations ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        with self._lock:
+            self._stats["evicted"] += excess
+        print(f"CACHE: Evicted {excess} least-recently-used evaluations", file=sys.stderr)
+        return excess
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    """Process-wide evaluation cache, or None when disabled with EVAL_CACHE=0"""
+    global _shared_cache
+    if os.environ.get("EVAL_CACHE", "1") == "0":
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is False:
+            return None
+        if _shared_cache is None:
+            try:
+                _shared_cache = EvalCache(
+                    path=os.environ.get("EVAL_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    max_entries=int(os.environ.get("EVAL_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+                )
+            except Exception as e:
+                # A broken cache must never break analysis
+                print(f"WARNING: Evaluation cache disabled: {e}", file=sys.stderr)
+                _shared_cache = False
+                return None
+        return _shared_cache
@@ -0,0 +1,269 @@
+"""
+Compact, column-oriented storage for the plies of a game and their results.
+
+A game is kept as its starting FEN plus one 16-bit move and one 64-bit
+Zobrist key per ply in ``array`` buffers (about 10 bytes a ply instead of
+a dict with two FENs and a SAN string). FENs and SAN are rebuilt from the
+moves only when something reads them; reading plies in order (as the
+analyzers do) replays each move once.
+
+Ply results are stored the same way, as int32 evaluation columns and
+packed moves, and turned back into dicts when they are serialized.
+"""
+
+import threading
+from array import array
+import chess
+import chess.polyglot
+from opening_book import encode_move, decode_move, NO_MOVE
+
+# Mixed into the key of a position drawn by the game's history, so a drawn
+# repetition never shares its search with the earlier, undrawn occurrences
+DRAWN_KEY_SALT = 0x9E3779B97F4A7C15
+
+def position_key(board):
+    """Zobrist hash of a position: equal for transpositions, ignores move clocks"""
+    return chess.polyglot.zobrist_hash(board)
+
+def history_draw(board):
+    """Claimable draw a game review scores as drawn (threefold repetition, fifty-move rule), or None"""
+    if board.is_repetition(3) and not board.is_checkmate():
+        return "threefold repetition"
+    if board.is_fifty_moves():
+        return "fifty-move rule"
+    return None
+
+class Ply:
+    """Read-only view of one ply of a ``GamePlies``.
+
+    Indexable like the per-ply dicts it replaces: "fen", "key", "draw",
+    "move_number", "move" (UCI, "start" for the first ply), "move_played"
+    (SAN), "previous_fen" and "previous_key".
+    """
+
+    __slots__ = ("plies", "index")
+
+    def __init__(self, plies, index):
+        self.plies = plies
+        self.index = index
+
+    def __getitem__(self, name):
+        plies = self.plies
+        index = self.index
+        if name == "key":
+            return plies.keys[index]
+        if name == "fen":
+            return plies.fen(index)
+        if name == "move_number":
+            return index
+        if name == "draw":
+            return plies.draws.get(index)
+        if name == "move":
+            return plies.move_uci(index) if index > 0 else "start"
+        if name == "move_played":
+            return plies.san(index) if index > 0 else None
+        if name == "previous_fen":
+            return plies.fen(index - 1) if index > 0 else None
+        if name == "previous_key":
+            return plies.keys[index - 1] if index > 0 else None
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            value = self[name]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+class GamePlies:
+    """Every position of a game's mainline (the start position is ply 0).
+
+    Indexing yields ``Ply`` views; ``len()`` counts positions, so a game
+    of n moves has n + 1 plies.
+    """
+
+    def __init__(self, board, moves):
+        """Replay ``moves`` from ``board`` (left unchanged); stops at the first
+        illegal move or null move (PGN "--"), which has no 16-bit encoding"""
+        board = board.copy()
+        self.start_fen = board.fen()
+        self.moves = array("H")
+        self.keys = array("Q")
+        # Ply -> reason, for the few positions drawn by repetition or the fifty-move rule
+        self.draws = {}
+        self.errors = []
+        self._add_position(board)
+        for move in moves:
+            if move == chess.Move.null():
+                self.errors.append(f"Failed to process move {len(self.moves) + 1}: null move")
+                break
+            try:
+                board.push(move)
+            except Exception as e:
+                self.errors.append(f"Failed to process move {len(self.moves) + 1}: {e}")
+                break
+            self.moves.append(encode_move(move))
+            self._add_position(board)
+        self._lock = threading.Lock()
+        self._cursor = None
+
+    def _add_position(self, board):
+        draw = history_draw(board)
+        if draw is not None:
+            self.draws[len(self.keys)] = draw
+            self.keys.append(position_key(board) ^ DRAWN_KEY_SALT)
+        else:
+            self.keys.append(position_key(board))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Ply(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ply index out of range")
+        return Ply(self, index)
+
+    def __iter__(self):
+        return (Ply(self, i) for i in range(len(self)))
+
+    def move(self, index):
+        """Move that led to ply ``index`` (``index`` >= 1)"""
+        return decode_move(self.moves[index - 1])
+
+    def move_uci(self, index):
+        return self.move(index).uci()
+
+    def uci_moves(self):
+        return [decode_move(value).uci() for value in self.moves]
+
+    def _boards(self, index):
+        """(board at ``index``, board at ``index - 1``), replaying from the nearest known position"""
+        cursor = self._cursor
+        if cursor is None or index < cursor[0] - 1:
+            board = chess.Board(self.start_fen)
+            cursor = (0, board, None)
+        position, board, previous = cursor
+        if index == position - 1:
+            return previous, None
+        while position < index:
+            previous = board.copy(stack=False)
+            board.push(decode_move(self.moves[position]))
+            board.clear_stack()
+            position += 1
+        self._cursor = (position, board, previous)
+        return board, previous
+
+    def fen(self, index):
+        with self._lock:
+            return self._boards(index)[0].fen()
+
+    def san(self, index):
+        """SAN of the move that led to ply ``index``"""
+        with self._lock:
+            _, previous = self._boards(index)
+            if previous is None:
+                # Only reachable when stepping back past the cursor's previous board
+                previous = self._boards(index - 1)[0]
+            return previous.san(self.move(index))
+
+# Marks a missing evaluation in the int32 columns
+NO_EVALUATION = -(1 << 31)
+
+class PlyResults:
+    """Per-ply analysis results of one game, stored column-wise.
+
+    ``set`` takes the dicts ``build_ply_result`` produces (in any order);
+    ``records`` rebuilds them, FENs and SAN included, for serialization.
+    """
+
+    EVALUATIONS = ("evaluation", "previous_position_evaluation", "move_played_evaluation", "best_move_evaluation")
+
+    def __init__(self, plies):
+        self.plies = plies
+        count = len(plies)
+        self.filled = bytearray(count)
+        self.success = bytearray(count)
+        self.columns = {name: array("i", [NO_EVALUATION]) * count for name in self.EVALUATIONS}
+        self.best_moves = array("H", [NO_MOVE]) * count
+        self.depths = array("H", [0]) * count
+        # Principal variations back to back; ply i's runs from pv_starts[i] for pv_lengths[i] moves
+        self.pv_moves = array("H")
+        self.pv_starts = array("I", [0]) * count
+        self.pv_lengths = array("H", [0]) * count
+        # Sparse or shared per-ply values
+        self.worker_names = []
+        self.workers = array("H", [0]) * count
+        self.extras = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _worker(self, worker_id):
+        try:
+            return self.worker_names.index(worker_id)
+        except ValueError:
+            self.worker_names.append(worker_id)
+            return len(self.worker_names) - 1
+
+    def set(self, result):
+        index = result["move_number"]
+        if not self.filled[index]:
+            self.count += 1
+        self.filled[index] = 1
+        self.success[index] = 1 if result.get("success") else 0
+        self.workers[index] = self._worker(result.get("worker_id"))
+        extras = {name: result[name] for name in ("opening", "terminal", "error") if result.get(name) is not None}
+        if extras:
+            self.extras[index] = extras
+        else:
+            self.extras.pop(index, None)
+        if not self.success[index]:
+            return
+        for name, column in self.columns.items():
+            value = result.get(name)
+            column[index] = NO_EVALUATION if value is None else value
+        best_move = result.get("best_move")
+        self.best_moves[index] = encode_move(chess.Move.from_uci(best_move)) if best_move else NO_MOVE
+        self.depths[index] = result.get("depth") or 0
+        pv = [encode_move(move) for move in map(chess.Move.from_uci, result.get("pv") or []) if move]
+        self.pv_starts[index] = len(self.pv_moves)
+        self.pv_lengths[index] = len(pv)
+        self.pv_moves.extend(pv)
+
+    def record(self, index):
+        """The result dict of one ply"""
+        ply = self.plies[index]
+        extras = self.extras.get(index, {})
+        worker_id = self.worker_names[self.workers[index]]
+        if not self.success[index]:
+            return {
+                "move_number": index,
+                "fen": ply["fen"],
+                "error": extras.get("error"),
+                "worker_id": worker_id,
+                "success": False
+            }
+        best_move = decode_move(self.best_moves[index])
+        start = self.pv_starts[index]
+        record = {"move_number": index, "fen": ply["fen"], "best_move": best_move.uci() if best_move else None}
+        for name, column in self.columns.items():
+            record[name] = None if column[index] == NO_EVALUATION else column[index]
+        record.update({
+            "depth": self.depths[index],
+            "pv": [decode_move(value).uci() for value in self.pv_moves[start:start + self.pv_lengths[index]]],
+            "opening": extras.get("opening"),
+            "terminal": extras.get("terminal"),
+            "worker_id": worker_id,
+            "move_played": ply["move_played"],
+            "success": True
+        })
+        return record
+
+    def records(self):
+        """Result dicts of the filled plies, in game order"""
+        return [self.record(index) for index in range(len(self.plies)) if self.filled[index]]
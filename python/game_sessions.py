@@ -0,0 +1,79 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_SESSIONS = 256
+
+def moves_hash(start_fen, moves):
+    """Session id for a game: hash of its starting position and UCI move list"""
+    digest = hashlib.sha1(start_fen.encode("utf-8"))
+    for move in moves:
+        digest.update(b" ")
+        digest.update(move.encode("ascii"))
+    return digest.hexdigest()[:24]
+
+class GameSession:
+    """Searches of one analyzed game, reusable when the game is extended or edited"""
+
+    def __init__(self, session_id, start_fen, moves, depth, searches):
+        self.session_id = session_id
+        self.start_fen = start_fen
+        self.moves = moves
+        self.depth = depth
+        # Zobrist key -> search result (as returned by search_position_worker)
+        self.searches = searches
+
+    def divergence(self, start_fen, moves):
+        """First ply (0 is the start position, ply n follows move n) that differs from this session, or None if none does"""
+        if start_fen != self.start_fen:
+            return 0
+        for index, (old, new) in enumerate(zip(self.moves, moves)):
+            if old != new:
+                return index + 1
+        if len(moves) > len(self.moves):
+            return len(self.moves) + 1
+        return None
+
+class GameSessionStore:
+    """Bounded in-memory LRU of game sessions (lives as long as the analysis server)"""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session):
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_session_store():
+    """Process-wide session store; GAME_SESSIONS_MAX bounds it (0 disables sessions)"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            try:
+                max_sessions = int(os.environ.get("GAME_SESSIONS_MAX", DEFAULT_MAX_SESSIONS))
+            except ValueError:
+                print("WARNING: Ignoring invalid GAME_SESSIONS_MAX", file=sys.stderr)
+                max_sessions = DEFAULT_MAX_SESSIONS
+            _shared_store = GameSessionStore(max_sessions)
+        return _shared_store if _shared_store.max_sessions > 0 else None
@@ -0,0 +1,206 @@
+"""
+Append-only journals that let long analysis jobs survive a crash or restart.
+
+A job started with a job id writes one NDJSON line to
+``JOB_JOURNAL_DIR/<job id>.ndjson`` for every search as soon as it
+finishes, and (corpus runs) one for every game once its record has been
+written out. Running the same job again with ``resume`` reloads the
+journal: journaled searches are not repeated and finished games are
+skipped. Lines are flushed as they are written, so a killed process
+loses at most the line it was writing (a torn last line is cut off on
+resume); they are fsynced every JOB_JOURNAL_FSYNC seconds.
+
+    {"job": "<id>", "version": 1, "kind": "corpus", "depth": 18, ...}   header
+    {"k": "<zobrist key, hex>", "s": {search}}                          finished search
+    {"g": 12}  or  {"g": [0, 1, 2]}                                     finished game(s)
+    {"complete": {summary}}                                             job ended
+
+``compact`` rewrites the journal in place (via a temporary file and an
+atomic rename) keeping only the searches still needed, the finished games
+and, at the end of a job, its summary.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache", "jobs")
+DEFAULT_FSYNC_INTERVAL = 1.0
+JOURNAL_VERSION = 1
+
+JOB_ID_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,127}")
+
+def get_journal_dir():
+    return os.environ.get("JOB_JOURNAL_DIR", DEFAULT_JOURNAL_DIR)
+
+def journal_path(job_id):
+    """Journal file of a job; ids are restricted to a safe file name"""
+    if not isinstance(job_id, str) or not JOB_ID_PATTERN.fullmatch(job_id):
+        raise ValueError(f"Invalid job id {job_id!r} (use letters, digits, '.', '_' and '-')")
+    return os.path.join(get_journal_dir(), job_id + ".ndjson")
+
+def truncate_torn_line(path):
+    """Cut a trailing partial line (from a write interrupted by a crash) off an NDJSON file"""
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+# Journals open in this process; a second run of the same job would interleave its lines
+_open_paths = set()
+_open_paths_lock = threading.Lock()
+
+def _encode(record):
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+class JobJournal:
+    """Journal of one job.
+
+    ``job`` holds the parameters that identify the job (kind, depth,
+    inputs); resuming a journal written with different ones is refused
+    rather than mixing results. After a resume, ``searches`` (Zobrist key
+    -> search), ``games`` and ``summary`` (set if the job had completed)
+    hold what the journal recorded.
+    """
+
+    def __init__(self, job_id, job, resume=False, fsync_interval=None):
+        self.job_id = job_id
+        self.path = journal_path(job_id)
+        self.header = {"job": job_id, "version": JOURNAL_VERSION, **job}
+        self.searches = {}
+        self.games = set()
+        self.summary = None
+        self.resumed = False
+        if fsync_interval is None:
+            fsync_interval = float(os.environ.get("JOB_JOURNAL_FSYNC", DEFAULT_FSYNC_INTERVAL))
+        self.fsync_interval = fsync_interval
+        self.lines = 0
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+        with _open_paths_lock:
+            if self.path in _open_paths:
+                raise ValueError(f"Job {job_id} is already running")
+            _open_paths.add(self.path)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if resume and os.path.exists(self.path):
+                truncate_torn_line(self.path)
+                self._load()
+                self.resumed = True
+                self._file = open(self.path, "ab")
+                print(f"JOURNAL: Resuming job {job_id} ({len(self.searches)} searches, {len(self.games)} games done)", file=sys.stderr)
+            else:
+                self._file = open(self.path, "wb")
+                self._write(self.header)
+                self._sync()
+        except BaseException:
+            with _open_paths_lock:
+                _open_paths.discard(self.path)
+            raise
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"Corrupt journal line {number + 1} in {self.path}")
+                if number == 0:
+                    if record != self.header:
+                        raise ValueError(f"Journal {self.path} was written for a different job: {record}")
+                    continue
+                self.lines += 1
+                if "k" in record:
+                    self.searches[int(record["k"], 16)] = record["s"]
+                elif "g" in record:
+                    games = record["g"]
+                    self.games.update(games if isinstance(games, list) else [games])
+                elif "complete" in record:
+                    self.summary = record["complete"]
+
+    def _write(self, record):
+        self._file.write(_encode(record))
+        self._file.flush()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def _append(self, record):
+        with self._lock:
+            self._write(record)
+            self.lines += 1
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def record_search(self, key, search):
+        """Journal a finished search (failed searches are left out so a resume retries them)"""
+        if "error" in search:
+            return
+        self._append({"k": f"{key:016x}", "s": search})
+
+    def record_game(self, game_index):
+        """Journal a finished game; call after its record has been written out"""
+        self.games.add(game_index)
+        self._append({"g": game_index})
+
+    def compact(self, keep=None, summary=None):
+        """Rewrite the journal with only the searches whose keys are in ``keep`` (all if None)
+        and the finished games, plus ``summary`` when the job has ended"""
+        with self._lock:
+            self._file.flush()
+            temporary = self.path + ".tmp"
+            kept = 0
+            seen = set()
+            with open(self.path, "rb") as source, open(temporary, "wb") as target:
+                target.write(_encode(self.header))
+                if self.games:
+                    target.write(_encode({"g": sorted(self.games)}))
+                for number, line in enumerate(source):
+                    if number == 0 or not line.startswith(b'{"k":'):
+                        continue
+                    record = json.loads(line)
+                    key = int(record["k"], 16)
+                    if key in seen or (keep is not None and key not in keep):
+                        continue
+                    seen.add(key)
+                    target.write(line)
+                    kept += 1
+                if summary is not None:
+                    target.write(_encode({"complete": summary}))
+                target.flush()
+                os.fsync(target.fileno())
+            self._file.close()
+            os.replace(temporary, self.path)
+            self._file = open(self.path, "ab")
+            self.lines = kept + (1 if self.games else 0) + (1 if summary is not None else 0)
+            self._last_sync = time.monotonic()
+        return kept
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                with _open_paths_lock:
+                    _open_paths.discard(self.path)
@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+
+# Seconds buckets shared by search and request latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+NPS_BUCKETS = (1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6)
+
+_ply_logging = os.environ.get("ANALYSIS_PLY_LOG", "1") != "0"
+
+def ply_logging_enabled():
+    """Whether per-ply/per-worker progress lines go to stderr (ANALYSIS_PLY_LOG=0 turns them off)"""
+    return _ply_logging
+
+def set_ply_logging(enabled):
+    global _ply_logging
+    _ply_logging = bool(enabled)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+class Counter:
+    """Monotonic count per label set"""
+
+    type = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram:
+    """Bucketed observations per label set (cumulative buckets, as Prometheus expects)"""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            samples = []
+            for key, series in self._series.items():
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    buckets.append([bound, cumulative])
+                count = cumulative + series[len(self.buckets)]
+                samples.append({"labels": dict(key), "buckets": buckets, "count": count, "sum": series[-1]})
+            return samples
+
+class MetricsRegistry:
+    """Process-wide set of metrics plus collectors sampled at snapshot time.
+
+    ``snapshot()`` returns plain JSON that the Node backend renders in the
+    Prometheus text format on ``/metrics``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def add_collector(self, collector):
+        """Register ``collector()`` returning extra metric dicts (same shape as snapshot entries)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        result = [
+            {"name": metric.name, "type": metric.type, "help": metric.help, "samples": metric.samples()}
+            for metric in metrics
+        ]
+        for collector in collectors:
+            try:
+                result.extend(collector())
+            except Exception as e:
+                print(f"WARNING: Metrics collector failed: {e}", file=sys.stderr)
+        return {"metrics": result}
+
+registry = MetricsRegistry()
+
+# Metrics updated on the analysis hot path
+SEARCHES = registry.counter("analysis_searches_total", "Positions answered, by source (engine, cache, book, tablebase, rules, forced, session, journal)")
+CACHE_LOOKUPS = registry.counter("analysis_cache_lookups_total", "Evaluation cache lookups, by result (hit, miss)")
+SEARCH_SECONDS = registry.histogram("analysis_search_seconds", "Engine search time per position as reported by the engine")
+SEARCH_NODES = registry.counter("analysis_search_nodes_total", "Nodes searched by the engines")
+SEARCH_NPS = registry.histogram("analysis_search_nps", "Engine nodes per second per search", NPS_BUCKETS)
+ENGINE_SPAWNS = registry.counter("engine_spawns_total", "Engine processes started (replacements of crashed engines included)")
+ENGINE_DISCARDS = registry.counter("engine_discards_total", "Engine processes discarded (crashed, unhealthy or pool closed)")
+ENGINE_WAITING = registry.gauge("engine_checkout_waiting", "Callers currently waiting for a free engine")
+
+def record_search(source, result=None):
+    """Count one answered position; engine results also feed the time/node/NPS metrics"""
+    SEARCHES.inc(source=source)
+    if source == "engine" and result is not None:
+        SEARCH_SECONDS.observe(result.get("time_ms", 0) / 1000.0)
+        SEARCH_NODES.inc(result.get("nodes", 0))
+        if result.get("nps"):
+            SEARCH_NPS.observe(result["nps"])
+
+def get_registry():
+    return registry
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Precomputed opening book built from backend/resources/openings.json.
+
+``python opening_book.py build --depth 20`` analyzes every named opening
+position once and writes a book file that ``search_position`` consults
+before the evaluation cache and the engine. The file is an open-addressing
+hash table keyed by Zobrist hash and is memory-mapped, so loading it costs
+the same no matter how many positions it holds:
+
+    header  : magic "CHBK", version u16, depth u16, slot count u32,
+              entry count u32, names offset u32
+    slots   : key u64 (0 = empty), score i32, move u16, name u16,
+              score type u8 (0 cp, 1 mate), padding u8
+    names   : count u32, offsets u32[count + 1], UTF-8 blob
+
+Scores are from the side to move, like ``UciEngine.go()``.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import chess
+import chess.polyglot
+
+BOOK_MAGIC = b"CHBK"
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct("<4sHHIII")
+BOOK_SLOT = struct.Struct("<QiHHBx")
+NO_NAME = 0xFFFF
+NO_MOVE = 0
+
+SCORE_TYPES = ("cp", "mate")
+
+# Keep the table at most half full so probes stay short
+BOOK_LOAD_FACTOR = 0.5
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE_PATH = os.path.join(PROJECT_ROOT, "backend", "resources", "openings.json")
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache", "opening_book.bin")
+DEFAULT_BOOK_DEPTH = 20
+
+# Nodes spent looking for the line that leads to a placement-only entry;
+# entries still unresolved after that are left out of the book
+SIDE_SEARCH_NODES = 2000
+
+CASTLED_ROOKS = {
+    chess.WHITE: ((chess.G1, chess.F1, chess.H1), (chess.C1, chess.D1, chess.A1)),
+    chess.BLACK: ((chess.G8, chess.F8, chess.H8), (chess.C8, chess.D8, chess.A8)),
+}
+
+def encode_move(move):
+    """Pack a move into 16 bits: from (6) | to (6) | promotion piece type (3)"""
+    if move is None:
+        return NO_MOVE
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+def decode_move(value):
+    """Inverse of ``encode_move``; returns None for NO_MOVE"""
+    if value == NO_MOVE:
+        return None
+    promotion = (value >> 12) & 0x7
+    return chess.Move(value & 0x3F, (value >> 6) & 0x3F, promotion or None)
+
+def _knight_distances():
+    table = []
+    for origin in chess.SQUARES:
+        distance = {origin: 0}
+        frontier = [origin]
+        while frontier:
+            square = frontier.pop(0)
+            for reached in chess.scan_forward(chess.BB_KNIGHT_ATTACKS[square]):
+                if reached not in distance:
+                    distance[reached] = distance[square] + 1
+                    frontier.append(reached)
+        table.append([distance[square] for square in chess.SQUARES])
+    return table
+
+KNIGHT_DISTANCE = _knight_distances()
+
+@functools.lru_cache(maxsize=None)
+def _distance(piece_type, color, origin, square):
+    """Fewest moves a piece needs from ``origin`` to ``square`` on an empty
+    board, or None if it can never get there"""
+    files = abs(chess.square_file(origin) - chess.square_file(square))
+    ranks = chess.square_rank(square) - chess.square_rank(origin)
+    if piece_type == chess.PAWN:
+        forward = ranks if color == chess.WHITE else -ranks
+        if forward < max(files, 1):
+            return None
+        home_rank = 1 if color == chess.WHITE else 6
+        # One double step, unless every step is a capture
+        return forward - (chess.square_rank(origin) == home_rank and forward - files >= 2)
+    if piece_type == chess.KNIGHT:
+        return KNIGHT_DISTANCE[origin][square]
+    if piece_type == chess.KING:
+        castles = origin == (chess.E1 if color == chess.WHITE else chess.E8) and ranks == 0 and files == 2
+        return 1 if castles else max(files, abs(ranks))
+    diagonal = files == abs(ranks)
+    straight = files == 0 or ranks == 0
+    if piece_type == chess.BISHOP:
+        if (files + ranks) % 2:
+            return None
+        return 1 if diagonal else 2
+    if piece_type == chess.ROOK:
+        return 1 if straight else 2
+    return 1 if diagonal or straight else 2
+
+def _moves_left(board, goal, color, ignore):
+    """Lower bound on the moves ``color`` needs to turn ``board`` into ``goal``:
+    every square it has to fill takes the nearest spare piece of that type
+    there. Pieces it loses may have been captured where they stand."""
+    needed = 0
+    for piece_type in chess.PIECE_TYPES:
+        have = board.pieces_mask(piece_type, color) & ~ignore
+        want = goal.pieces_mask(piece_type, color) & ~ignore
+        origins = list(chess.scan_forward(have & ~want))
+        for square in chess.scan_forward(want & ~have):
+            distances = [d for d in (_distance(piece_type, color, origin, square) for origin in origins) if d is not None]
+            if distances:
+                needed += min(distances)
+            elif piece_type == chess.PAWN:
+                return None
+            else:
+                needed += 1  # a promoted piece
+    return needed
+
+def infer_side_to_move(placement, node_budget=SIDE_SEARCH_NODES):
+    """Side to move after the shortest line from the start position that
+    reaches ``placement``, or None if no line turns up within ``node_budget``.
+
+    Named openings do not waste tempi, so the shortest line stands in for
+    the move sequence that openings.json leaves out. Lines are tried in
+    order of length with a depth-first search pruned by ``_moves_left``.
+    """
+    try:
+        goal = chess.Board(f"{placement} w - - 0 1")
+    except ValueError:
+        return None
+    # A castled rook moved with its king, so it does not add a move
+    ignore = {}
+    for color in chess.COLORS:
+        ignore[color] = 0
+        for king_to, rook_to, rook_from in CASTLED_ROOKS[color]:
+            if (goal.piece_at(king_to) == chess.Piece(chess.KING, color)
+                    and goal.piece_at(rook_to) == chess.Piece(chess.ROOK, color)):
+                ignore[color] |= chess.BB_SQUARES[rook_to] | chess.BB_SQUARES[rook_from]
+    goal_placement = goal.board_fen()
+    budget = [node_budget]
+
+    def within(needed, left):
+        return needed is not None and needed <= left
+
+    def reachable(board, left, seen):
+        if board.occupied == goal.occupied and board.board_fen() == goal_placement:
+            return not any(left)
+        budget[0] -= 1
+        key = (board._transposition_key(), left)
+        if budget[0] < 0 or key in seen:
+            return False
+        seen.add(key)
+        mover = board.turn
+        after = (left[0] - (mover == chess.WHITE), left[1] - (mover == chess.BLACK))
+        # Try the moves that leave the least to do first. The other side's
+        # pieces only change when one of them is captured.
+        idle = _moves_left(board, goal, not mover, ignore[not mover])
+        candidates = []
+        for move in board.legal_moves:
+            capture = board.is_capture(move)
+            board.push(move)
+            needed = _moves_left(board, goal, mover, ignore[mover])
+            waiting = _moves_left(board, goal, not mover, ignore[not mover]) if capture else idle
+            board.pop()
+            if within(needed, after[mover == chess.BLACK]) and within(waiting, after[mover == chess.WHITE]):
+                candidates.append((needed + waiting, move))
+        candidates.sort(key=lambda candidate: candidate[0])
+        for _, move in candidates:
+            board.push(move)
+            found = reachable(board, after, seen)
+            board.pop()
+            if found:
+                return True
+        return False
+
+    start = chess.Board()
+    white = _moves_left(start, goal, chess.WHITE, ignore[chess.WHITE])
+    black = _moves_left(start, goal, chess.BLACK, ignore[chess.BLACK])
+    if white is None or black is None:
+        return None
+    # (plies, white moves, black moves, side to move afterwards)
+    lines = set()
+    for extra in range(3):
+        moves = max(white, black) + extra
+        lines.add((2 * moves, moves, moves, "w"))
+        moves = max(white - 1, black) + extra
+        lines.add((2 * moves + 1, moves + 1, moves, "b"))
+    for _, white_moves, black_moves, side in sorted(lines):
+        if reachable(start.copy(stack=False), (white_moves, black_moves), set()):
+            return side
+        if budget[0] < 0:
+            return None
+    return None
+
+def book_positions(entry):
+    """Normalize one openings.json entry into the legal positions it may describe.
+
+    Most entries only give piece placement. Their side to move comes from
+    ``infer_side_to_move``; entries where it stays ambiguous are dropped
+    rather than named for both sides. Castling rights are inferred from
+    kings and rooks on their home squares. Positions that cannot occur
+    (side not to move in check, bad pawn ranks) are dropped.
+    """
+    fields = entry["fen"].split()
+    if len(fields) >= 2:
+        sides = [fields[1]]
+    else:
+        side = infer_side_to_move(fields[0])
+        sides = [side] if side is not None else []
+    castling = fields[2] if len(fields) >= 3 else None
+    en_passant = fields[3] if len(fields) >= 4 else "-"
+
+    positions = []
+    for side in sides:
+        try:
+            board = chess.Board(f"{fields[0]} {side} {castling or '-'} {en_passant} 0 1")
+        except ValueError:
+            continue
+        if castling is None:
+            board.set_castling_fen("KQkq")
+            board.castling_rights = board.clean_castling_rights()
+        if board.is_valid():
+            positions.append(board)
+    return positions
+
+def load_book_source(path=DEFAULT_SOURCE_PATH):
+    """Read openings.json into {zobrist key: (fen, name)}; first name wins"""
+    with open(path, encoding="utf-8") as handle:
+        entries = json.load(handle)
+    positions = {}
+    skipped = 0
+    # Inferring the side to move is pure CPU work: spread it over processes
+    with ProcessPoolExecutor() as executor:
+        entry_boards = list(executor.map(book_positions, entries, chunksize=32))
+    for entry, boards in zip(entries, entry_boards):
+        skipped += not boards
+        for board in boards:
+            key = chess.polyglot.zobrist_hash(board)
+            if key and key not in positions:
+                positions[key] = (board.fen(), entry["name"])
+    if skipped:
+        print(f"BOOK: Skipped {skipped} openings whose side to move could not be inferred", file=sys.stderr)
+    return positions
+
+def write_book(path, depth, entries):
+    """Write ``entries`` ({key: (name, result)}) as a book file"""
+    names = []
+    name_index = {}
+    slot_count = 1
+    while slot_count * BOOK_LOAD_FACTOR < max(1, len(entries)):
+        slot_count *= 2
+
+    table = bytearray(BOOK_SLOT.size * slot_count)
+    for key, (name, result) in entries.items():
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        best_move = chess.Move.from_uci(result["best_move"]) if result.get("best_move") else None
+        slot = key % slot_count
+        while BOOK_SLOT.unpack_from(table, slot * BOOK_SLOT.size)[0] != 0:
+            slot = (slot + 1) % slot_count
+        BOOK_SLOT.pack_into(
+            table,
+            slot * BOOK_SLOT.size,
+            key,
+            result["score_value"],
+            encode_move(best_move),
+            name_index[name],
+            SCORE_TYPES.index(result["score_type"])
+        )
+
+    encoded_names = [name.encode("utf-8") for name in names]
+    offsets = [0]
+    for encoded in encoded_names:
+        offsets.append(offsets[-1] + len(encoded))
+    names_offset = BOOK_HEADER.size + len(table)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, depth, slot_count, len(entries), names_offset))
+        handle.write(table)
+        handle.write(struct.pack("<I", len(names)))
+        handle.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        handle.write(b"".join(encoded_names))
+    # Replace atomically so running analyzers never map a half-written book
+    os.replace(temp_path, path)
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book"""
+
+    def __init__(self, path=DEFAULT_BOOK_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.depth, self.slot_count, self.entry_count, self._names_offset = BOOK_HEADER.unpack_from(self._map, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise ValueError(f"Not an opening book (version {BOOK_VERSION}): {path}")
+        self._name_count = struct.unpack_from("<I", self._map, self._names_offset)[0]
+        self._names_blob = self._names_offset + 4 + 4 * (self._name_count + 1)
+        self._names = {}
+
+    def __len__(self):
+        return self.entry_count
+
+    def _name(self, index):
+        if index == NO_NAME or index >= self._name_count:
+            return None
+        name = self._names.get(index)
+        if name is None:
+            start, end = struct.unpack_from("<II", self._map, self._names_offset + 4 + 4 * index)
+            name = self._map[self._names_blob + start:self._names_blob + end].decode("utf-8")
+            self._names[index] = name
+        return name
+
+    def probe(self, board):
+        """Look up a position; returns a ``UciEngine.go()``-shaped result or None"""
+        key = chess.polyglot.zobrist_hash(board)
+        slot = key % self.slot_count
+        for _ in range(self.slot_count):
+            stored_key, score, move, name, score_type = BOOK_SLOT.unpack_from(self._map, BOOK_HEADER.size + slot * BOOK_SLOT.size)
+            if stored_key == 0:
+                return None
+            if stored_key == key:
+                best_move = decode_move(move)
+                return {
+                    "best_move": best_move.uci() if best_move else None,
+                    "ponder": None,
+                    "score_type": SCORE_TYPES[score_type],
+                    "score_value": score,
+                    "depth": self.depth,
+                    "seldepth": self.depth,
+                    "nodes": 0,
+                    "nps": 0,
+                    "time_ms": 0,
+                    "pv": [best_move.uci()] if best_move else [],
+                    "opening": self._name(name)
+                }
+            slot = (slot + 1) % self.slot_count
+        return None
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+_shared_book = None
+_shared_book_lock = threading.Lock()
+
+def get_shared_book():
+    """Process-wide opening book, or None when missing or disabled with OPENING_BOOK=0"""
+    global _shared_book
+    if os.environ.get("OPENING_BOOK", "1") == "0":
+        return None
+    with _shared_book_lock:
+        if _shared_book is None:
+            path = os.environ.get("OPENING_BOOK_PATH", DEFAULT_BOOK_PATH)
+            if not os.path.exists(path):
+                _shared_book = False
+            else:
+                try:
+                    _shared_book = OpeningBook(path)
+                    print(f"BOOK: Loaded {len(_shared_book)} positions (depth {_shared_book.depth}) from {path}", file=sys.stderr)
+                except Exception as e:
+                    print(f"WARNING: Opening book disabled: {e}", file=sys.stderr)
+                    _shared_book = False
+        return _shared_book or None
+
+def build_book(source=DEFAULT_SOURCE_PATH, output=DEFAULT_BOOK_PATH, depth=DEFAULT_BOOK_DEPTH, max_workers=None):
+    """Analyze every opening position once and write the book file"""
+    from engine_pool import get_shared_pool
+    from position_search import search_position
+    from worker_placement import plan_placement
+
+    positions = load_book_source(source)
+    placement = plan_placement()
+    max_workers = max_workers or placement.workers
+    pool = get_shared_pool(size=max_workers, threads=placement.threads, placement=placement)
+    print(f"BOOK: Analyzing {len(positions)} opening positions at depth {depth} with {max_workers} workers", file=sys.stderr)
+
+    entries = {}
+    start_time = time.time()
+    with pool.lease(max_workers) as lease, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_key = {
+            executor.submit(search_position, fen, depth, lease.engine, use_book=False): key
+            for key, (fen, name) in positions.items()
+        }
+        for completed, future in enumerate(as_completed(future_to_key), 1):
+            key = future_to_key.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"BOOK: Skipping {positions[key][1]}: {e}", file=sys.stderr)
+                continue
+            if result.get("best_move") and not result.get("stopped"):
+                entries[key] = (positions[key][1], result)
+            if completed % 100 == 0 or completed == len(positions):
+                rate = completed / (time.time() - start_time)
+                print(f"BOOK: {completed}/{len(positions)} positions ({rate:.1f} pos/sec)", file=sys.stderr)
+
+    write_book(output, depth, entries)
+    print(f"BOOK: Wrote {len(entries)} positions to {output}", file=sys.stderr)
+    return len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Opening book tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Analyze openings.json and write the book file")
+    build.add_argument("--source", default=DEFAULT_SOURCE_PATH, help="Openings JSON file")
+    build.add_argument("--output", default=os.environ.get("OPENING_BOOK_PATH", DEFAULT_BOOK_PATH), help="Book file to write")
+    build.add_argument("--depth", type=int, default=DEFAULT_BOOK_DEPTH, help="Search depth per position")
+    build.add_argument("--workers", type=int, default=None, help="Number of engine workers")
+    probe = subparsers.add_parser("probe", help="Look up one FEN in the book")
+    probe.add_argument("fen")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from engine_pool import close_shared_pool
+        try:
+            build_book(args.source, args.output, args.depth, args.workers)
+        finally:
+            close_shared_pool()
+    else:
+        book = get_shared_book()
+        if book is None:
+            print("No opening book found; run 'python opening_book.py build' first", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(book.probe(chess.Board(args.fen))))
+
+if __name__ == "__main__":
+    main()
@@ -3,62 +3,43 @@ import json
 import threading
 import time
 import queue
-import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from stockfish import Stockfish
 import chess
 import chess.pgn
 from io import StringIO
+from engine_pool import get_shared_pool, close_shared_pool
+from position_search import search_position
+from worker_placement import plan_placement
+from metrics import ply_logging_enabled
 
-# Path to your stockfish.exe (update this path as needed)
-STOCKFISH_PATH = "C:\\Users\\ragha\\Desktop\\Chess_0610\\stockfish\\stockfish.exe"
+# Per-engine settings for the shared pool used by this analyzer
+ENGINE_HASH_MB = 256   # Increased hash for depth 10 analysis
 
-def get_optimal_worker_count():
+def get_optimal_worker_count(placement=None):
     """Determine optimal number of workers based on system resources"""
-    cpu_count = multiprocessing.cpu_count()
-    # Use fewer workers but with more threads each for better performance
-    # With 2 threads per worker, use fewer workers to avoid over-subscription
-    return min(4, max(1, cpu_count // 2))
+    # Workers x Threads comes from the usable cores (affinity mask and cgroup quota)
+    return plan_placement(placement).workers
 
-def create_stockfish_instance():
-    """Create a new Stockfish instance optimized for maximum speed"""
-    return Stockfish(
-        STOCKFISH_PATH,
-        parameters={
-            "Threads": 2,                # Use 2 threads per worker for better performance
-            "Hash": 256,                 # Increased hash for depth 10 analysis
-            "Skill Level": 20,           # Full engine strength
-            "Contempt": 0,               # Neutral evaluation
-            "Move Overhead": 0,          # No move delay
-            "Minimum Thinking Time": 0,  # No minimum thinking time for speed
-            "Ponder": False,             # Disable pondering
-            "MultiPV": 1,               # Analyze only the best line
-            "UCI_LimitStrength": False, # Don't limit strength
-            "UCI_Elo": 3200,            # High ELO for maximum strength
-            "nodestime": 0              # No time limit per node
-        }
-    )
+def get_engine_pool(max_workers, placement=None):
+    """Shared engine pool optimized for maximum speed"""
+    plan = plan_placement(placement)
+    return get_shared_pool(size=max_workers, hash_mb=ENGINE_HASH_MB, threads=plan.threads, placement=plan)
 
-def analyze_position_worker(fen_data):
+def analyze_position_worker(fen_data, lease):
     """Worker function to analyze a single FEN position with optimized performance"""
     fen, move_number, depth = fen_data
     
     try:
-        stockfish = create_stockfish_instance()
-        
-        # Optimized analysis - no unnecessary resets
-        stockfish.set_fen_position(fen)
-        stockfish.set_depth(depth)
-        
-        # Get analysis results
-        best_move = stockfish.get_best_move()
-        evaluation = stockfish.get_evaluation()
+        # Optimized analysis - cached positions skip the engine entirely
+        search = search_position(fen, depth, lease.engine)
         
         return {
             "move_number": move_number,
             "fen": fen,
-            "best_move": best_move,
-            "evaluation": evaluation,
+            "best_move": search["best_move"],
+            "evaluation": search["evaluation"],
+            "pv": search["pv"],
+            "opening": search.get("opening"),
             "depth": depth,
             "success": True
         }
@@ -106,7 +87,7 @@ def parse_pgn_to_fens(pgn_string):
     except Exception as e:
         raise ValueError(f"Failed to parse PGN: {str(e)}")
 
-def analyze_pgn_multithreaded(pgn_string, depth=10, max_workers=None):
+def analyze_pgn_multithreaded(pgn_string, depth=10, max_workers=None, placement=None):
     """Analyze entire PGN game using multiple workers"""
     try:
         # Parse PGN to get FEN positions
@@ -116,7 +97,7 @@ def analyze_pgn_multithreaded(pgn_string, depth=10, max_workers=None):
         
         # Determine optimal worker count
         if max_workers is None:
-            max_workers = get_optimal_worker_count()
+            max_workers = get_optimal_worker_count(placement)
         
         print(f"Using {max_workers} workers for analysis")
         
@@ -130,10 +111,11 @@ def analyze_pgn_multithreaded(pgn_string, depth=10, max_workers=None):
         results = {}
         start_time = time.time()
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pool = get_engine_pool(max_workers, placement)
+        with pool.lease(max_workers) as lease, ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Submit all analysis tasks
             future_to_move = {
-                executor.submit(analyze_position_worker, data): data[1]
+                executor.submit(analyze_position_worker, data, lease): data[1]
                 for data in analysis_data
             }
             
@@ -146,7 +128,7 @@ def analyze_pgn_multithreaded(pgn_string, depth=10, max_workers=None):
                     results[move_number] = result
                     completed += 1
                     
-                    if completed % 5 == 0 or completed == len(fens):
+                    if ply_logging_enabled() and (completed % 5 == 0 or completed == len(fens)):
                         print(f"Completed {completed}/{len(fens)} analyses")
                         
                 except Exception as e:
@@ -194,15 +176,17 @@ def main():
         pgn_string = data["pgn"]
         depth = data.get("depth", 10)
         max_workers = data.get("max_workers", None)
+        placement = data.get("placement")
         
         print(f"Starting PGN analysis with depth {depth}")
         
         # Analyze the PGN game
-        result = analyze_pgn_multithreaded(pgn_string, depth, max_workers)
+        result = analyze_pgn_multithreaded(pgn_string, depth, max_workers, placement)
         
         # Output JSON result to Node.js
         print(json.dumps(result))
         sys.stdout.flush()
+        close_shared_pool()
         
     except Exception as e:
         error_result = {
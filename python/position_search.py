@@ -0,0 +1,284 @@
+import sys
+import asyncio
+import threading
+import contextvars
+import chess
+from uci_engine import white_relative
+from eval_cache import get_shared_cache
+from opening_book import get_shared_book
+from tablebase import get_shared_tablebase
+from metrics import record_search, CACHE_LOOKUPS
+import tracing
+
+class SearchCounter:
+    """Thread-safe tally of where each position's result came from"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def count(self, source, amount=1):
+        with self._lock:
+            self._counts[source] = self._counts.get(source, 0) + amount
+
+    def get(self, source):
+        with self._lock:
+            return self._counts.get(source, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+def settled_result(board, depth, draw=None):
+    """Exact result for a position the rules of chess decide, or None if it needs a search.
+
+    Covers checkmate, stalemate and insufficient material; ``draw`` names
+    a draw the game record settles (threefold repetition or the fifty-move
+    rule, see game_plies.history_draw). Both are only claimable, so a
+    position on its own is still searched for a best move. The result has the shape of ``UciEngine.go()`` plus the
+    game ``result`` ("1-0", "0-1" or "1/2-1/2") and the ``terminal``
+    reason. A checkmate is scored "mate 0" (the side to move is mated),
+    as Stockfish does.
+    """
+    best_move = None
+    if board.is_checkmate():
+        terminal = "checkmate"
+        result = "0-1" if board.turn == chess.WHITE else "1-0"
+    elif board.is_stalemate():
+        terminal = "stalemate"
+    elif board.is_insufficient_material():
+        terminal = "insufficient material"
+        # No sequence of moves can mate, so every move keeps the draw
+        best_move = next(iter(board.legal_moves), None)
+    elif draw is not None:
+        terminal = draw
+    else:
+        return None
+    if terminal != "checkmate":
+        result = "1/2-1/2"
+    return {
+        "best_move": best_move.uci() if best_move else None,
+        "ponder": None,
+        "score_type": "mate" if terminal == "checkmate" else "cp",
+        "score_value": 0,
+        "depth": depth,
+        "seldepth": 0,
+        "nodes": 0,
+        "nps": 0,
+        "time_ms": 0,
+        "pv": [best_move.uci()] if best_move else [],
+        "result": result,
+        "terminal": terminal
+    }
+
+def settle_position(fen, depth, counter=None, draw=None):
+    """``settled_result`` for a FEN, tagged like the other lookups; None when a search is needed"""
+    settled = settled_result(chess.Board(fen), depth, draw)
+    if settled is None:
+        return None
+    settled["evaluation"] = white_relative(settled, fen)
+    settled["cached"] = True
+    settled["source"] = "rules"
+    if counter is not None:
+        counter.count("rules")
+    record_search("rules")
+    return settled
+
+def forced_move(board):
+    """The only legal move of a position, or None"""
+    moves = iter(board.legal_moves)
+    move = next(moves, None)
+    if move is None or next(moves, None) is not None:
+        return None
+    return move
+
+def forced_result(fen, move, reply):
+    """Result for a position with a single legal ``move`` from the search of the position after it.
+
+    Scores are from the side to move, so the reply's score flips sign;
+    being mated in n after the move means mating in n + 1 before it.
+    """
+    if reply["score_type"] == "mate":
+        value = reply["score_value"]
+        score = -value if value > 0 else -value + 1
+    else:
+        score = -reply["score_value"]
+    result = dict(reply)
+    result.update({
+        "best_move": move.uci(),
+        "ponder": reply["best_move"],
+        "score_value": score,
+        "depth": (reply.get("depth") or 0) + 1,
+        "pv": [move.uci()] + list(reply.get("pv") or []),
+        "forced": True
+    })
+    # These describe the reply position, not this one
+    for field in ("result", "terminal", "tablebase", "opening"):
+        result.pop(field, None)
+    result["evaluation"] = white_relative(result, fen)
+    return result
+
+def forced_info(fen, move, on_info):
+    """Adapt ``on_info`` snapshots of the reply's search to the forced position (None passes through)"""
+    if on_info is None:
+        return None
+    return lambda snapshot: on_info(forced_result(fen, move, snapshot))
+
+def forced_reply_fen(fen, move):
+    board = chess.Board(fen)
+    board.push(move)
+    return board.fen()
+
+def record_forced_move(fen, move, reply, counter=None):
+    """Tag a position answered from the search of its only move's reply"""
+    result = forced_result(fen, move, reply)
+    if counter is not None:
+        counter.count("forced")
+        # An engine search of the reply only replaces this position's own search
+        if reply.get("source") != "engine":
+            counter.count("forced_shared")
+    record_search("forced")
+    return result
+
+def lookup_position(fen, depth, use_cache=True, counter=None, use_book=True):
+    """Answer a position from the rules, the endgame tablebase, the opening book or the evaluation cache, or return None"""
+    settled = settle_position(fen, depth, counter)
+    if settled is not None:
+        return settled
+
+    tablebase = get_shared_tablebase()
+    if tablebase is not None:
+        try:
+            exact = tablebase.probe(chess.Board(fen), depth)
+        except Exception as e:
+            print(f"WARNING: Tablebase probe failed: {e}", file=sys.stderr)
+            exact = None
+        if exact is not None:
+            exact["evaluation"] = white_relative(exact, fen)
+            exact["cached"] = True
+            exact["source"] = "tablebase"
+            if counter is not None:
+                counter.count("tablebase")
+            record_search("tablebase")
+            return exact
+
+    book = get_shared_book() if use_book else None
+    if book is not None and book.depth >= depth:
+        try:
+            booked = book.probe(chess.Board(fen))
+        except Exception as e:
+            print(f"WARNING: Opening book lookup failed: {e}", file=sys.stderr)
+            booked = None
+        if booked is not None:
+            booked["evaluation"] = white_relative(booked, fen)
+            booked["cached"] = True
+            booked["source"] = "book"
+            if counter is not None:
+                counter.count("book")
+            record_search("book")
+            return booked
+
+    cache = get_shared_cache() if use_cache else None
+    if cache is not None:
+        try:
+            cached = cache.get(fen, depth)
+        except Exception as e:
+            print(f"WARNING: Evaluation cache lookup failed: {e}", file=sys.stderr)
+            cached = None
+        if cached is not None:
+            cached["evaluation"] = white_relative(cached, fen)
+            cached["source"] = "cache"
+            if counter is not None:
+                counter.count("cache")
+            CACHE_LOOKUPS.inc(result="hit")
+            record_search("cache")
+            return cached
+        CACHE_LOOKUPS.inc(result="miss")
+    return None
+
+def record_engine_search(fen, result, use_cache=True, counter=None):
+    """Tag a fresh engine result and store it in the evaluation cache"""
+    result["cached"] = False
+    result["source"] = "engine"
+    if counter is not None:
+        counter.count("engine")
+        counter.count("engine_nodes", result.get("nodes") or 0)
+    record_search("engine", result)
+
+    # Only complete searches are worth keeping
+    cache = get_shared_cache() if use_cache else None
+    if cache is not None and not result.get("stopped"):
+        try:
+            cache.put(fen, result)
+        except Exception as e:
+            print(f"WARNING: Evaluation cache store failed: {e}", file=sys.stderr)
+    return result
+
+def search_position(fen, depth, acquire_engine, timeout=None, use_cache=True, counter=None, use_book=True, on_info=None):
+    """Search one position, consulting the endgame tablebase, the opening book and the persistent evaluation cache first.
+
+    ``acquire_engine`` is a zero-argument callable returning a context
+    manager that yields a ``UciEngine`` (``pool.engine`` or
+    ``lease.engine``); it is only called when none of the tablebase, the
+    book and the cache has the position at ``depth`` or deeper. The result
+    has the shape of ``UciEngine.analyse()`` plus ``cached`` and ``source``
+    ("tablebase", "book", "cache" or "engine") telling where it came from;
+    book hits also carry the ``opening`` name and tablebase hits the exact
+    ``tablebase`` WDL/DTZ. ``on_info`` receives intermediate engine results
+    as each depth completes (book and cache hits answer at once instead).
+    A position with a single legal move is answered from a search of the
+    position after it, one ply shallower, and carries ``forced``; its
+    ``on_info`` snapshots are adapted the same way.
+    """
+    with tracing.span("lookup") as lookup:
+        known = lookup_position(fen, depth, use_cache, counter, use_book)
+        lookup.set(source=known["source"] if known is not None else None)
+    if known is not None:
+        return known
+
+    move = forced_move(chess.Board(fen))
+    if move is not None and depth > 1:
+        # Only one move to find: search the position after it, one ply shallower
+        reply_fen = forced_reply_fen(fen, move)
+        with tracing.span("forced move", move=move.uci()):
+            reply = search_position(reply_fen, depth - 1, acquire_engine, timeout, use_cache, counter, use_book, forced_info(fen, move, on_info))
+        return record_forced_move(fen, move, reply, counter)
+
+    with acquire_engine() as engine:
+        with tracing.span("engine search", track=f"engine {engine.pid}", engine=engine.pid, depth=depth) as search:
+            result = engine.analyse(fen, depth=depth, timeout=timeout, on_info=on_info)
+            search.set(nodes=result.get("nodes"), stopped=result.get("stopped", False))
+    return record_engine_search(fen, result, use_cache, counter)
+
+def _off_loop(fn, *args):
+    """Run ``fn`` on the loop's default executor, keeping the trace context."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+
+async def search_position_async(fen, depth, acquire_engine, timeout=None, use_cache=True, counter=None, use_book=True, on_info=None):
+    """``search_position`` for the asyncio engine layer.
+
+    ``acquire_engine`` returns an async context manager yielding an
+    ``AsyncUciEngine`` (``AsyncEnginePool.engine`` or
+    ``AsyncEngineLease.engine``). The lookups and the cache store can
+    block (SQLite, tablebase files), so they run in worker threads and the
+    loop keeps reading every other engine's output meanwhile.
+    """
+    with tracing.span("lookup") as lookup:
+        known = await _off_loop(lookup_position, fen, depth, use_cache, counter, use_book)
+        lookup.set(source=known["source"] if known is not None else None)
+    if known is not None:
+        return known
+
+    move = forced_move(chess.Board(fen))
+    if move is not None and depth > 1:
+        reply_fen = forced_reply_fen(fen, move)
+        with tracing.span("forced move", move=move.uci()):
+            reply = await search_position_async(reply_fen, depth - 1, acquire_engine, timeout, use_cache, counter, use_book, forced_info(fen, move, on_info))
+        return record_forced_move(fen, move, reply, counter)
+
+    async with acquire_engine() as engine:
+        with tracing.span("engine search", track=f"engine {engine.pid}", engine=engine.pid, depth=depth) as search:
+            result = await engine.analyse(fen, depth=depth, timeout=timeout, on_info=on_info)
+            search.set(nodes=result.get("nodes"), stopped=result.get("stopped", False))
+    return await _off_loop(record_engine_search, fen, result, use_cache, counter)
@@ -0,0 +1,150 @@
+"""
+Syzygy endgame tablebase probing.
+
+Positions with few enough pieces are answered from the tablebase files in
+SYZYGY_PATH (WDL for the result, DTZ to pick a move that makes progress)
+instead of being searched; the same directory is handed to the engines as
+``SyzygyPath`` so they probe it inside their own searches too.
+
+Scores are from the side to move, like ``UciEngine.go()``. Tablebase wins
+are reported as centipawns just below ``TB_WIN_CP`` (the closer to a
+pawn move or capture, the higher), the way Stockfish reports them; wins
+spoilt by the fifty-move rule ("cursed") count as draws.
+"""
+
+import os
+import sys
+import threading
+import chess
+import chess.syzygy
+
+DEFAULT_SYZYGY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache", "syzygy")
+
+TB_WIN_CP = 20000
+
+# Centipawn scores at least this large are tablebase wins, ours or an
+# engine's: Stockfish reports them as TB_WIN_CP less the plies to reach the table
+TB_WIN_MIN_CP = TB_WIN_CP - 1000
+
+class Tablebase:
+    """Thread-safe wrapper around ``chess.syzygy.Tablebase`` for one or more directories"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tables = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            if directory:
+                self._tables.add_directory(directory)
+        self.max_pieces = self._largest_table()
+        if self.max_pieces == 0:
+            self.close()
+            raise ValueError(f"No Syzygy tables found in {path}")
+
+    def _largest_table(self):
+        # Table names list the pieces of both sides, e.g. "KRvK"
+        names = list(self._tables.wdl) + list(self._tables.dtz)
+        return max((len(name) - 1 for name in names), default=0)
+
+    def covers(self, board):
+        return (
+            chess.popcount(board.occupied) <= self.max_pieces
+            and not board.castling_rights
+            and not board.is_game_over()
+        )
+
+    def _probe(self, board):
+        """(wdl, dtz) for the side to move, with wins past the fifty-move rule counted as draws"""
+        wdl = self._tables.probe_wdl(board)
+        dtz = self._tables.probe_dtz(board)
+        if wdl != 0 and abs(dtz) + board.halfmove_clock > 100:
+            wdl = wdl // 2
+        return wdl, dtz
+
+    def probe(self, board, depth):
+        """Exact result for a covered position; returns a ``UciEngine.go()``-shaped result or None"""
+        if not self.covers(board):
+            return None
+        try:
+            with self._lock:
+                wdl, dtz = self._probe(board)
+                best_move, mate = self._best_move(board)
+        except (KeyError, ValueError, chess.syzygy.MissingTableError):
+            return None
+
+        if mate:
+            score_type, score = "mate", 1
+        elif wdl == 2:
+            score_type, score = "cp", TB_WIN_CP - abs(dtz)
+        elif wdl == -2:
+            score_type, score = "cp", -TB_WIN_CP + abs(dtz)
+        else:
+            score_type, score = "cp", 0
+        return {
+            "best_move": best_move.uci() if best_move else None,
+            "ponder": None,
+            "score_type": score_type,
+            "score_value": score,
+            "depth": depth,
+            "seldepth": depth,
+            "nodes": 0,
+            "nps": 0,
+            "time_ms": 0,
+            "pv": [best_move.uci()] if best_move else [],
+            "tablebase": {"wdl": wdl, "dtz": dtz}
+        }
+
+    def _best_move(self, board):
+        """Move keeping the best result: mate first, then the fastest conversion when winning
+        and the slowest when losing. Returns (move, gives_mate)."""
+        best = None
+        best_rank = None
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    return move, True
+                if board.is_game_over():
+                    rank = (0, 0)
+                else:
+                    child_wdl, child_dtz = self._probe(board)
+                    wdl = -child_wdl
+                    # Plies until the fifty-move counter resets; a pawn move or capture resets it now
+                    plies = 0 if zeroing else abs(child_dtz)
+                    rank = (wdl, -plies if wdl > 0 else plies)
+            finally:
+                board.pop()
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best, False
+
+    def close(self):
+        self._tables.close()
+
+def get_syzygy_path():
+    """Tablebase directory from SYZYGY_PATH (or the default location), or None when absent or SYZYGY=0"""
+    if os.environ.get("SYZYGY", "1") == "0":
+        return None
+    path = os.environ.get("SYZYGY_PATH", DEFAULT_SYZYGY_PATH)
+    directories = [directory for directory in path.split(os.pathsep) if os.path.isdir(directory)]
+    return os.pathsep.join(directories) or None
+
+_shared_tablebase = None
+_shared_tablebase_lock = threading.Lock()
+
+def get_shared_tablebase():
+    """Process-wide tablebase, or None when no tables are configured"""
+    global _shared_tablebase
+    path = get_syzygy_path()
+    if path is None:
+        return None
+    with _shared_tablebase_lock:
+        if _shared_tablebase is None:
+            try:
+                _shared_tablebase = Tablebase(path)
+                print(f"SYZYGY: Loaded tables up to {_shared_tablebase.max_pieces} pieces from {path}", file=sys.stderr)
+            except Exception as e:
+                print(f"WARNING: Syzygy tablebases disabled: {e}", file=sys.stderr)
+                _shared_tablebase = False
+        return _shared_tablebase or None
@@ -0,0 +1,153 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Tracing is per request: spans are only recorded while a Trace is active in
+# the current context (see ``activate``). Everywhere else ``span`` is a no-op.
+_current = contextvars.ContextVar("analysis_trace", default=None)
+# Arguments (e.g. the ply) added to every span recorded in this context
+_tags = contextvars.ContextVar("analysis_trace_tags", default={})
+
+# Synthetic thread ids for named tracks (e.g. one per engine), clear of real native ids
+_TRACK_ID_BASE = 1 << 30
+
+class Span:
+    """Open span handed to the ``with`` body so it can add arguments or change track"""
+
+    __slots__ = ("args", "track")
+
+    def __init__(self, args, track):
+        self.args = args
+        self.track = track
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def set_track(self, track):
+        self.track = track
+
+class _NoSpan:
+    def set(self, **args):
+        pass
+
+    def set_track(self, track):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+class Trace:
+    """Spans of one request, exported as Chrome Trace Event JSON.
+
+    Timestamps are wall-clock microseconds so the Node backend can merge
+    them with its own spans on one timeline. Spans land on the thread that
+    recorded them unless a named ``track`` (e.g. "engine 1234") is given,
+    which keeps overlapping work such as asyncio searches on separate rows.
+    """
+
+    def __init__(self, name="request"):
+        self.name = name
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        # tid -> row name shown in the viewer
+        self._threads = {}
+        self._tracks = {}
+
+    def _tid(self, track):
+        with self._lock:
+            if track is None:
+                thread = threading.current_thread()
+                tid = threading.get_native_id()
+                self._threads.setdefault(tid, thread.name)
+                return tid
+            tid = self._tracks.get(track)
+            if tid is None:
+                tid = self._tracks[track] = _TRACK_ID_BASE + len(self._tracks)
+                self._threads[tid] = track
+            return tid
+
+    def add(self, name, start, duration, args=None, track=None, category="analysis"):
+        """Record a complete span; ``start`` is ``time.time()``, ``duration`` in seconds"""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round(start * 1e6, 1),
+            "dur": round(duration * 1e6, 1),
+            "pid": self.pid,
+            "tid": self._tid(track),
+            "args": args or {}
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def events(self):
+        """Recorded spans plus the process/thread name metadata the viewers use for row labels"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": f"analysis server ({self.pid})"}}]
+        metadata.extend(
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        )
+        return metadata + events
+
+def current_trace():
+    return _current.get()
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` the destination of every span recorded in this context"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def tagged(**tags):
+    """Add ``tags`` to the arguments of every span recorded inside the ``with`` body"""
+    if _current.get() is None:
+        yield
+        return
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+@contextmanager
+def span(name, track=None, category="analysis", **args):
+    """Time the ``with`` body as one span of the active trace (no-op when not tracing)"""
+    trace = _current.get()
+    if trace is None:
+        yield _NO_SPAN
+        return
+    current = Span({**_tags.get(), **args}, track)
+    start = time.time()
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        trace.add(name, start, time.perf_counter() - started, current.args, current.track, category)
+
+def submit(executor, fn, *args, **kwargs):
+    """``executor.submit`` that carries the active trace into the worker thread"""
+    if _current.get() is None:
+        return executor.submit(fn, *args, **kwargs)
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def bind(coroutine):
+    """Carry the active trace into a coroutine scheduled on another thread's event loop"""
+    trace = _current.get()
+    if trace is None:
+        return coroutine
+
+    async def traced():
+        with activate(trace):
+            return await coroutine
+
+    return traced()
@@ -0,0 +1,288 @@
+import sys
+import time
+import queue
+import threading
+import subprocess
+
+class UciError(Exception):
+    """Raised when the engine process dies or violates the UCI protocol"""
+
+def parse_info_line(line):
+    """Parse a UCI ``info`` line into a dict (only the fields we use)"""
+    tokens = line.split()
+    info = {}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("depth", "seldepth", "multipv", "nodes", "nps", "time", "hashfull", "tbhits"):
+            try:
+                info[token] = int(tokens[i + 1])
+            except (IndexError, ValueError):
+                pass
+            i += 2
+        elif token == "score":
+            # score cp <x> | score mate <y> [lowerbound|upperbound]
+            try:
+                info["score_type"] = tokens[i + 1]
+                info["score_value"] = int(tokens[i + 2])
+            except (IndexError, ValueError):
+                pass
+            i += 3
+            if i < len(tokens) and tokens[i] in ("lowerbound", "upperbound"):
+                info["bound"] = tokens[i]
+                i += 1
+        elif token == "pv":
+            info["pv"] = tokens[i + 1:]
+            break
+        elif token == "string":
+            # Free-form text runs to the end of the line
+            info["string"] = " ".join(tokens[i + 1:])
+            break
+        else:
+            i += 1
+    return info
+
+def side_to_move(fen):
+    """Return 'w' or 'b' for a FEN string"""
+    parts = fen.split()
+    return parts[1] if len(parts) > 1 else "w"
+
+def white_relative(result, fen):
+    """Convert a side-to-move score from ``go`` into a white-relative {type, value} dict"""
+    sign = 1 if side_to_move(fen) == "w" else -1
+    return {"type": result["score_type"], "value": result["score_value"] * sign}
+
+def go_command(depth=None, nodes=None, movetime=None):
+    """Build a ``go`` command; with no limit the search defaults to depth 10"""
+    command = "go"
+    if depth is not None:
+        command += f" depth {depth}"
+    if nodes is not None:
+        command += f" nodes {nodes}"
+    if movetime is not None:
+        command += f" movetime {movetime}"
+    if command == "go":
+        command += " depth 10"
+    return command
+
+class SearchAccumulator:
+    """Fold the ``info``/``bestmove`` lines of one ``go`` into a result dict.
+
+    Shared by the threaded and asyncio clients so both report searches in
+    the same shape. ``on_info`` receives a snapshot whenever a deeper
+    iteration reports an exact score and PV.
+    """
+
+    def __init__(self, on_info=None):
+        self.on_info = on_info
+        self.stopped = False
+        self._reported_depth = 0
+        self.result = {
+            "best_move": None,
+            "ponder": None,
+            "score_type": "cp",
+            "score_value": 0,
+            "depth": 0,
+            "seldepth": 0,
+            "nodes": 0,
+            "nps": 0,
+            "time_ms": 0,
+            "pv": []
+        }
+
+    def feed(self, line):
+        """Consume one engine line; returns True once ``bestmove`` has arrived"""
+        result = self.result
+        if line.startswith("info "):
+            info = parse_info_line(line)
+            if info.get("multipv", 1) != 1 or "string" in info:
+                return False
+            for key in ("depth", "seldepth", "nodes", "nps"):
+                if key in info:
+                    result[key] = info[key]
+            if "time" in info:
+                result["time_ms"] = info["time"]
+            if "score_type" in info and "bound" not in info:
+                result["score_type"] = info["score_type"]
+                result["score_value"] = info["score_value"]
+            if info.get("pv"):
+                result["pv"] = info["pv"]
+            if self.on_info is not None and info.get("pv") and "bound" not in info and result["depth"] > self._reported_depth:
+                self._reported_depth = result["depth"]
+                snapshot = dict(result)
+                snapshot["best_move"] = result["pv"][0]
+                self.on_info(snapshot)
+        elif line.startswith("bestmove"):
+            tokens = line.split()
+            best_move = tokens[1] if len(tokens) > 1 else None
+            result["best_move"] = None if best_move in (None, "(none)") else best_move
+            if len(tokens) > 3 and tokens[2] == "ponder":
+                result["ponder"] = tokens[3]
+            elif len(result["pv"]) > 1:
+                result["ponder"] = result["pv"][1]
+            result["stopped"] = self.stopped
+            return True
+        return False
+
+class UciEngine:
+    """Minimal UCI client for Stockfish.
+
+    One ``go`` returns best move, ponder move, score, depth/seldepth,
+    nodes, nps and the full principal variation, so callers never need a
+    second search of the same position to get both the move and the score.
+    Output is read on a background thread so every wait can time out.
+    """
+
+    def __init__(self, path, options=None, startup_timeout=10):
+        self.path = path
+        self.name = None
+        self.supported_options = set()
+        self._process = subprocess.Popen(
+            [path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read_output, name=f"uci-reader-{self._process.pid}", daemon=True)
+        self._reader.start()
+
+        self.send("uci")
+        deadline = time.time() + startup_timeout
+        while True:
+            line = self._read_line(max(0, deadline - time.time()))
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+            elif line.startswith("option name "):
+                # option name <Name with spaces> type <t> ...
+                option = line[len("option name "):].split(" type ")[0]
+                self.supported_options.add(option)
+            elif line == "uciok":
+                break
+
+        for name, value in (options or {}).items():
+            self.set_option(name, value)
+        self.is_ready(startup_timeout)
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    def _read_output(self):
+        """Reader thread: forward engine stdout lines to the queue"""
+        try:
+            for line in self._process.stdout:
+                self._lines.put(line.rstrip("\r\n"))
+        except Exception:
+            pass
+        # Sentinel so waiting readers notice the process has gone away
+        self._lines.put(None)
+
+    def _read_line(self, timeout=None):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for engine output")
+        if line is None:
+            self._lines.put(None)
+            raise UciError("Engine process terminated")
+        return line
+
+    def send(self, command):
+        """Send one raw UCI command"""
+        if self._process.poll() is not None:
+            raise UciError("Engine process terminated")
+        try:
+            self._process.stdin.write(command + "\n")
+            self._process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise UciError(f"Failed to write to engine: {e}")
+
+    def set_option(self, name, value):
+        """Set a UCI option; options unknown to this engine build are skipped"""
+        if self.supported_options and name not in self.supported_options:
+            return False
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        self.send(f"setoption name {name} value {value}")
+        return True
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def is_ready(self, timeout=10):
+        """Round-trip ``isready``; raises on timeout or a dead engine"""
+        self.send("isready")
+        deadline = time.time() + timeout
+        while self._read_line(max(0, deadline - time.time())) != "readyok":
+            pass
+        return True
+
+    def new_game(self):
+        """Clear hash and history (``ucinewgame``)"""
+        self.send("ucinewgame")
+        self.is_ready()
+
+    def set_position(self, fen=None, moves=None):
+        """Set the position from a FEN (or the start position) plus optional UCI moves"""
+        command = f"position fen {fen}" if fen else "position startpos"
+        if moves:
+            command += " moves " + " ".join(moves)
+        self.send(command)
+
+    def go(self, depth=None, nodes=None, movetime=None, timeout=None, on_info=None):
+        """Run one search and parse the info stream into a result dict.
+
+        Exactly one limit is normally given; with none the search defaults
+        to depth 10. If ``timeout`` seconds pass the search is stopped and
+        whatever the engine reported so far is returned. ``on_info`` is
+        called with a snapshot of the result each time a deeper iteration
+        reports an exact score and PV.
+        """
+        search = SearchAccumulator(on_info)
+        self.send(go_command(depth, nodes, movetime))
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            try:
+                line = self._read_line(remaining)
+            except TimeoutError:
+                if search.stopped:
+                    raise
+                # Ask the engine to finish; it still answers with bestmove
+                self.stop()
+                search.stopped = True
+                deadline = time.time() + 5
+                continue
+            if search.feed(line):
+                return search.result
+
+    def analyse(self, fen, depth=None, nodes=None, movetime=None, timeout=None, on_info=None):
+        """Search ``fen`` once; adds a white-relative ``evaluation`` to the result (and to each ``on_info`` snapshot)"""
+        self.set_position(fen)
+        if on_info is not None:
+            callback = on_info
+            on_info = lambda snapshot: callback(dict(snapshot, evaluation=white_relative(snapshot, fen)))
+        result = self.go(depth=depth, nodes=nodes, movetime=movetime, timeout=timeout, on_info=on_info)
+        result["evaluation"] = white_relative(result, fen)
+        return result
+
+    def stop(self):
+        self.send("stop")
+
+    def quit(self, timeout=2):
+        """Ask the engine to exit, killing it if it does not"""
+        try:
+            if self.is_alive():
+                self.send("quit")
+                self._process.wait(timeout=timeout)
+        except Exception:
+            pass
+        if self.is_alive():
+            try:
+                self._process.kill()
+                self._process.wait(timeout=timeout)
+            except Exception as e:
+                print(f"WARNING: Failed to kill engine {self.pid}: {e}", file=sys.stderr)
@@ -5,232 +5,51 @@ import time
 import queue
 import multiprocessing
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from stockfish import Stockfish
+import argparse
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import chess
 import chess.pgn
 from io import StringIO
-
-# Dynamic path to stockfish.exe based on script location
-def get_stockfish_path():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    stockfish_path = os.path.join(project_root, "stockfish", "stockfish.exe")
-    
-    # Check if stockfish.exe exists
-    if os.path.exists(stockfish_path):
-        return stockfish_path
-    
-    # Fallback to original hardcoded path
-    fallback_path = "C:\\Users\\ragha\\Desktop\\Chess_0610\\stockfish\\stockfish.exe"
-    if os.path.exists(fallback_path):
-        return fallback_path
-    
-    # Try to find stockfish in common locations
-    common_paths = [
-        os.path.join(project_root, "stockfish", "stockfish"),
-        os.path.join(project_root, "stockfish", "stockfish.exe"),
-        "stockfish",
-        "stockfish.exe"
-    ]
-    
-    for path in common_paths:
-        if os.path.exists(path):
-            return path
-    
-    raise FileNotFoundError("Stockfish executable not found. Please ensure stockfish.exe is in the stockfish directory.")
+from engine_pool import get_stockfish_path, get_shared_pool, close_shared_pool
+from position_search import search_position, search_position_async, settle_position, forced_move, SearchCounter
+from async_engine import get_engine_backend, get_engine_loop, get_shared_async_pool, close_engine_loop
+from worker_placement import plan_placement, PLACEMENT_MODES
+from game_sessions import GameSession, get_session_store, moves_hash
+from game_plies import GamePlies, PlyResults
+from job_journal import JobJournal, truncate_torn_line
+from tablebase import TB_WIN_MIN_CP
+from metrics import ply_logging_enabled, record_search
+import tracing
 
 STOCKFISH_PATH = get_stockfish_path()
 
-def get_optimal_worker_count():
+# Per-engine settings for the shared pool used by this analyzer
+ENGINE_HASH_MB = 512   # Large hash for better performance
+
+def get_optimal_worker_count(placement=None):
     """Determine optimal number of workers based on system resources"""
-    # Use only 1 worker for single-threaded operation
-    return 1
-
-def create_stockfish_instance():
-    """Create a new Stockfish instance with single-threaded configuration"""
-    return Stockfish(
-        STOCKFISH_PATH,
-        parameters={
-            "Threads": 1,                # Use 1 thread for single-threaded operation
-            "Hash": 512,                 # Large hash for better performance
-            "Skill Level": 20,           # Full engine strength
-            "Contempt": 0,               # Neutral evaluation
-            "Move Overhead": 0,          # No move delay
-            "Minimum Thinking Time": 0,  # No minimum thinking time
-            "Ponder": False,             # Disable pondering
-            "MultiPV": 1                # Analyze only the best line
-        }
-    )
+    # One engine per usable core (throughput) or per core group (latency)
+    return plan_placement(placement).workers
+
+def get_engine_pool(max_workers, placement=None):
+    """Shared engine pool sized for this analysis run, pinned per the placement plan"""
+    plan = plan_placement(placement)
+    return get_shared_pool(size=max_workers, hash_mb=ENGINE_HASH_MB, threads=plan.threads, placement=plan)
 
-def analyze_position_worker(fen_data):
+def analyze_position_worker(fen_data, lease, counter=None):
     """Worker function to analyze a single FEN position with ULTRA-FAST performance"""
     fen, move_number, depth, move_played, previous_fen = fen_data
     worker_id = threading.current_thread().name
     
     try:
-        print(f"WORKER {worker_id}: Starting analysis of position {move_number}", file=sys.stderr)
-        
-        stockfish = create_stockfish_instance()
-        
-        # Analyze current position for evaluation
-        stockfish.set_fen_position(fen)
-        stockfish.set_depth(depth)
-        evaluation = stockfish.get_evaluation()
-        
-        # Get best move from PREVIOUS position (if it exists)
-        best_move = None
-        if previous_fen and move_played and move_played != "start":
-            try:
-                # Analyze the previous position to get the best move from there
-                stockfish.set_fen_position(previous_fen)
-                stockfish.set_depth(depth)
-                best_move = stockfish.get_best_move()
-                
-                # Reset back to current position for other evaluations
-                stockfish.set_fen_position(fen)
-            except Exception as best_move_error:
-                print(f"WORKER {worker_id}: Could not get best move from previous position: {best_move_error}", file=sys.stderr)
-                best_move = None
-        else:
-            # For starting position, no previous position exists
-            best_move = None
-        
-        # Process evaluation - convert mate to +1000/-1000 based on color
-        if evaluation['type'] == 'cp':
-            evaluation_raw = evaluation['value']  # Keep raw centipawn values
-        elif evaluation['type'] == 'mate':
-            # Convert mate to +1000 (white mate) or -1000 (black mate)
-            mate_value = evaluation['value']
-            if mate_value > 0:
-                evaluation_raw = 1000  # White has mate
-            else:
-                evaluation_raw = -1000  # Black has mate
-        else:
-            evaluation_raw = 0
-        
-        # Get evaluation of the previous position
-        previous_position_evaluation = None
-        if previous_fen:
-            try:
-                stockfish.set_fen_position(previous_fen)
-                stockfish.set_depth(depth)
-                prev_eval = stockfish.get_evaluation()
-                
-                if prev_eval['type'] == 'cp':
-                    previous_position_evaluation = prev_eval['value']
-                elif prev_eval['type'] == 'mate':
-                    # Convert mate to +1000/-1000 based on color
-                    mate_value = prev_eval['value']
-                    if mate_value > 0:
-                        previous_position_evaluation = 1000  # White has mate
-                    else:
-                        previous_position_evaluation = -1000  # Black has mate
-                else:
-                    previous_position_evaluation = 0
-                    
-                # Reset back to current position for other evaluations
-                stockfish.set_fen_position(fen)
-            except Exception as prev_eval_error:
-                print(f"WORKER {worker_id}: Could not get previous position evaluation: {prev_eval_error}", file=sys.stderr)
-                previous_position_evaluation = None
-        else:
-            # For starting position (move 0), previous evaluation is 0
-            previous_position_evaluation = 0
-        
-        # Get evaluation of the move that was played vs best move (both from previous position)
-        move_played_evaluation = None
-        best_move_evaluation = None
-        
-        if previous_fen and move_played and move_played != "start":
-            try:
-                # Start from the previous position
-                stockfish.set_fen_position(previous_fen)
-                stockfish.set_depth(depth)
-                
-                # Get the best move from the previous position
-                previous_best_move = stockfish.get_best_move()
-                
-                # Evaluate the position after playing the ACTUAL move that was played
-                try:
-                    board = chess.Board(previous_fen)
-                    # Convert SAN move to chess.Move object
-                    if move_played:
-                        # Parse SAN move to get the move object
-                        move_obj = board.parse_san(move_played)
-                        if move_obj in board.legal_moves:
-                            board.push(move_obj)
-                            actual_move_fen = board.fen()
-                            
-                            # Evaluate the position after the actual move
-                            stockfish.set_fen_position(actual_move_fen)
-                            stockfish.set_depth(depth)
-                            
-                            actual_move_eval = stockfish.get_evaluation()
-                            if actual_move_eval['type'] == 'cp':
-                                move_played_evaluation = actual_move_eval['value']
-                            elif actual_move_eval['type'] == 'mate':
-                                # Convert mate to +1000/-1000 based on color
-                                mate_value = actual_move_eval['value']
-                                if mate_value > 0:
-                                    move_played_evaluation = 1000  # White has mate
-                                else:
-                                    move_played_evaluation = -1000  # Black has mate
-                            else:
-                                move_played_evaluation = 0
-                except Exception as actual_move_error:
-                    print(f"WORKER {worker_id}: Could not evaluate actual move: {actual_move_error}", file=sys.stderr)
-                    move_played_evaluation = None
-                
-                # Evaluate the position after playing the BEST move from previous position
-                try:
-                    board = chess.Board(previous_fen)
-                    # Convert UCI move to chess.Move object if needed
-                    if previous_best_move:
-                        move_obj = chess.Move.from_uci(previous_best_move)
-                        if move_obj in board.legal_moves:
-                            board.push(move_obj)
-                            best_move_fen = board.fen()
-                            
-                            # Evaluate the position after the best move
-                            stockfish.set_fen_position(best_move_fen)
-                            stockfish.set_depth(depth)
-                            
-                            best_move_eval = stockfish.get_evaluation()
-                            if best_move_eval['type'] == 'cp':
-                                best_move_evaluation = best_move_eval['value']
-                            elif best_move_eval['type'] == 'mate':
-                                # Convert mate to +1000/-1000 based on color
-                                mate_value = best_move_eval['value']
-                                if mate_value > 0:
-                                    best_move_evaluation = 1000  # White has mate
-                                else:
-                                    best_move_evaluation = -1000  # Black has mate
-                            else:
-                                best_move_evaluation = 0
-                except Exception as best_move_error:
-                    print(f"WORKER {worker_id}: Could not evaluate best move: {best_move_error}", file=sys.stderr)
-                    best_move_evaluation = None
-                    
-            except Exception as eval_error:
-                print(f"WORKER {worker_id}: Could not evaluate moves: {eval_error}", file=sys.stderr)
-                move_played_evaluation = None
-        
-        print(f"WORKER {worker_id}: Completed position {move_number} - Previous eval: {previous_position_evaluation}, Best move from previous: {best_move}, Current eval: {evaluation_raw}, Move played eval: {move_played_evaluation}, Best move eval: {best_move_evaluation}", file=sys.stderr)
+        if ply_logging_enabled():
+            print(f"WORKER {worker_id}: Starting analysis of position {move_number}", file=sys.stderr)
         
-        return {
-            "move_number": move_number,
-            "fen": fen,
-            "best_move": best_move,
-            "evaluation": evaluation_raw,
-            "previous_position_evaluation": previous_position_evaluation,
-            "move_played_evaluation": move_played_evaluation,
-            "best_move_evaluation": best_move_evaluation,
-            "depth": depth,
-            "worker_id": worker_id,
-            "move_played": move_played,
-            "success": True
-        }
+        with tracing.tagged(ply=move_number), tracing.span("analyze ply", depth=depth):
+            return _analyze_position_with_engine(lease.engine, fen, move_number, depth, move_played, previous_fen, worker_id, counter)
     except Exception as e:
         print(f"WORKER {worker_id}: ERROR analyzing position {move_number}: {e}", file=sys.stderr)
         return {
@@ -241,6 +60,80 @@ def analyze_position_worker(fen_data):
             "success": False
         }
 
+def _analyze_position_with_engine(acquire_engine, fen, move_number, depth, move_played, previous_fen, worker_id, counter=None):
+    """Run the per-ply searches on engines borrowed from the game's lease"""
+    # Analyze current position for evaluation
+    evaluation_raw = search_to_raw(search_position(fen, depth, acquire_engine, counter=counter))
+    
+    # Best move and evaluation of the PREVIOUS position come from a single search
+    best_move = None
+    previous_position_evaluation = None
+    if previous_fen:
+        try:
+            previous_search = search_position(previous_fen, depth, acquire_engine, counter=counter)
+            previous_position_evaluation = search_to_raw(previous_search)
+            if move_played and move_played != "start":
+                best_move = previous_search["best_move"]
+        except Exception as prev_eval_error:
+            print(f"WORKER {worker_id}: Could not analyze previous position: {prev_eval_error}", file=sys.stderr)
+    else:
+        # For starting position (move 0), previous evaluation is 0
+        previous_position_evaluation = 0
+    
+    # Get evaluation of the move that was played vs best move (both from previous position)
+    move_played_evaluation = None
+    best_move_evaluation = None
+    
+    if previous_fen and move_played and move_played != "start":
+        # Evaluate the position after playing the ACTUAL move that was played
+        try:
+            board = chess.Board(previous_fen)
+            move_obj = board.parse_san(move_played)
+            if move_obj in board.legal_moves:
+                board.push(move_obj)
+                move_played_evaluation = search_to_raw(search_position(board.fen(), depth, acquire_engine, counter=counter))
+        except Exception as actual_move_error:
+            print(f"WORKER {worker_id}: Could not evaluate actual move: {actual_move_error}", file=sys.stderr)
+            move_played_evaluation = None
+        
+        # Evaluate the position after playing the BEST move from previous position
+        try:
+            board = chess.Board(previous_fen)
+            if best_move:
+                move_obj = chess.Move.from_uci(best_move)
+                if move_obj in board.legal_moves:
+                    board.push(move_obj)
+                    best_move_evaluation = search_to_raw(search_position(board.fen(), depth, acquire_engine, counter=counter))
+        except Exception as best_move_error:
+            print(f"WORKER {worker_id}: Could not evaluate best move: {best_move_error}", file=sys.stderr)
+            best_move_evaluation = None
+    
+    if ply_logging_enabled():
+        print(f"WORKER {worker_id}: Completed position {move_number} - Previous eval: {previous_position_evaluation}, Best move from previous: {best_move}, Current eval: {evaluation_raw}, Move played eval: {move_played_evaluation}, Best move eval: {best_move_evaluation}", file=sys.stderr)
+    
+    return {
+        "move_number": move_number,
+        "fen": fen,
+        "best_move": best_move,
+        "evaluation": evaluation_raw,
+        "previous_position_evaluation": previous_position_evaluation,
+        "move_played_evaluation": move_played_evaluation,
+        "best_move_evaluation": best_move_evaluation,
+        "depth": depth,
+        "worker_id": worker_id,
+        "move_played": move_played,
+        "success": True
+    }
+
+def game_to_fens(game):
+    """Positions of every mainline move of a parsed game, as compact ``GamePlies``"""
+    fens = GamePlies(game.board(), game.mainline_moves())
+    for error in fens.errors:
+        print(f"WARNING: {error}", file=sys.stderr)
+    if len(fens) == 1:
+        raise ValueError("No valid moves found in PGN")
+    return fens
+
 def parse_pgn_to_fens(pgn_string):
     """Parse PGN string and extract FEN positions for each move"""
     try:
@@ -250,123 +143,856 @@ def parse_pgn_to_fens(pgn_string):
         if not game:
             raise ValueError("Invalid PGN format - no game found")
         
-        # Create chess board to track positions
-        board = game.board()
-        fens = []
-        
-        # Add starting position
-        fens.append({
-            "fen": board.fen(),
-            "move_number": 0,
-            "move": "start",
-            "move_played": None,
-            "previous_fen": None
-        })
+        fens = game_to_fens(game)
+        print(f"Successfully parsed {len(fens) - 1} moves from PGN", file=sys.stderr)
+        return fens
         
-        # Process each move
-        move_number = 1
-        moves_processed = 0
-        for move in game.mainline_moves():
+    except Exception as e:
+        raise ValueError(f"Failed to parse PGN: {str(e)}")
+
+def list_pgn_files(paths):
+    """Expand files and directories (searched recursively) into a sorted list of PGN files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pgn"))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"PGN path not found: {path}")
+    return sorted(files)
+
+def iter_pgn_games(paths):
+    """Stream games from PGN files one at a time.
+
+    Yields ``(game_index, source, headers, fens)``. Only the game being
+    parsed is held in memory, so files of any size can be read. Games
+    without any playable move are skipped with a warning.
+    """
+    game_index = 0
+    for source in list_pgn_files(paths):
+        with open(source, encoding="utf-8", errors="replace") as handle:
+            while True:
+                game = chess.pgn.read_game(handle)
+                if game is None:
+                    break
+                try:
+                    fens = game_to_fens(game)
+                except ValueError as e:
+                    print(f"WARNING: Skipping game {game_index} in {source}: {e}", file=sys.stderr)
+                    game_index += 1
+                    continue
+                yield game_index, source, dict(game.headers), fens
+                game_index += 1
+
+def first_plies(fens):
+    """Ply at which each position first occurs (used to tag trace spans)"""
+    plies = {}
+    for fen_info in fens:
+        plies.setdefault(fen_info["key"], fen_info["move_number"])
+    return plies
+
+def plan_unique_positions(fens, seen=None):
+    """Collapse the positions of a game to one FEN per Zobrist key.
+
+    Keys already in ``seen`` (positions planned for other games) are left
+    out. Returns {key: fen} in first-seen order.
+    """
+    unique = {}
+    for fen_info in fens:
+        key = fen_info["key"]
+        if key not in unique and (seen is None or key not in seen):
+            unique[key] = fen_info["fen"]
+    return unique
+
+def dedup_ratio(positions, searches):
+    """Positions needed per position actually searched (1.0 = no duplicates)"""
+    return round(positions / searches, 2) if searches else 0
+
+def to_raw_evaluation(centipawns, mate):
+    """Convert a white-relative cp/mate score to the raw value the frontend expects"""
+    if mate is not None:
+        # Convert mate to +1000 (white mate) or -1000 (black mate)
+        return 1000 if mate > 0 else -1000
+    if centipawns is not None:
+        # A tablebase win is as certain as a mate: keep it on the mate scale
+        if abs(centipawns) >= TB_WIN_MIN_CP:
+            return 1000 if centipawns > 0 else -1000
+        return centipawns
+    return 0
+
+def search_to_raw(search):
+    """Raw frontend evaluation for a UciEngine.analyse() result"""
+    evaluation = search["evaluation"]
+    if evaluation["type"] == "mate":
+        if evaluation["value"] == 0:
+            # Mated on the board: the result says who won
+            return 1000 if search.get("result") == "1-0" else -1000
+        return to_raw_evaluation(None, evaluation["value"])
+    return to_raw_evaluation(evaluation["value"], None)
+
+def search_position_worker(fen, depth, lease, counter=None, ply=None, draw=None):
+    """Search one distinct position once, returning its evaluation and best move.
+
+    Positions the rules decide (or drawn by the game's history, ``draw``)
+    are answered without the engine.
+    """
+    worker_id = threading.current_thread().name
+    settled = settle_position(fen, depth, counter, draw) if draw else None
+    if settled is not None:
+        return worker_search_result(fen, settled, worker_id)
+    
+    # One search (or cache hit) yields the score, the best move and the principal variation
+    with tracing.tagged(ply=ply), tracing.span("search position", depth=depth):
+        search = search_position(fen, depth, lease.engine, counter=counter)
+    return worker_search_result(fen, search, worker_id)
+
+async def search_position_worker_async(fen, depth, lease, counter=None, ply=None):
+    """``search_position_worker`` on an ``AsyncEngineLease``"""
+    # Every async search runs on the engine loop thread, so the engine that
+    # searched the position identifies the worker (lookups keep the loop's name)
+    worker_id = threading.current_thread().name
+    
+    @asynccontextmanager
+    async def acquire_engine():
+        nonlocal worker_id
+        async with lease.engine() as engine:
+            worker_id = f"engine-{engine.pid}"
+            yield engine
+    
+    # Searches overlap on the loop thread, so only the per-engine spans are recorded
+    with tracing.tagged(ply=ply):
+        search = await search_position_async(fen, depth, acquire_engine, counter=counter)
+    return worker_search_result(fen, search, worker_id)
+
+def worker_search_result(fen, search, worker_id):
+    # Only positions the rules decide may lack a move (checkmate, stalemate, claimable draws)
+    if not search["best_move"] and not search.get("terminal"):
+        raise RuntimeError(f"Engine returned no move for position: {fen}")
+    return {
+        "evaluation": search_to_raw(search),
+        "best_move": search["best_move"],
+        "pv": search["pv"],
+        "depth": search["depth"],
+        "opening": search.get("opening"),
+        "terminal": search.get("terminal"),
+        "worker_id": worker_id
+    }
+
+def build_ply_result(fen_info, current, previous, depth):
+    """Derive one ply's result from the searches of its position and the previous one.
+
+    The previous position's search gives ``best_move`` and
+    ``previous_position_evaluation``; the current position's search is the
+    evaluation after the played move. The evaluation after the best move is
+    the previous position's own score, unless the played move was the best
+    move, in which case it is exactly the current position's score.
+    """
+    move_number = fen_info["move_number"]
+    fen = fen_info["fen"]
+    if current is None or "error" in current:
+        return {
+            "move_number": move_number,
+            "fen": fen,
+            "error": current["error"] if current else "Position was not analyzed",
+            "worker_id": current.get("worker_id") if current else None,
+            "success": False
+        }
+    
+    best_move = None
+    previous_position_evaluation = 0
+    move_played_evaluation = None
+    best_move_evaluation = None
+    
+    if fen_info["previous_key"] is not None:
+        if previous is not None and "error" not in previous:
+            previous_position_evaluation = previous["evaluation"]
+            if fen_info["move_played"]:
+                best_move = previous["best_move"]
+                move_played_evaluation = current["evaluation"]
+                if best_move == fen_info["move"]:
+                    best_move_evaluation = current["evaluation"]
+                else:
+                    best_move_evaluation = previous["evaluation"]
+        else:
+            previous_position_evaluation = None
+    
+    return {
+        "move_number": move_number,
+        "fen": fen,
+        "best_move": best_move,
+        "evaluation": current["evaluation"],
+        "previous_position_evaluation": previous_position_evaluation,
+        "move_played_evaluation": move_played_evaluation,
+        "best_move_evaluation": best_move_evaluation,
+        "depth": current.get("depth", depth),
+        "pv": current["pv"],
+        "opening": current.get("opening"),
+        "terminal": current.get("terminal"),
+        "worker_id": current["worker_id"],
+        "move_played": fen_info["move_played"],
+        "success": True
+    }
+
+class PlyStitcher:
+    """Emit per-ply results in game order as soon as their searches are in.
+
+    A ply is ready once both its position and the previous position have
+    been searched. Each search is kept only until the last ply that needs
+    it has been emitted, so memory is bounded by the searches in flight
+    rather than by the length of the game.
+    """
+
+    def __init__(self, fens, depth, on_result):
+        self.fens = fens
+        self.depth = depth
+        self.on_result = on_result
+        self.next_index = 0
+        self.searches = {}
+        # How many plies still need each position's search
+        self.remaining_uses = {}
+        for fen_info in fens:
+            for key in (fen_info["key"], fen_info["previous_key"]):
+                if key is not None:
+                    self.remaining_uses[key] = self.remaining_uses.get(key, 0) + 1
+
+    def _release(self, key):
+        self.remaining_uses[key] -= 1
+        if self.remaining_uses[key] == 0:
+            del self.remaining_uses[key]
+            self.searches.pop(key, None)
+
+    def add(self, key, search):
+        """Record one position's search and emit every ply it unblocks"""
+        if key in self.remaining_uses:
+            self.searches[key] = search
+        while self.next_index < len(self.fens):
+            fen_info = self.fens[self.next_index]
+            current_key = fen_info["key"]
+            previous_key = fen_info["previous_key"]
+            if current_key not in self.searches or (previous_key is not None and previous_key not in self.searches):
+                break
+            previous = self.searches[previous_key] if previous_key is not None else None
+            with tracing.span("emit ply", ply=fen_info["move_number"]):
+                self.on_result(build_ply_result(fen_info, self.searches[current_key], previous, self.depth))
+            self._release(current_key)
+            if previous_key is not None:
+                self._release(previous_key)
+            self.next_index += 1
+
+# Anytime mode: a quick first pass, then refinement to the requested depth
+ANYTIME_FIRST_DEPTH = 6
+
+def anytime_depths(depth):
+    """Depth schedule for progressive deepening, ending at ``depth``"""
+    if depth <= ANYTIME_FIRST_DEPTH:
+        return [depth]
+    # Every pass searches each position again (on the engine that searched it
+    # before, see ``EngineQueues``), so there is no intermediate pass
+    return [ANYTIME_FIRST_DEPTH, depth]
+
+def split_known_searches(unique_fens, known_searches, counter, source="session"):
+    """Separate positions a previous session (or an interrupted run's journal) already searched from those still to search"""
+    known = {}
+    to_search = {}
+    for key, fen in unique_fens.items():
+        search = known_searches.get(key) if known_searches else None
+        if search is not None and "error" not in search:
+            counter.count(source)
+            record_search(source)
+            known[key] = search
+        else:
+            to_search[key] = fen
+    return known, to_search
+
+def split_rule_positions(fens, to_search, depth, counter):
+    """Take the positions python-chess alone can answer out of ``to_search``.
+
+    Returns ``(settled, forced)``: searches for positions the rules decide
+    (mate, stalemate, dead positions, fifty moves, repetition), and
+    {reply key: [(key, move)]} for positions whose only legal move leads
+    to the next ply, which are answered from that ply's search.
+    """
+    settled = {}
+    forced = {}
+    reply_of = {}
+    for index, fen_info in enumerate(fens):
+        key = fen_info["key"]
+        if key not in to_search:
+            continue
+        search = settle_position(fen_info["fen"], depth, counter, fen_info.get("draw"))
+        if search is not None:
+            settled[key] = worker_search_result(fen_info["fen"], search, "rules")
+            del to_search[key]
+            continue
+        move = forced_move(chess.Board(fen_info["fen"])) if index + 1 < len(fens) else None
+        if move is None:
+            continue
+        reply_key = fens[index + 1]["key"]
+        # Forced moves that repeat a position would wait on each other: keep one searched
+        chain = reply_key
+        while chain in reply_of:
+            chain = reply_of[chain]
+        if chain == key:
+            continue
+        reply_of[key] = reply_key
+        forced.setdefault(reply_key, []).append((key, move))
+        del to_search[key]
+        # The next ply is searched anyway, so this position costs nothing
+        counter.count("forced")
+        counter.count("forced_shared")
+        record_search("forced")
+    return settled, forced
+
+def forced_search(move, reply):
+    """Search of a position with a single legal ``move`` from the search of the position it leads to"""
+    if "error" in reply:
+        return reply
+    # Evaluations are white-relative, so the score carries over unchanged
+    return dict(reply, best_move=move.uci(), pv=[move.uci()] + list(reply["pv"]), opening=None, terminal=None)
+
+def add_pass_search(stitcher, forced, key, search, searches_out=None):
+    """Hand a search to the stitcher, with the forced positions it answers"""
+    if searches_out is not None:
+        searches_out[key] = search
+    stitcher.add(key, search)
+    for forced_key, move in forced.get(key, ()):
+        add_pass_search(stitcher, forced, forced_key, forced_search(move, search), searches_out)
+
+def pass_depths(depth, depth_schedule, to_search):
+    depths = depth_schedule or [depth]
+    if not to_search:
+        # Nothing left to refine
+        depths = depths[-1:]
+    return depths
+
+def pass_emitter(on_result, depths, pass_index):
+    """Tag results with ``pass``/``final`` when more than one pass runs"""
+    if len(depths) == 1:
+        return on_result
+    final = pass_index == len(depths) - 1
+    return lambda result: on_result(dict(result, **{"pass": pass_index, "final": final}))
+
+# Game-order schedule: blocks per worker (more blocks balance better, fewer keep the hash warmer)
+GAME_ORDER_BLOCKS_PER_WORKER = 2
+
+def plan_ply_blocks(positions, workers, blocks_per_worker=GAME_ORDER_BLOCKS_PER_WORKER):
+    """Split ``positions`` (in game order) into contiguous blocks whose sizes differ by at most one"""
+    if not positions:
+        return []
+    count = max(1, min(len(positions), workers * blocks_per_worker))
+    size, extra = divmod(len(positions), count)
+    blocks = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        blocks.append(positions[start:end])
+        start = end
+    return blocks
+
+class PinnedEngine:
+    """Lease-like view of one engine, so a run of searches shares its hash"""
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    @contextmanager
+    def engine(self):
+        yield self._engine
+
+def search_blocks_worker(blocks, depth, lease, counter, plies, report):
+    """Take blocks of consecutive plies off ``blocks`` and search each on one engine, last ply first.
+
+    No ``ucinewgame`` is sent inside a block, so the trees searched for
+    later positions are in the hash when the earlier ones are searched.
+    ``report`` receives a (key, search) tuple per position; a crashed
+    engine fails only the position it was on and the block continues on
+    a replacement.
+    """
+    worker_id = threading.current_thread().name
+    while True:
+        try:
+            block = blocks.popleft()
+        except IndexError:
+            return
+        remaining = deque(reversed(block))
+        with tracing.span("search block", first_ply=plies[block[0][0]], last_ply=plies[block[-1][0]], positions=len(block)):
+            while remaining:
+                try:
+                    with lease.engine() as engine:
+                        pinned = PinnedEngine(engine)
+                        while remaining:
+                            key, fen = remaining[0]
+                            report((key, search_position_worker(fen, depth, pinned, counter, plies[key])))
+                            remaining.popleft()
+                except Exception as e:
+                    key, _ = remaining.popleft()
+                    print(f"WORKER {worker_id}: ERROR searching position {key}: {e}", file=sys.stderr)
+                    report((key, {"error": str(e)}))
+
+class EngineQueues:
+    """Positions of a pass queued for the engine that searched them in the previous pass.
+
+    ``owners`` maps a position key to the pid of that engine. An engine
+    takes its own positions first (its hash still holds their trees), then
+    unowned ones, then steals from the engine with the most left, so a
+    crashed or slow engine does not hold up the pass.
+    """
+
+    def __init__(self, to_search, owners):
+        self._lock = threading.Lock()
+        self._unowned = deque()
+        self._queues = {}
+        for key, fen in to_search.items():
+            owner = owners.get(key)
+            queue_for = self._unowned if owner is None else self._queues.setdefault(owner, deque())
+            queue_for.append((key, fen))
+
+    def take(self, pid):
+        """Next (key, fen) for engine ``pid``, or None when the pass has nothing left"""
+        with self._lock:
+            own = self._queues.get(pid)
+            if own:
+                return own.popleft()
+            if self._unowned:
+                return self._unowned.popleft()
+            busiest = max(self._queues.values(), key=len, default=None)
+            return busiest.pop() if busiest else None
+
+def search_engine_queue_worker(queues, depth, lease, counter, plies, owners, report):
+    """Search positions from ``queues`` on one leased engine until the pass is done, recording the engine as their owner"""
+    worker_id = threading.current_thread().name
+    while True:
+        position = None
+        try:
+            with lease.engine() as engine:
+                pinned = PinnedEngine(engine)
+                while True:
+                    position = queues.take(engine.pid)
+                    if position is None:
+                        return
+                    key, fen = position
+                    search = search_position_worker(fen, depth, pinned, counter, plies[key])
+                    owners[key] = engine.pid
+                    report((key, search))
+                    position = None
+        except Exception as e:
+            # The crashed engine's positions are taken by the others
+            position = position or queues.take(None)
+            if position is None:
+                return
+            key, _ = position
+            print(f"WORKER {worker_id}: ERROR searching position {key}: {e}", file=sys.stderr)
+            report((key, {"error": str(e)}))
+
+class AsyncPinnedEngine:
+    """``PinnedEngine`` for the asyncio engine layer"""
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    @asynccontextmanager
+    async def engine(self):
+        yield self._engine
+
+async def search_engine_queue_worker_async(queues, depth, lease, counter, plies, owners, report):
+    """``search_engine_queue_worker`` on an ``AsyncEngineLease``"""
+    while True:
+        position = None
+        try:
+            async with lease.engine() as engine:
+                pinned = AsyncPinnedEngine(engine)
+                while True:
+                    position = queues.take(engine.pid)
+                    if position is None:
+                        return
+                    key, fen = position
+                    search = await search_position_worker_async(fen, depth, pinned, counter, plies[key])
+                    owners[key] = engine.pid
+                    report((key, search))
+                    position = None
+        except Exception as e:
+            position = position or queues.take(None)
+            if position is None:
+                return
+            key, _ = position
+            print(f"MASTER: ERROR searching position {key}: {e}", file=sys.stderr)
+            report((key, {"error": str(e)}))
+
+def engine_queue_searches(executor, to_search, depth, lease, counter, plies, workers, owners):
+    """Yield (key, search) as they finish; positions go back to the engine that searched them in the previous pass"""
+    queues = EngineQueues(to_search, owners)
+    finished = queue.Queue()
+    for _ in range(min(workers, len(to_search))):
+        tracing.submit(executor, search_engine_queue_worker, queues, depth, lease, counter, plies, owners, finished.put)
+    for _ in range(len(to_search)):
+        yield finished.get()
+
+def spread_searches(executor, to_search, depth, lease, counter, plies):
+    """Yield (key, search) as they finish; each position is a task for the next free engine"""
+    future_to_key = {
+        tracing.submit(executor, search_position_worker, fen, depth, lease, counter, plies[key]): key
+        for key, fen in to_search.items()
+    }
+    for future in as_completed(future_to_key):
+        key = future_to_key.pop(future)
+        try:
+            search = future.result()
+        except Exception as e:
+            print(f"MASTER: ERROR searching position {key}: {e}", file=sys.stderr)
+            search = {"error": str(e)}
+        yield key, search
+
+def game_order_searches(executor, to_search, depth, lease, counter, plies, workers):
+    """Yield (key, search) as they finish; workers walk contiguous blocks of plies (see ``search_blocks_worker``)"""
+    blocks = deque(plan_ply_blocks(list(to_search.items()), workers))
+    finished = queue.Queue()
+    for _ in range(min(workers, len(blocks))):
+        tracing.submit(executor, search_blocks_worker, blocks, depth, lease, counter, plies, finished.put)
+    for _ in range(len(to_search)):
+        yield finished.get()
+
+def distributed_searches(coordinator, to_search, depth, counter):
+    """Yield (key, search) as remote workers finish them (see distributed.py)"""
+    keys = list(to_search)
+    futures = coordinator.submit_many([to_search[key] for key in keys], depth, counter)
+    future_to_key = dict(zip(futures, keys))
+    for future in as_completed(future_to_key):
+        key = future_to_key.pop(future)
+        try:
+            search = future.result()
+        except Exception as e:
+            print(f"MASTER: ERROR searching position {key}: {e}", file=sys.stderr)
+            search = {"error": str(e)}
+        yield key, search
+
+def run_single_pass_analysis(fens, depth, max_workers, counter, on_result, placement=None, known_searches=None, searches_out=None, depth_schedule=None, schedule="spread", journal=None):
+    """Search each distinct position exactly once, emitting per-ply results in game order.
+
+    Positions found in ``known_searches`` (a previous session of the same
+    game) are not searched again. When ``searches_out`` is a dict it
+    receives every search the game used, keyed by position.
+
+    ``depth_schedule`` (e.g. [6, 18]) runs progressive passes over the
+    same leased engines: every pass emits all plies, tagged with ``pass``
+    and ``final``, and later passes start from the hash the earlier ones
+    left behind.
+
+    ``schedule`` "spread" hands each position to whichever engine is free;
+    "game_order" gives each worker balanced contiguous blocks of plies on
+    one engine, searched last ply first so the hash stays warm (with a
+    ``depth_schedule``, "spread" refines each position on the engine that
+    searched it in the previous pass);
+    "distributed" sends the positions to the worker hosts of the shared
+    coordinator (see distributed.py) instead of local engines.
+
+    With a ``journal`` (see job_journal.py) the searches it holds from an
+    interrupted run are reused and every new final-depth search is
+    journaled as soon as it finishes.
+    """
+    unique_fens = plan_unique_positions(fens)
+    known, to_search = split_known_searches(unique_fens, known_searches, counter)
+    if journal is not None:
+        resumed, to_search = split_known_searches(to_search, journal.searches, counter, "journal")
+        known.update(resumed)
+    settled, forced = split_rule_positions(fens, to_search, depth, counter)
+    known.update(settled)
+    depths = pass_depths(depth, depth_schedule, to_search)
+    plies = first_plies(fens)
+    
+    coordinator = None
+    if schedule == "distributed":
+        from distributed import get_shared_coordinator
+        coordinator = get_shared_coordinator(required=True)
+        engines = nullcontext()
+    else:
+        engines = get_engine_pool(max_workers, placement).lease(max_workers)
+    # Position key -> pid of the engine that searched it (multi-pass spread schedule)
+    owners = {}
+    with engines as lease, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for pass_index, pass_depth in enumerate(depths):
+            final = pass_index == len(depths) - 1
+            stitcher = PlyStitcher(fens, pass_depth, pass_emitter(on_result, depths, pass_index))
+            for key, search in known.items():
+                add_pass_search(stitcher, forced, key, search, searches_out if final else None)
+            
+            start_time = time.time()
+            print(f"MASTER: Submitting {len(to_search)} distinct positions to {max_workers} workers (depth {pass_depth}, {schedule} schedule)", file=sys.stderr)
+            with tracing.span("pass", depth=pass_depth, positions=len(to_search)):
+                if schedule == "game_order":
+                    searches = game_order_searches(executor, to_search, pass_depth, lease, counter, plies, max_workers)
+                elif schedule == "distributed":
+                    searches = distributed_searches(coordinator, to_search, pass_depth, counter)
+                elif len(depths) > 1:
+                    searches = engine_queue_searches(executor, to_search, pass_depth, lease, counter, plies, max_workers, owners)
+                else:
+                    searches = spread_searches(executor, to_search, pass_depth, lease, counter, plies)
+                
+                completed = 0
+                for key, search in searches:
+                    if final and journal is not None:
+                        journal.record_search(key, search)
+                    add_pass_search(stitcher, forced, key, search, searches_out if final else None)
+                    completed += 1
+                    if ply_logging_enabled() and (completed % 5 == 0 or completed == len(to_search)):
+                        elapsed = time.time() - start_time
+                        rate = completed / elapsed if elapsed > 0 else 0
+                        print(f"MASTER: Progress update - {completed}/{len(to_search)} searches completed at depth {pass_depth} ({rate:.1f} pos/sec)", file=sys.stderr)
+    
+    return len(unique_fens)
+
+async def run_single_pass_analysis_async(fens, depth, max_workers, counter, on_result, placement=None, known_searches=None, searches_out=None, depth_schedule=None, journal=None):
+    """``run_single_pass_analysis`` on the asyncio engine pool.
+
+    Every distinct position becomes a task on the engine loop; the game's
+    engine lease bounds how many search at once, so no thread is held per
+    engine. Cancelling the coroutine cancels the outstanding searches
+    (their engines are stopped and drained before being reused).
+    """
+    unique_fens = plan_unique_positions(fens)
+    known, to_search = split_known_searches(unique_fens, known_searches, counter)
+    if journal is not None:
+        resumed, to_search = split_known_searches(to_search, journal.searches, counter, "journal")
+        known.update(resumed)
+    settled, forced = split_rule_positions(fens, to_search, depth, counter)
+    known.update(settled)
+    depths = pass_depths(depth, depth_schedule, to_search)
+    plies = first_plies(fens)
+    
+    plan = plan_placement(placement)
+    pool = get_shared_async_pool(size=max_workers, hash_mb=ENGINE_HASH_MB, threads=plan.threads, placement=plan)
+    
+    # Position key -> pid of the engine that searched it (multi-pass runs)
+    owners = {}
+    async with pool.lease(max_workers) as lease:
+        async def search_one(key, fen, pass_depth):
             try:
-                # Store the previous position's FEN
-                previous_fen = board.fen()
-                # Get the move in SAN notation before making it
-                move_san = board.san(move)
-                board.push(move)
-                fens.append({
-                    "fen": board.fen(),
-                    "move_number": move_number,
-                    "move": str(move),
-                    "move_played": move_san,
-                    "previous_fen": previous_fen
-                })
-                move_number += 1
-                moves_processed += 1
-            except Exception as move_error:
-                print(f"WARNING: Failed to process move {move_number}: {move_error}", file=sys.stderr)
-                # Continue with next move instead of failing completely
-                continue
+                return key, await search_position_worker_async(fen, pass_depth, lease, counter, plies[key])
+            except Exception as e:
+                print(f"MASTER: ERROR searching position {key}: {e}", file=sys.stderr)
+                return key, {"error": str(e)}
         
-        if moves_processed == 0:
-            raise ValueError("No valid moves found in PGN")
+        for pass_index, pass_depth in enumerate(depths):
+            final = pass_index == len(depths) - 1
+            stitcher = PlyStitcher(fens, pass_depth, pass_emitter(on_result, depths, pass_index))
+            for key, search in known.items():
+                add_pass_search(stitcher, forced, key, search, searches_out if final else None)
+            
+            start_time = time.time()
+            print(f"MASTER: Scheduling {len(to_search)} distinct positions on {max_workers} async engines (depth {pass_depth})", file=sys.stderr)
+            with tracing.span("pass", depth=pass_depth, positions=len(to_search)):
+                if len(depths) > 1:
+                    # Refine each position on the engine that searched it in the previous pass
+                    queues = EngineQueues(to_search, owners)
+                    finished = asyncio.Queue()
+                    tasks = [
+                        asyncio.ensure_future(search_engine_queue_worker_async(queues, pass_depth, lease, counter, plies, owners, finished.put_nowait))
+                        for _ in range(min(max_workers, len(to_search)))
+                    ]
+                    next_searches = (finished.get() for _ in range(len(to_search)))
+                else:
+                    tasks = [
+                        asyncio.ensure_future(search_one(key, fen, pass_depth))
+                        for key, fen in to_search.items()
+                    ]
+                    next_searches = asyncio.as_completed(tasks)
+                try:
+                    completed = 0
+                    for next_done in next_searches:
+                        key, search = await next_done
+                        if final and journal is not None:
+                            journal.record_search(key, search)
+                        add_pass_search(stitcher, forced, key, search, searches_out if final else None)
+                        completed += 1
+                        if ply_logging_enabled() and (completed % 5 == 0 or completed == len(to_search)):
+                            elapsed = time.time() - start_time
+                            rate = completed / elapsed if elapsed > 0 else 0
+                            print(f"MASTER: Progress update - {completed}/{len(to_search)} searches completed at depth {pass_depth} ({rate:.1f} pos/sec)", file=sys.stderr)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    return len(unique_fens)
+
+def run_per_ply_analysis(fens, depth, max_workers, counter, on_result, placement=None):
+    """Legacy mode: every ply re-searches its own and its neighbouring positions.
+
+    Results are emitted in completion order, not game order.
+    """
+    # Prepare data for workers
+    analysis_data = [
+        (fen_info["fen"], fen_info["move_number"], depth, fen_info["move_played"], fen_info["previous_fen"])
+        for fen_info in fens
+    ]
+    
+    # Use ThreadPoolExecutor for parallel analysis
+    start_time = time.time()
+    
+    # Engines are booted once per worker and reused for every ply of the game
+    pool = get_engine_pool(max_workers, placement)
+    with pool.lease(max_workers) as lease, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        print(f"MASTER: Submitting {len(analysis_data)} analysis tasks to {max_workers} workers", file=sys.stderr)
         
-        print(f"Successfully parsed {moves_processed} moves from PGN", file=sys.stderr)
-        return fens
+        # Submit all analysis tasks
+        future_to_move = {}
+        for i, data in enumerate(analysis_data):
+            future = tracing.submit(executor, analyze_position_worker, data, lease, counter)
+            future_to_move[future] = data[1]
+            if ply_logging_enabled():
+                print(f"MASTER: Submitted task {i+1}/{len(analysis_data)} for position {data[1]}", file=sys.stderr)
         
-    except Exception as e:
-        raise ValueError(f"Failed to parse PGN: {str(e)}")
+        print(f"MASTER: All tasks submitted, waiting for completion...", file=sys.stderr)
+        
+        # Collect results as they complete
+        completed = 0
+        for future in as_completed(future_to_move):
+            move_number = future_to_move.pop(future)
+            try:
+                result = future.result()
+                on_result(result)
+                completed += 1
+                
+                worker_id = result.get('worker_id', 'Unknown')
+                if ply_logging_enabled():
+                    print(f"MASTER: Worker {worker_id} completed position {move_number} ({completed}/{len(fens)})", file=sys.stderr)
+                
+                if ply_logging_enabled() and (completed % 5 == 0 or completed == len(fens)):
+                    elapsed = time.time() - start_time
+                    rate = completed / elapsed if elapsed > 0 else 0
+                    print(f"MASTER: Progress update - {completed}/{len(fens)} analyses completed ({rate:.1f} pos/sec)", file=sys.stderr)
+                    
+            except Exception as e:
+                print(f"MASTER: ERROR analyzing move {move_number}: {e}", file=sys.stderr)
+                on_result({
+                    "move_number": move_number,
+                    "error": str(e),
+                    "success": False
+                })
+
+def analyze_pgn_ultra_fast(pgn_string, depth=10, max_workers=None, mode="single_pass", on_result=None, placement=None, session_id=None, anytime=False, engine_backend=None, job_id=None, resume=False):
+    """Analyze entire PGN game using ULTRA-FAST multi-worker analysis
 
-def analyze_pgn_ultra_fast(pgn_string, depth=10, max_workers=None):
-    """Analyze entire PGN game using ULTRA-FAST multi-worker analysis"""
+    ``mode`` is "single_pass" (search every distinct position once and stitch
+    the per-ply fields together), "game_order" (single pass, but each worker
+    searches contiguous blocks of plies backwards on one engine so its hash
+    carries over from ply to ply), "distributed" (single pass on the worker
+    hosts of the coordinator at DISTRIBUTED_LISTEN, see distributed.py) or
+    "per_ply" (legacy neighbour re-searches).
+    When ``on_result`` is given every ply result is passed to it as soon as
+    it is ready and nothing is retained; the returned summary then has an
+    empty ``results`` dict and ``streamed`` set. ``placement`` picks the
+    engine layout ("throughput" or "latency", see worker_placement.py).
+
+    In single-pass mode every analyzed game is kept as a session keyed by
+    a hash of its move list (returned as ``session_id``). Passing that id
+    back with an extended or edited game reuses the session's searches, so
+    only positions after the first changed move reach the engine.
+
+    With ``anytime`` a quick low-depth pass over every ply is emitted first
+    and then refined to ``depth`` (see ``anytime_depths``); each ply result
+    carries the depth it reached. Only single-pass mode supports this.
+
+    ``engine_backend`` ("threads" or "asyncio", default ENGINE_BACKEND)
+    picks how single-pass searches are driven; "asyncio" runs them on the
+    shared engine loop (see async_engine.py).
+
+    With a ``job_id`` every finished search is journaled (see
+    job_journal.py); running the same game again with ``resume`` after a
+    crash only searches what the journal does not hold yet. Single-pass
+    modes only.
+    """
+    journal = None
     try:
         # Parse PGN to get FEN positions
         print(f"ULTRA-FAST PGN Analysis Starting...", file=sys.stderr)
-        fens = parse_pgn_to_fens(pgn_string)
+        with tracing.span("parse pgn", characters=len(pgn_string)) as parse:
+            fens = parse_pgn_to_fens(pgn_string)
+            parse.set(positions=len(fens))
         print(f"Found {len(fens)} positions to analyze", file=sys.stderr)
         
         # Determine optimal worker count
-        if max_workers is None:
-            max_workers = get_optimal_worker_count()
+        if mode == "distributed":
+            from distributed import get_shared_coordinator
+            # Reported as workers_used: the engines the connected workers offer (fails fast with none)
+            max_workers = max_workers or get_shared_coordinator(required=True).require_workers()
+        elif max_workers is None:
+            max_workers = get_optimal_worker_count(placement)
         
-        print(f"Using {max_workers} single-threaded worker", file=sys.stderr)
+        # Per-ply, game-order and distributed scheduling drive blocking worker threads
+        backend = get_engine_backend(engine_backend) if mode not in ("per_ply", "game_order", "distributed") else "threads"
+        print(f"Using {max_workers} workers ({mode} mode, {backend} engines)", file=sys.stderr)
         
-        # Prepare data for workers
-        analysis_data = [
-            (fen_info["fen"], fen_info["move_number"], depth, fen_info["move_played"], fen_info["previous_fen"])
-            for fen_info in fens
-        ]
+        if job_id is not None:
+            if mode == "per_ply":
+                raise ValueError("Job journals need a single-pass mode (per_ply searches plies, not positions)")
+            game = moves_hash(fens.start_fen, fens.uci_moves())
+            journal = JobJournal(job_id, {"kind": "pgn", "depth": depth, "game": game}, resume=resume)
         
-        # Use ThreadPoolExecutor for parallel analysis
         results = {}
-        start_time = time.time()
+        worker_stats = {}
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            print(f"MASTER: Submitting {len(analysis_data)} analysis tasks to {max_workers} workers", file=sys.stderr)
-            
-            # Submit all analysis tasks
-            future_to_move = {}
-            for i, data in enumerate(analysis_data):
-                future = executor.submit(analyze_position_worker, data)
-                future_to_move[future] = data[1]
-                print(f"MASTER: Submitted task {i+1}/{len(analysis_data)} for position {data[1]}", file=sys.stderr)
-            
-            print(f"MASTER: All tasks submitted, waiting for completion...", file=sys.stderr)
-            
-            # Collect results as they complete
-            completed = 0
-            for future in as_completed(future_to_move):
-                move_number = future_to_move[future]
-                try:
-                    result = future.result()
-                    results[move_number] = result
-                    completed += 1
-                    
-                    worker_id = result.get('worker_id', 'Unknown')
-                    print(f"MASTER: Worker {worker_id} completed position {move_number} ({completed}/{len(fens)})", file=sys.stderr)
-                    
-                    if completed % 5 == 0 or completed == len(fens):
-                        elapsed = time.time() - start_time
-                        rate = completed / elapsed if elapsed > 0 else 0
-                        print(f"MASTER: Progress update - {completed}/{len(fens)} analyses completed ({rate:.1f} pos/sec)", file=sys.stderr)
-                        
-                except Exception as e:
-                    print(f"MASTER: ERROR analyzing move {move_number}: {e}", file=sys.stderr)
-                    results[move_number] = {
-                        "move_number": move_number,
-                        "error": str(e),
-                        "success": False
-                    }
+        def collect(result):
+            # Anytime passes re-emit every ply; only the final pass counts towards worker stats
+            if result.get("final", True):
+                worker_id = result.get('worker_id', 'Unknown')
+                worker_stats[worker_id] = worker_stats.get(worker_id, 0) + 1
+            if on_result is not None:
+                on_result(result)
+            else:
+                results[result["move_number"]] = result
+        
+        start_time = time.time()
+        counter = SearchCounter()
+        new_session_id = None
+        divergence_ply = None
+        if mode == "per_ply":
+            run_per_ply_analysis(fens, depth, max_workers, counter, collect, placement)
+            unique_positions = len(fens)
+        else:
+            store = get_session_store()
+            start_fen = fens.start_fen
+            moves = fens.uci_moves()
+            known_searches = None
+            searches = None
+            if store is not None:
+                new_session_id = moves_hash(start_fen, moves)
+                # An unchanged game matches its own hash even without a session id
+                session = store.get(session_id) if session_id else None
+                session = session or store.get(new_session_id)
+                if session is not None and session.depth >= depth:
+                    known_searches = session.searches
+                    divergence_ply = session.divergence(start_fen, moves)
+                    change = f"first change at ply {divergence_ply}" if divergence_ply is not None else "no changes"
+                    print(f"SESSION: Reusing session {session.session_id} ({change})", file=sys.stderr)
+                searches = {}
+            single_pass_kwargs = {
+                "known_searches": known_searches,
+                "searches_out": searches,
+                "depth_schedule": anytime_depths(depth) if anytime else None,
+                "journal": journal
+            }
+            if backend == "asyncio":
+                unique_positions = get_engine_loop().run(run_single_pass_analysis_async(
+                    fens, depth, max_workers, counter, collect, placement, **single_pass_kwargs
+                ))
+            else:
+                unique_positions = run_single_pass_analysis(
+                    fens, depth, max_workers, counter, collect, placement,
+                    schedule=mode if mode in ("game_order", "distributed") else "spread", **single_pass_kwargs
+                )
+            if store is not None:
+                with tracing.span("session store"):
+                    store.put(GameSession(new_session_id, start_fen, moves, depth, searches))
         
         end_time = time.time()
         analysis_time = end_time - start_time
         
         # Sort results by move number
         sorted_results = {}
-        worker_stats = {}
         for move_num in sorted(results.keys()):
             sorted_results[str(move_num)] = results[move_num]
-            worker_id = results[move_num].get('worker_id', 'Unknown')
-            worker_stats[worker_id] = worker_stats.get(worker_id, 0) + 1
         
         print(f"ULTRA-FAST Analysis Complete!", file=sys.stderr)
         print(f"Total time: {analysis_time:.2f} seconds", file=sys.stderr)
@@ -375,15 +1001,39 @@ def analyze_pgn_ultra_fast(pgn_string, depth=10, max_workers=None):
         for worker_id, count in worker_stats.items():
             print(f"  {worker_id}: {count} positions", file=sys.stderr)
         
-        return {
+        summary = {
             "success": True,
             "total_positions": len(fens),
             "analysis_time": round(analysis_time, 2),
             "workers_used": max_workers,
             "depth": depth,
             "positions_per_second": round(len(fens)/analysis_time, 1),
+            "mode": mode,
+            "engine_backend": backend,
+            "anytime": bool(anytime) and mode != "per_ply",
+            "unique_positions": unique_positions,
+            "dedup_ratio": dedup_ratio(len(fens), unique_positions),
+            "engine_searches": counter.get("engine"),
+            "engine_nodes": counter.get("engine_nodes"),
+            "cache_hits": counter.get("cache"),
+            "book_hits": counter.get("book"),
+            "tablebase_hits": counter.get("tablebase"),
+            "rules_hits": counter.get("rules"),
+            "forced_hits": counter.get("forced"),
+            "searches_avoided": counter.get("rules") + counter.get("forced_shared"),
+            "session_hits": counter.get("session"),
+            "session_id": new_session_id,
+            "divergence_ply": divergence_ply,
+            "journal_hits": counter.get("journal"),
+            "job_id": job_id,
+            "streamed": on_result is not None,
             "results": sorted_results
         }
+        if journal is not None:
+            # The game's distinct searches stay, so rerunning the finished job needs no engine
+            with tracing.span("compact journal"):
+                journal.compact(summary={name: value for name, value in summary.items() if name != "results"})
+        return summary
         
     except Exception as e:
         return {
@@ -396,6 +1046,309 @@ def analyze_pgn_ultra_fast(pgn_string, depth=10, max_workers=None):
             "positions_per_second": 0,
             "results": {}
         }
+    finally:
+        if journal is not None:
+            journal.close()
+
+class CorpusGame:
+    """One in-flight game of a corpus run: collects its plies until all are in"""
+
+    def __init__(self, game_index, source, headers, fens, depth):
+        self.game_index = game_index
+        self.source = source
+        self.headers = headers
+        self.total_positions = len(fens)
+        self.results = PlyResults(fens)
+        self.start_time = time.time()
+        self.stitcher = PlyStitcher(fens, depth, self.results.set)
+        self.pending = 0
+
+    def is_complete(self):
+        return self.pending == 0 and len(self.results) == self.total_positions
+
+    def position_keys(self):
+        return self.results.plies.keys
+
+    def to_record(self):
+        return {
+            "game_index": self.game_index,
+            "source": self.source,
+            "headers": self.headers,
+            "total_positions": self.total_positions,
+            "analysis_time": round(time.time() - self.start_time, 2),
+            "results": self.results.records()
+        }
+
+# Finished searches remembered for later games of a corpus run (LRU)
+DEDUP_RECENT_POSITIONS = 50000
+
+# Journal lines after which a corpus run drops the searches of finished games from its journal
+DEFAULT_JOURNAL_COMPACT_LINES = 100000
+
+class PositionPlanner:
+    """Corpus-wide deduplication of positions by Zobrist key.
+
+    Every position is searched once no matter how many games (or plies)
+    reach it, by any move order: games needing a position that is already
+    being searched wait for that search, and recently finished searches
+    are fanned straight out to new games. Counts positions needed vs.
+    searches submitted for the dedup ratio.
+    """
+
+    def __init__(self, max_recent=DEDUP_RECENT_POSITIONS):
+        self.max_recent = max_recent
+        self.waiters = {}
+        self.recent = OrderedDict()
+        self.positions = 0
+        self.searches = 0
+
+    def plan(self, game, fens):
+        """Register a game; returns ([(key, fen)] to search, [(key, search)] already known)"""
+        self.positions += len(fens)
+        to_search = []
+        ready = []
+        for key, fen in plan_unique_positions(fens).items():
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                ready.append((key, self.recent[key]))
+            elif key in self.waiters:
+                self.waiters[key].append(game)
+                game.pending += 1
+            else:
+                self.waiters[key] = [game]
+                game.pending += 1
+                to_search.append((key, fen))
+        self.searches += len(to_search)
+        return to_search, ready
+
+    def complete(self, key, search):
+        """Record a finished search; returns the games waiting for it"""
+        if "error" not in search and self.max_recent > 0:
+            self.recent[key] = search
+            if len(self.recent) > self.max_recent:
+                self.recent.popitem(last=False)
+        return self.waiters.pop(key, [])
+
+    def stats(self):
+        return {
+            "positions": self.positions,
+            "unique_positions": self.searches,
+            "dedup_ratio": dedup_ratio(self.positions, self.searches)
+        }
+
+def analyze_corpus(paths, depth=10, max_workers=None, output=None, on_game=None, max_games_in_flight=None, report_interval=10, placement=None, job_id=None, resume=False, distributed=False):
+    """Analyze every game of one or more PGN files (or directories of them).
+
+    Games are streamed from disk and only ``max_games_in_flight`` are held
+    at once; the distinct positions of all in-flight games share the same
+    engine workers, so one game's tail overlaps the next game's opening.
+    Positions shared between games (openings, transpositions) are searched
+    once and fanned out to every game that reaches them.
+    Each finished game is written to ``output`` (a file object) as one
+    NDJSON record and/or passed to ``on_game``, then dropped from memory.
+
+    With a ``job_id`` finished searches and games are journaled (see
+    job_journal.py). After a crash, the same call with ``resume`` skips
+    the games already written out and reuses the journaled searches of
+    the games that were in flight; pass an ``output`` opened for append.
+    A game written out just before the crash, but not yet journaled, is
+    written again.
+
+    With ``distributed`` the positions are searched by the worker hosts of
+    the shared coordinator (see distributed.py); the number of games in
+    flight then follows the engines currently connected unless
+    ``max_games_in_flight`` is given.
+    """
+    coordinator = None
+    if distributed:
+        from distributed import get_shared_coordinator
+        coordinator = get_shared_coordinator(required=True)
+        max_workers = max_workers or coordinator.require_workers()
+    elif max_workers is None:
+        max_workers = get_optimal_worker_count(placement)
+    
+    def games_limit():
+        if max_games_in_flight is not None:
+            return max_games_in_flight
+        return max(2, (coordinator.slots() if coordinator is not None else max_workers) * 2)
+    
+    games = iter_pgn_games(paths)
+    counter = SearchCounter()
+    planner = PositionPlanner()
+    in_flight = {}
+    future_to_position = {}
+    games_done = 0
+    games_resumed = 0
+    positions_done = 0
+    exhausted = False
+    start_time = time.time()
+    last_report = start_time
+    journal = None
+    if job_id is not None:
+        journal = JobJournal(job_id, {"kind": "corpus", "depth": depth, "paths": list(paths)}, resume=resume)
+    compact_lines = int(os.environ.get("JOB_JOURNAL_COMPACT_LINES", DEFAULT_JOURNAL_COMPACT_LINES))
+    
+    print(f"CORPUS: Analyzing {', '.join(paths)} at depth {depth} with {max_workers} workers", file=sys.stderr)
+    
+    def finish(game):
+        nonlocal games_done, positions_done
+        del in_flight[game.game_index]
+        record = game.to_record()
+        if output is not None:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+        if on_game is not None:
+            on_game(record)
+        if journal is not None:
+            journal.record_game(game.game_index)
+        games_done += 1
+        positions_done += game.total_positions
+    
+    def complete(key, search):
+        # Fan the result out to every game that reached this position
+        for game in planner.complete(key, search):
+            game.pending -= 1
+            game.stitcher.add(key, search)
+            if game.is_complete():
+                finish(game)
+    
+    engines = nullcontext() if coordinator is not None else get_engine_pool(max_workers, placement).lease(max_workers)
+    try:
+        with engines as lease, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                # Admit new games while there is room
+                while not exhausted and len(in_flight) < games_limit():
+                    try:
+                        game_index, source, headers, fens = next(games)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if journal is not None and game_index in journal.games:
+                        games_resumed += 1
+                        continue
+                    game = CorpusGame(game_index, source, headers, fens, depth)
+                    in_flight[game_index] = game
+                    to_search, ready = planner.plan(game, fens)
+                    for key, search in ready:
+                        game.stitcher.add(key, search)
+                    draws = {fens.keys[ply]: draw for ply, draw in fens.draws.items()}
+                    remote = []
+                    for key, fen in to_search:
+                        resumed = journal.searches.pop(key, None) if journal is not None else None
+                        if resumed is not None:
+                            counter.count("journal")
+                            record_search("journal")
+                            complete(key, resumed)
+                        elif coordinator is not None:
+                            remote.append((key, fen))
+                        else:
+                            future = executor.submit(search_position_worker, fen, depth, lease, counter, None, draws.get(key))
+                            future_to_position[future] = key
+                    if remote:
+                        # One batch per game, so work units hold consecutive plies
+                        futures = coordinator.submit_many([fen for _, fen in remote], depth, counter, [draws.get(key) for key, _ in remote])
+                        future_to_position.update((future, key) for future, (key, _) in zip(futures, remote))
+                    if game_index in in_flight and game.is_complete():
+                        finish(game)
+                
+                if not future_to_position:
+                    break
+                
+                done, _ = wait(future_to_position, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = future_to_position.pop(future)
+                    try:
+                        search = future.result()
+                    except Exception as e:
+                        print(f"CORPUS: ERROR searching position {key:016x}: {e}", file=sys.stderr)
+                        search = {"error": str(e)}
+                    if journal is not None:
+                        journal.record_search(key, search)
+                    complete(key, search)
+                
+                if journal is not None and journal.lines >= compact_lines:
+                    # Only the in-flight games (and those the resumed journal still has searches for) need their searches
+                    keep = {key for game in in_flight.values() for key in game.position_keys()}
+                    keep.update(journal.searches)
+                    journal.compact(keep)
+                
+                now = time.time()
+                if now - last_report >= report_interval:
+                    last_report = now
+                    elapsed = now - start_time
+                    print(f"CORPUS: {games_done} games, {positions_done} positions ({games_done/elapsed:.2f} games/sec, {positions_done/elapsed:.1f} pos/sec, "
+                          f"dedup {planner.stats()['dedup_ratio']}x)", file=sys.stderr)
+    except BaseException:
+        if journal is not None:
+            journal.close()
+        raise
+    
+    analysis_time = time.time() - start_time
+    dedup = planner.stats()
+    summary = {
+        "success": True,
+        "games": games_done,
+        "total_positions": positions_done,
+        "analysis_time": round(analysis_time, 2),
+        "workers_used": max_workers,
+        "depth": depth,
+        "games_per_second": round(games_done / analysis_time, 2) if analysis_time > 0 else 0,
+        "positions_per_second": round(positions_done / analysis_time, 1) if analysis_time > 0 else 0,
+        "unique_positions": dedup["unique_positions"],
+        "dedup_ratio": dedup["dedup_ratio"],
+        "engine_searches": counter.get("engine"),
+        "cache_hits": counter.get("cache"),
+        "book_hits": counter.get("book"),
+        "tablebase_hits": counter.get("tablebase"),
+        "rules_hits": counter.get("rules"),
+        "forced_hits": counter.get("forced"),
+        "searches_avoided": counter.get("rules") + counter.get("forced_shared"),
+        "journal_hits": counter.get("journal"),
+        "games_resumed": games_resumed,
+        "job_id": job_id
+    }
+    if journal is not None:
+        # Every game is written out: only the list of finished games is worth keeping
+        journal.compact(keep=set(), summary=summary)
+        journal.close()
+    print(f"CORPUS: Complete - {games_done} games, {positions_done} positions in {analysis_time:.2f}s "
+          f"({summary['games_per_second']} games/sec, {summary['positions_per_second']} pos/sec, "
+          f"{dedup['unique_positions']} unique, dedup {dedup['dedup_ratio']}x)", file=sys.stderr)
+    return summary
+
+def corpus_main(argv):
+    """CLI: analyze a PGN corpus and write one NDJSON record per game"""
+    parser = argparse.ArgumentParser(prog="ultra_fast_pgn_analyzer.py corpus", description="Analyze every game in PGN files or directories")
+    parser.add_argument("paths", nargs="+", help="PGN files or directories containing .pgn files")
+    parser.add_argument("--output", "-o", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--depth", type=int, default=10, help="Search depth per position")
+    parser.add_argument("--workers", type=int, default=None, help="Number of engine workers")
+    parser.add_argument("--max-games-in-flight", type=int, default=None, help="Games held in memory at once")
+    parser.add_argument("--placement", choices=PLACEMENT_MODES, default=None,
+                        help="throughput: many 1-thread engines; latency: few multi-thread engines")
+    parser.add_argument("--job", default=None, help="Journal progress under this job id so the run can be resumed")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted --job run (appends to --output)")
+    args = parser.parse_args(argv)
+    if args.resume and not args.job:
+        parser.error("--resume needs --job")
+    kwargs = {
+        "max_games_in_flight": args.max_games_in_flight,
+        "placement": args.placement,
+        "job_id": args.job,
+        "resume": args.resume
+    }
+    
+    try:
+        if args.output:
+            if args.resume and os.path.exists(args.output):
+                truncate_torn_line(args.output)
+            with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+                summary = analyze_corpus(args.paths, args.depth, args.workers, output=output, **kwargs)
+        else:
+            summary = analyze_corpus(args.paths, args.depth, args.workers, output=sys.stdout, **kwargs)
+        print(json.dumps(summary), file=sys.stderr)
+    finally:
+        close_shared_pool()
 
 def main():
     try:
@@ -411,6 +1364,12 @@ def main():
         pgn_string = data["pgn"]
         depth = data.get("depth", 10)
         max_workers = data.get("max_workers", None)
+        mode = data.get("mode", "single_pass")
+        stream = data.get("stream", False)
+        placement = data.get("placement")
+        engine_backend = data.get("engine_backend")
+        job_id = data.get("job_id")
+        resume = data.get("resume", False)
         
         print(f"Starting ULTRA-FAST PGN analysis with depth {depth}", file=sys.stderr)
         print(f"PGN length: {len(pgn_string)} characters", file=sys.stderr)
@@ -420,14 +1379,31 @@ def main():
         if not os.path.exists(STOCKFISH_PATH):
             raise FileNotFoundError(f"Stockfish not found at: {STOCKFISH_PATH}")
         
+        if stream:
+            # Newline-delimited JSON: one {"type": "ply"} record per ply as it
+            # completes, then a single {"type": "summary"} record
+            def emit_ply(ply_result):
+                print(json.dumps({"type": "ply", "result": ply_result}))
+                sys.stdout.flush()
+            
+            result = analyze_pgn_ultra_fast(pgn_string, depth, max_workers, mode, on_result=emit_ply, placement=placement, engine_backend=engine_backend, job_id=job_id, resume=resume)
+            result["type"] = "summary"
+            print(json.dumps(result))
+            sys.stdout.flush()
+            close_shared_pool()
+            close_engine_loop()
+            return
+        
         # Analyze the PGN game
-        result = analyze_pgn_ultra_fast(pgn_string, depth, max_workers)
+        result = analyze_pgn_ultra_fast(pgn_string, depth, max_workers, mode, placement=placement, engine_backend=engine_backend, job_id=job_id, resume=resume)
         
         print(f"Analysis completed, sending results...", file=sys.stderr)
         
         # Output JSON result to Node.js
         print(json.dumps(result))
         sys.stdout.flush()
+        close_shared_pool()
+        close_engine_loop()
         
     except Exception as e:
         print(f"ERROR: Error in main(): {str(e)}", file=sys.stderr)
@@ -449,4 +1425,7 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "corpus":
+        corpus_main(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,156 @@
+"""
+Columnar binary encoding of PGN analysis results (frame kind 1).
+
+Instead of one JSON object per ply that repeats every key (and the FEN),
+a game's plies are sent as typed columns. Strings (played moves in SAN,
+worker ids, openings, terminal reasons, errors) are dictionary-encoded;
+FENs are left out and can be rebuilt from the start FEN and the played
+moves. Layout, little-endian:
+
+    magic "CCOL" | version u16 | reserved u16 | meta length u32 |
+    meta (UTF-8 JSON, space-padded to 4 bytes) | columns (each 4-byte aligned)
+
+``meta`` is the message without its ply results (e.g. {"id", "ok",
+"result": {summary...}}) plus "columns": {"plies", "start_fen",
+"dictionary", "layout": [[name, type, offset, count], ...]}; offsets are
+relative to the first column. Evaluations are int32 with ``NULL_I32``
+for "none", moves are packed into 16 bits as in opening_book.py, and
+dictionary references are uint16 with ``NULL_U16`` for "none".
+"""
+
+import sys
+import json
+import struct
+from array import array
+import chess
+from opening_book import encode_move, decode_move, NO_MOVE
+
+COLUMNS_MAGIC = b"CCOL"
+COLUMNS_VERSION = 1
+COLUMNS_HEADER = struct.Struct("<4sHHI")
+
+NULL_I32 = -(1 << 31)
+NULL_U16 = 0xFFFF
+
+TYPE_CODES = {"i32": "i", "u16": "H", "u8": "B"}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+EVALUATION_COLUMNS = ("evaluation", "previous_position_evaluation", "move_played_evaluation", "best_move_evaluation")
+STRING_COLUMNS = ("move_played", "worker_id", "opening", "terminal", "error")
+
+def _ordered_plies(results):
+    """Ply dicts in game order from a {move_number: ply} dict or a list"""
+    if isinstance(results, dict):
+        return [ply for _, ply in sorted(results.items(), key=lambda item: int(item[0]))]
+    return sorted(results, key=lambda ply: ply["move_number"])
+
+def _packed_move(uci):
+    move = chess.Move.from_uci(uci) if uci else None
+    return encode_move(move) if move else NO_MOVE
+
+def encode_columns(message, key="result"):
+    """Encode ``message`` (whose ``message[key]`` holds a "results" collection) as a columnar payload"""
+    body = dict(message[key])
+    plies = _ordered_plies(body.pop("results"))
+    dictionary = []
+    dictionary_index = {}
+
+    def reference(value):
+        if value is None:
+            return NULL_U16
+        index = dictionary_index.get(value)
+        if index is None:
+            index = dictionary_index[value] = len(dictionary)
+            dictionary.append(value)
+        return index
+
+    columns = {
+        "move_number": array("i", (ply["move_number"] for ply in plies)),
+        "success": array("B", (1 if ply.get("success") else 0 for ply in plies)),
+        "depth": array("H", ((ply.get("depth") or 0) for ply in plies)),
+        "best_move": array("H", (_packed_move(ply.get("best_move")) for ply in plies))
+    }
+    for name in EVALUATION_COLUMNS:
+        columns[name] = array("i", (NULL_I32 if ply.get(name) is None else ply[name] for ply in plies))
+    for name in STRING_COLUMNS:
+        columns[name] = array("H", (reference(ply.get(name)) for ply in plies))
+    pvs = [[_packed_move(move) for move in ply.get("pv") or []] for ply in plies]
+    columns["pv_length"] = array("H", (len(pv) for pv in pvs))
+    columns["pv"] = array("H", (move for pv in pvs for move in pv))
+
+    layout = []
+    blobs = []
+    offset = 0
+    for name, values in columns.items():
+        if sys.byteorder != "little":
+            values.byteswap()
+        blob = values.tobytes()
+        blob += b"\0" * (-len(blob) % 4)
+        layout.append([name, TYPE_NAMES[values.typecode], offset, len(values)])
+        blobs.append(blob)
+        offset += len(blob)
+
+    message = dict(message)
+    message[key] = body
+    message["columns"] = {
+        "plies": len(plies),
+        "start_fen": plies[0]["fen"] if plies and plies[0].get("fen") else None,
+        "dictionary": dictionary,
+        "layout": layout
+    }
+    meta = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    meta += b" " * (-len(meta) % 4)
+    return COLUMNS_HEADER.pack(COLUMNS_MAGIC, COLUMNS_VERSION, 0, len(meta)) + meta + b"".join(blobs)
+
+def decode_columns(payload, key="result"):
+    """Inverse of ``encode_columns``: the message with ``message[key]["results"]`` rebuilt as ply dicts (without FENs)"""
+    magic, version, _, meta_length = COLUMNS_HEADER.unpack_from(payload, 0)
+    if magic != COLUMNS_MAGIC or version != COLUMNS_VERSION:
+        raise ValueError(f"Not a columnar payload (version {COLUMNS_VERSION})")
+    start = COLUMNS_HEADER.size
+    message = json.loads(payload[start:start + meta_length].decode("utf-8"))
+    base = start + meta_length
+    described = message.pop("columns")
+    dictionary = described["dictionary"]
+    columns = {}
+    for name, type_name, offset, count in described["layout"]:
+        values = array(TYPE_CODES[type_name])
+        values.frombytes(payload[base + offset:base + offset + count * values.itemsize])
+        if sys.byteorder != "little":
+            values.byteswap()
+        columns[name] = values
+
+    def text(name, i):
+        index = columns[name][i]
+        return None if index == NULL_U16 else dictionary[index]
+
+    plies = []
+    pv_start = 0
+    for i in range(described["plies"]):
+        pv_end = pv_start + columns["pv_length"][i]
+        pv = columns["pv"][pv_start:pv_end]
+        pv_start = pv_end
+        if not columns["success"][i]:
+            plies.append({
+                "move_number": columns["move_number"][i],
+                "error": text("error", i),
+                "worker_id": text("worker_id", i),
+                "success": False
+            })
+            continue
+        best_move = decode_move(columns["best_move"][i])
+        ply = {"move_number": columns["move_number"][i], "best_move": best_move.uci() if best_move else None}
+        for name in EVALUATION_COLUMNS:
+            ply[name] = None if columns[name][i] == NULL_I32 else columns[name][i]
+        ply.update({
+            "depth": columns["depth"][i],
+            "pv": [decode_move(move).uci() for move in pv],
+            "opening": text("opening", i),
+            "terminal": text("terminal", i),
+            "worker_id": text("worker_id", i),
+            "move_played": text("move_played", i),
+            "success": True
+        })
+        plies.append(ply)
+    message[key] = dict(message[key], results=plies)
+    return message
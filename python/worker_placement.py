@@ -0,0 +1,189 @@
+import os
+import sys
+import glob
+import math
+import threading
+
+# Placement modes:
+#   throughput - many single-threaded engines, one position per core
+#   latency    - few multi-threaded engines, each position searched faster
+PLACEMENT_MODES = ("throughput", "latency")
+DEFAULT_PLACEMENT = "throughput"
+
+# Threads per engine in latency mode (Stockfish scales well up to about here)
+LATENCY_THREADS_PER_ENGINE = 8
+
+def parse_cpu_list(text):
+    """Parse a kernel CPU list such as "0-3,8,10-11" into a list of ints"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def available_cpus():
+    """CPUs this process may run on (respects taskset/cpuset affinity)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def _read_first_line(path):
+    try:
+        with open(path) as handle:
+            return handle.readline().strip()
+    except OSError:
+        return None
+
+def cgroup_cpu_limit(root="/sys/fs/cgroup"):
+    """CPU quota imposed by the container's cgroup, in cores, or None if unlimited"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    line = _read_first_line(os.path.join(root, "cpu.max"))
+    if line:
+        quota, _, period = line.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota of -1 means unlimited
+    quota = _read_first_line(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read_first_line(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+def numa_nodes(cpus=None):
+    """Map NUMA node id -> usable CPUs on that node (a single node when unknown)"""
+    cpus = available_cpus() if cpus is None else cpus
+    allowed = set(cpus)
+    nodes = {}
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        node_id = int(os.path.basename(os.path.dirname(path))[len("node"):])
+        line = _read_first_line(path)
+        node_cpus = [cpu for cpu in parse_cpu_list(line or "") if cpu in allowed]
+        if node_cpus:
+            nodes[node_id] = node_cpus
+    if not nodes:
+        nodes[0] = list(cpus)
+    return nodes
+
+def usable_core_count():
+    """Cores we can actually keep busy: affinity mask capped by the cgroup quota"""
+    count = len(available_cpus())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, max(1, int(math.floor(limit))))
+    return max(1, count)
+
+class Placement:
+    """How many engines to run, how many threads each, and which CPUs each one gets"""
+
+    def __init__(self, mode, workers, threads, cpu_sets):
+        self.mode = mode
+        self.workers = workers
+        self.threads = threads
+        self.cpu_sets = cpu_sets
+
+    def cpus_for_slot(self, slot):
+        """CPU set for the engine in pool slot ``slot`` (wraps if the pool outgrows the plan)"""
+        if not self.cpu_sets:
+            return None
+        return self.cpu_sets[slot % len(self.cpu_sets)]
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "threads": self.threads,
+            "cpu_sets": self.cpu_sets
+        }
+
+def _assign_cpu_sets(nodes, usable, threads):
+    """Split ``usable`` CPUs into engine-sized groups, keeping each group on one NUMA node"""
+    cpu_sets = []
+    remaining = usable
+    for node_cpus in nodes.values():
+        node_cpus = node_cpus[:remaining]
+        remaining -= len(node_cpus)
+        for start in range(0, len(node_cpus) - threads + 1, threads):
+            cpu_sets.append(node_cpus[start:start + threads])
+        if remaining <= 0:
+            break
+    if not cpu_sets:
+        # Engines wider than a NUMA node: fall back to plain consecutive groups
+        cpus = [cpu for node_cpus in nodes.values() for cpu in node_cpus][:usable]
+        cpu_sets = [cpus[start:start + threads] for start in range(0, max(1, len(cpus) - threads + 1), threads)]
+    return cpu_sets
+
+# (mode, max_workers) -> Placement; the machine is probed once per process
+_plans = {}
+_plans_lock = threading.Lock()
+
+def plan_placement(mode=None, max_workers=None):
+    """Choose workers x Threads-per-engine for this machine.
+
+    ``mode`` defaults to the ENGINE_PLACEMENT environment variable
+    ("throughput" unless set). Throughput mode runs one single-threaded
+    engine per usable core; latency mode runs few engines with up to
+    LATENCY_THREADS_PER_ENGINE threads each. Every engine gets its own
+    CPUs, kept within one NUMA node where possible.
+
+    Plans are cached, so sysfs and the cgroup files are only read the
+    first time a mode is planned (``clear_placement_cache`` forgets them).
+    """
+    mode = mode or os.environ.get("ENGINE_PLACEMENT", DEFAULT_PLACEMENT)
+    if mode not in PLACEMENT_MODES:
+        print(f"WARNING: Unknown placement mode {mode!r}, using {DEFAULT_PLACEMENT}", file=sys.stderr)
+        mode = DEFAULT_PLACEMENT
+
+    with _plans_lock:
+        plan = _plans.get((mode, max_workers))
+        if plan is None:
+            plan = _plans[(mode, max_workers)] = _probe_placement(mode, max_workers)
+        return plan
+
+def clear_placement_cache():
+    with _plans_lock:
+        _plans.clear()
+
+def _probe_placement(mode, max_workers):
+    usable = usable_core_count()
+    nodes = numa_nodes()
+    if mode == "latency":
+        largest_node = max(len(node_cpus) for node_cpus in nodes.values())
+        threads = max(1, min(usable, largest_node, LATENCY_THREADS_PER_ENGINE))
+    else:
+        threads = 1
+
+    cpu_sets = _assign_cpu_sets(nodes, usable, threads)
+    workers = len(cpu_sets)
+    if max_workers is not None:
+        workers = max(1, min(workers, max_workers))
+        cpu_sets = cpu_sets[:workers]
+    return Placement(mode, workers, threads, cpu_sets)
+
+def pinning_enabled():
+    """Pinning needs sched_setaffinity (Linux) and can be turned off with ENGINE_PIN=0"""
+    return hasattr(os, "sched_setaffinity") and os.environ.get("ENGINE_PIN", "1") != "0"
+
+def pin_process(pid, cpus):
+    """Restrict every thread of process ``pid`` to ``cpus``; returns True on success"""
+    if not cpus or not pinning_enabled():
+        return False
+    # Stockfish starts its search threads during setoption, so pin each task
+    thread_ids = [int(os.path.basename(path)) for path in glob.glob(f"/proc/{pid}/task/[0-9]*")] or [pid]
+    try:
+        for thread_id in thread_ids:
+            try:
+                os.sched_setaffinity(thread_id, cpus)
+            except ProcessLookupError:
+                # Thread exited between listing and pinning
+                continue
+        return True
+    except OSError as e:
+        print(f"WARNING: Could not pin engine {pid} to CPUs {cpus}: {e}", file=sys.stderr)
+        return False
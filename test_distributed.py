@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Distributed coordinator: worker tokens, work units and work stealing in distributed.py.
+Workers are played by plain sockets speaking the frame protocol.
+Run with pytest or directly: python test_distributed.py
+"""
+
+import os
+import sys
+import json
+import socket
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+from analysis_server import read_frame, write_frame, encode_json, FRAME_JSON
+from distributed import Coordinator, RemoteWorker, Task, Unit, parse_address
+
+class FakeWorker:
+    """A worker connection driven by the test"""
+
+    def __init__(self, coordinator, token=None, slots=1, name="fake"):
+        self.connection = socket.create_connection(parse_address(coordinator.address), timeout=5)
+        self.reader = self.connection.makefile("rb")
+        self.writer = self.connection.makefile("wb")
+        self.send({"type": "hello", "name": name, "slots": slots, "token": token})
+
+    def send(self, message):
+        write_frame(self.writer, FRAME_JSON, encode_json(message))
+
+    def receive(self):
+        frame = read_frame(self.reader)
+        return None if frame is None else json.loads(frame[1].decode("utf-8"))
+
+    def close(self):
+        self.connection.close()
+
+def make_coordinator(token=None, unit_size=8):
+    return Coordinator("127.0.0.1:0", unit_size=unit_size, worker_wait=5, token=token)
+
+def test_worker_with_the_token_is_served():
+    coordinator = make_coordinator(token="s3cret")
+    worker = FakeWorker(coordinator, token="s3cret", slots=2)
+    try:
+        assert coordinator.wait_for_workers(1, timeout=5) == 2
+        worker.send({"type": "ready", "count": 1})
+        futures = coordinator.submit_many(["fen 1", "fen 2"], 12)
+        unit = worker.receive()
+        assert unit["type"] == "unit"
+        assert [task["fen"] for task in unit["tasks"]] == ["fen 1", "fen 2"]
+        for task in unit["tasks"]:
+            worker.send({"type": "result", "task": task["id"], "search": {"fen": task["fen"], "evaluation": 7}, "counts": {}})
+        assert [future.result(timeout=5)["fen"] for future in futures] == ["fen 1", "fen 2"]
+    finally:
+        worker.close()
+        coordinator.close()
+
+def test_wrong_or_missing_token_is_rejected():
+    coordinator = make_coordinator(token="s3cret")
+    try:
+        for token in ("guess", None, ""):
+            worker = FakeWorker(coordinator, token=token)
+            reply = worker.receive()
+            assert reply["type"] == "rejected"
+            # ... and the connection is closed
+            assert worker.receive() is None
+            worker.close()
+        assert coordinator.wait_for_workers(1, timeout=0.2) == 0
+    finally:
+        coordinator.close()
+
+def test_without_a_token_any_worker_joins():
+    coordinator = make_coordinator(token="")
+    worker = FakeWorker(coordinator, token=None)
+    try:
+        assert coordinator.wait_for_workers(1, timeout=5) == 1
+    finally:
+        worker.close()
+        coordinator.close()
+
+def unit_of(coordinator, worker, count):
+    tasks = [Task(coordinator._take_id(), f"fen {i}", 10, None, None) for i in range(count)]
+    unit = Unit(coordinator._take_id(), worker, tasks)
+    worker.units[unit.id] = unit
+    return unit, tasks
+
+def test_steal_splits_the_busiest_unit():
+    coordinator = make_coordinator()
+    try:
+        victim = RemoteWorker(1, "victim", 2, None, None)
+        other = RemoteWorker(2, "other", 1, None, None)
+        thief = RemoteWorker(3, "thief", 1, None, None)
+        coordinator.workers = {1: victim, 2: other, 3: thief}
+        spared, _ = unit_of(coordinator, other, 3)
+        busiest, tasks = unit_of(coordinator, victim, 7)
+        unit_of(coordinator, thief, 9)  # the thief never steals from itself
+
+        sends = []
+        stolen = coordinator._steal(thief, sends)
+        # The front half: the plies the victim, searching last ply first, reaches last
+        assert stolen == tasks[:3]
+        assert list(busiest.remaining.values()) == tasks[3:]
+        assert sends == [(victim, {"type": "cancel", "tasks": [task.id for task in tasks[:3]]})]
+        assert coordinator.steals == 1
+        assert len(spared.remaining) == 3
+    finally:
+        coordinator.workers = {}
+        coordinator.close()
+
+def test_nothing_to_steal_from_single_positions():
+    coordinator = make_coordinator()
+    try:
+        victim = RemoteWorker(1, "victim", 1, None, None)
+        thief = RemoteWorker(2, "thief", 1, None, None)
+        coordinator.workers = {1: victim, 2: thief}
+        unit_of(coordinator, victim, 1)
+        sends = []
+        assert coordinator._steal(thief, sends) is None
+        assert sends == []
+    finally:
+        coordinator.workers = {}
+        coordinator.close()
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} distributed tests passed")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Engine pool checkout/checkin, waiter order and leases, on fake_uci_engine.py.
+Run with pytest or directly: python test_engine_pool.py
+"""
+
+import os
+import sys
+import time
+import threading
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+from engine_pool import EnginePool
+
+FAKE_ENGINE = os.path.join(ROOT, "fake_uci_engine.py")
+
+def make_pool(size):
+    return EnginePool(size=size, hash_mb=16, stockfish_path=FAKE_ENGINE)
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+def test_checkout_reuses_returned_engine():
+    pool = make_pool(2)
+    try:
+        engine = pool.checkout()
+        pid = engine.pid
+        pool.checkin(engine)
+        again = pool.checkout()
+        assert again.pid == pid
+        pool.checkin(again)
+        stats = pool.stats()
+        assert stats["spawned"] == 1
+        assert stats["checkouts"] == 2
+        assert stats["idle"] == 1
+    finally:
+        pool.close()
+
+def test_unhealthy_checkin_discards_engine():
+    pool = make_pool(1)
+    try:
+        engine = pool.checkout()
+        pool.checkin(engine, healthy=False)
+        assert not engine.is_alive()
+        replacement = pool.checkout()
+        assert replacement.pid != engine.pid
+        pool.checkin(replacement)
+        assert pool.stats()["discarded"] == 1
+    finally:
+        pool.close()
+
+def test_dead_engine_is_replaced_at_checkout():
+    pool = make_pool(1)
+    try:
+        engine = pool.checkout()
+        pool.checkin(engine)
+        engine.quit()
+        replacement = pool.checkout()
+        assert replacement.pid != engine.pid
+        assert replacement.is_ready(timeout=5)
+        pool.checkin(replacement)
+    finally:
+        pool.close()
+
+def test_waiters_are_served_in_arrival_order():
+    pool = make_pool(1)
+    try:
+        held = pool.checkout()
+        served = []
+
+        def borrow(name):
+            engine = pool.checkout(timeout=10)
+            served.append(name)
+            time.sleep(0.05)
+            pool.checkin(engine)
+
+        first = threading.Thread(target=borrow, args=("first",))
+        first.start()
+        wait_until(lambda: pool.stats()["waiting"] == 1)
+        second = threading.Thread(target=borrow, args=("second",))
+        second.start()
+        wait_until(lambda: pool.stats()["waiting"] == 2)
+
+        pool.checkin(held)
+        first.join(10)
+        second.join(10)
+        assert served == ["first", "second"]
+    finally:
+        pool.close()
+
+def test_checkout_times_out_when_exhausted():
+    pool = make_pool(1)
+    try:
+        held = pool.checkout()
+        try:
+            pool.checkout(timeout=0.1)
+        except TimeoutError:
+            pass
+        else:
+            raise AssertionError("checkout should time out")
+        assert pool.stats()["waiting"] == 0
+        pool.checkin(held)
+    finally:
+        pool.close()
+
+def test_lease_shares_its_engines_between_threads():
+    pool = make_pool(4)
+    try:
+        pids = set()
+        lock = threading.Lock()
+
+        with pool.lease(2) as lease:
+            def search():
+                with lease.engine() as engine:
+                    result = engine.analyse("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", depth=2)
+                    assert result["best_move"] == "e2e4"
+                    with lock:
+                        pids.add(engine.pid)
+
+            threads = [threading.Thread(target=search) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+            assert len(lease) <= 2
+        assert 1 <= len(pids) <= 2
+        # The lease gave its engines back
+        assert pool.stats()["idle"] == len(pids)
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} engine pool tests passed")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+GamePlies replay and PlyResults round trips, in game_plies.py.
+Run with pytest or directly: python test_game_plies.py
+"""
+
+import os
+import sys
+from io import StringIO
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import chess
+import chess.pgn
+from game_plies import GamePlies, PlyResults, DRAWN_KEY_SALT, position_key
+
+PGN = "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Bxc6 dxc6 5. O-O f6 6. d4 exd4 7. Nxd4 c5 8. Nb3 Qxd1 9. Rxd1 *"
+
+def replay(pgn):
+    game = chess.pgn.read_game(StringIO(pgn))
+    return game, GamePlies(game.board(), game.mainline_moves())
+
+def test_plies_match_a_board_replay():
+    game, plies = replay(PGN)
+    moves = list(game.mainline_moves())
+    assert len(plies) == len(moves) + 1
+    assert plies.uci_moves() == [move.uci() for move in moves]
+    board = chess.Board()
+    assert plies[0]["fen"] == board.fen()
+    assert plies[0]["move"] == "start"
+    for index, move in enumerate(moves, 1):
+        san = board.san(move)
+        board.push(move)
+        ply = plies[index]
+        assert ply["fen"] == board.fen()
+        assert ply["key"] == position_key(board)
+        assert ply["move"] == move.uci()
+        assert ply["move_played"] == san
+
+def test_random_access_matches_sequential():
+    _, plies = replay(PGN)
+    forward = [(ply["fen"], ply["move_played"], ply["previous_fen"]) for ply in plies]
+    for index in (12, 3, 17, 0, 16, 1):
+        ply = plies[index]
+        assert (ply["fen"], ply["move_played"], ply["previous_fen"]) == forward[index]
+    assert plies[-1]["fen"] == forward[-1][0]
+
+def test_repetition_gets_a_salted_key():
+    _, plies = replay("1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 *")
+    assert plies.draws == {8: "threefold repetition"}
+    assert plies[8]["draw"] == "threefold repetition"
+    assert plies[8]["key"] == plies[0]["key"] ^ DRAWN_KEY_SALT
+    assert plies[4]["key"] == plies[0]["key"]
+
+def test_null_move_stops_the_replay():
+    _, plies = replay("1. e4 e5 2. -- Nc6 3. Nf3 *")
+    assert len(plies) == 3
+    assert plies.errors == ["Failed to process move 3: null move"]
+    assert plies.uci_moves() == ["e2e4", "e7e5"]
+    assert plies[2]["move_played"] == "e5"
+
+def test_illegal_move_stops_the_replay():
+    board = chess.Board()
+    plies = GamePlies(board, [chess.Move.from_uci("e2e4"), chess.Move.from_uci("e2e4")])
+    assert len(plies) == 2
+    assert len(plies.errors) == 1
+    assert board.fen() == chess.STARTING_FEN
+
+def test_ply_results_round_trip():
+    _, plies = replay(PGN)
+    results = PlyResults(plies)
+    written = {}
+    for index in (5, 0, 2):
+        written[index] = {
+            "move_number": index,
+            "fen": plies[index]["fen"],
+            "best_move": "e7e5" if index else None,
+            "evaluation": 30 - index,
+            "previous_position_evaluation": 0 if index == 0 else 25,
+            "move_played_evaluation": None if index == 0 else -index,
+            "best_move_evaluation": None if index == 0 else 1000,
+            "depth": 12,
+            "pv": ["e7e5", "g1f3"],
+            "opening": "King's Pawn Game" if index == 2 else None,
+            "terminal": None,
+            "worker_id": f"engine-{index % 2}",
+            "move_played": plies[index]["move_played"],
+            "success": True,
+        }
+        results.set(written[index])
+    results.set({"move_number": 7, "fen": plies[7]["fen"], "error": "engine died", "worker_id": "engine-1", "success": False})
+    assert len(results) == 4
+    records = results.records()
+    assert [record["move_number"] for record in records] == [0, 2, 5, 7]
+    for record in records[:3]:
+        assert record == written[record["move_number"]]
+    assert records[3] == {"move_number": 7, "fen": plies[7]["fen"], "error": "engine died", "worker_id": "engine-1", "success": False}
+
+def test_ply_results_overwrite():
+    _, plies = replay(PGN)
+    results = PlyResults(plies)
+    first = {"move_number": 1, "evaluation": 20, "best_move": "e2e4", "pv": [], "depth": 6, "opening": "x", "worker_id": "a", "success": True}
+    results.set(first)
+    results.set(dict(first, evaluation=35, depth=18, opening=None))
+    assert len(results) == 1
+    record = results.record(1)
+    assert (record["evaluation"], record["depth"], record["opening"]) == (35, 18, None)
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} game ply tests passed")
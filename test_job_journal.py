@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Job journals: resume, torn-line recovery and compaction in job_journal.py.
+Run with pytest or directly: python test_job_journal.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+from job_journal import JobJournal, truncate_torn_line, journal_path
+
+JOB = {"kind": "pgn", "depth": 12, "pgn_hash": "abc"}
+
+def search(value):
+    return {"best_move": "e2e4", "evaluation": {"type": "cp", "value": value}, "depth": 12}
+
+def in_journal_dir(test):
+    """Run ``test`` with JOB_JOURNAL_DIR pointing at a fresh directory"""
+    def run():
+        previous = os.environ.get("JOB_JOURNAL_DIR")
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ["JOB_JOURNAL_DIR"] = directory
+            try:
+                test()
+            finally:
+                if previous is None:
+                    del os.environ["JOB_JOURNAL_DIR"]
+                else:
+                    os.environ["JOB_JOURNAL_DIR"] = previous
+    run.__name__ = test.__name__
+    return run
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+@in_journal_dir
+def test_resume_reloads_searches_and_games():
+    journal = JobJournal("job-1", JOB, fsync_interval=0)
+    journal.record_search(0xABC, search(10))
+    journal.record_search(0xDEF, {"error": "engine died"})
+    journal.record_game(3)
+    journal.close()
+
+    resumed = JobJournal("job-1", JOB, resume=True)
+    try:
+        assert resumed.resumed
+        assert resumed.searches == {0xABC: search(10)}
+        assert resumed.games == {3}
+        assert resumed.summary is None
+    finally:
+        resumed.close()
+
+@in_journal_dir
+def test_without_resume_the_journal_starts_over():
+    journal = JobJournal("job-1", JOB)
+    journal.record_search(1, search(10))
+    journal.close()
+    fresh = JobJournal("job-1", JOB)
+    fresh.close()
+    assert read_lines(journal_path("job-1")) == [{"job": "job-1", "version": 1, **JOB}]
+
+@in_journal_dir
+def test_torn_last_line_is_cut_off():
+    journal = JobJournal("job-1", JOB)
+    journal.record_search(1, search(10))
+    journal.record_search(2, search(20))
+    journal.close()
+    path = journal_path("job-1")
+    with open(path, "ab") as f:
+        f.write(b'{"k":"0000000000000003","s":{"best_mo')
+
+    resumed = JobJournal("job-1", JOB, resume=True)
+    assert set(resumed.searches) == {1, 2}
+    # New lines start on a line of their own
+    resumed.record_search(3, search(30))
+    resumed.close()
+    again = JobJournal("job-1", JOB, resume=True)
+    assert again.searches[3] == search(30)
+    again.close()
+
+def test_truncate_torn_line():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lines.ndjson")
+        with open(path, "wb") as f:
+            f.write(b'{"a":1}\n{"b":2}\n')
+        truncate_torn_line(path)
+        assert open(path, "rb").read() == b'{"a":1}\n{"b":2}\n'
+        with open(path, "ab") as f:
+            f.write(b'{"c":' + b"x" * 100000)
+        truncate_torn_line(path)
+        assert open(path, "rb").read() == b'{"a":1}\n{"b":2}\n'
+        with open(path, "wb") as f:
+            f.write(b'{"only partial')
+        truncate_torn_line(path)
+        assert open(path, "rb").read() == b""
+
+@in_journal_dir
+def test_compaction_keeps_needed_searches_and_games():
+    journal = JobJournal("job-1", JOB)
+    for key in range(1, 6):
+        journal.record_search(key, search(key))
+    journal.record_game(0)
+    journal.record_game(1)
+    assert journal.compact(keep={2, 4}) == 2
+    # The journal stays writable after the rename
+    journal.record_search(6, search(6))
+    journal.close()
+
+    lines = read_lines(journal_path("job-1"))
+    assert lines[0] == {"job": "job-1", "version": 1, **JOB}
+    assert lines[1] == {"g": [0, 1]}
+    assert [line["k"] for line in lines[2:]] == ["0000000000000002", "0000000000000004", "0000000000000006"]
+
+    resumed = JobJournal("job-1", JOB, resume=True)
+    assert set(resumed.searches) == {2, 4, 6}
+    assert resumed.games == {0, 1}
+    resumed.close()
+
+@in_journal_dir
+def test_final_compaction_records_the_summary():
+    journal = JobJournal("job-1", JOB)
+    journal.record_search(1, search(1))
+    journal.compact(keep=set(), summary={"success": True, "total_positions": 1})
+    journal.close()
+    resumed = JobJournal("job-1", JOB, resume=True)
+    assert resumed.searches == {}
+    assert resumed.summary == {"success": True, "total_positions": 1}
+    resumed.close()
+    assert not os.path.exists(journal_path("job-1") + ".tmp")
+
+@in_journal_dir
+def test_refuses_a_different_job_or_a_second_writer():
+    journal = JobJournal("job-1", JOB)
+    try:
+        JobJournal("job-1", JOB, resume=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a running job should not be opened twice")
+    journal.close()
+    try:
+        JobJournal("job-1", dict(JOB, depth=20), resume=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a journal of other parameters should not be resumed")
+
+def test_rejects_unsafe_job_ids():
+    for job_id in ("../escape", "", "a/b", ".hidden", None):
+        try:
+            journal_path(job_id)
+        except ValueError:
+            continue
+        raise AssertionError(f"{job_id!r} should be rejected")
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} job journal tests passed")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Side to move for placement-only openings.json entries, in opening_book.py.
+Run with pytest or directly: python test_opening_book.py
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import chess
+from opening_book import infer_side_to_move, book_positions
+
+def placement_after(moves):
+    board = chess.Board()
+    for move in moves.split():
+        board.push_san(move)
+    return board.board_fen(), "w" if board.turn == chess.WHITE else "b"
+
+def test_quiet_lines():
+    for moves in ("e4", "e4 e5", "d4 Nf6 c4 e6 Nc3 Bb4 e3 O-O"):
+        placement, side = placement_after(moves)
+        assert infer_side_to_move(placement) == side, moves
+    assert infer_side_to_move(chess.STARTING_BOARD_FEN) == "w"
+
+def test_lines_with_captures():
+    for moves in ("e4 e5 Nf3 Nc6 Bb5 a6 Bxc6 dxc6",
+                  "e4 d5 exd5 Qxd5 Nc3 Qa5",
+                  "e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3",
+                  "Nh3 d5 g3 e5 f4 Bxh3 Bxh3 exf4"):
+        placement, side = placement_after(moves)
+        assert infer_side_to_move(placement) == side, moves
+
+def test_unresolved_placement():
+    # White pawns on the back rank never come from the start position
+    assert infer_side_to_move("rnbqkbnr/pppppppp/8/8/8/8/8/PPPPPPPP") is None
+    assert infer_side_to_move("not a placement") is None
+
+def test_placement_only_entry_gets_one_side():
+    placement, _ = placement_after("e4 e5 Nf3")
+    boards = book_positions({"name": "King's Knight Opening", "fen": placement})
+    assert [board.fen() for board in boards] == ["rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 0 1"]
+
+def test_explicit_side_is_kept():
+    fen = "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    boards = book_positions({"name": "King's Knight Opening", "fen": fen})
+    assert [board.turn for board in boards] == [chess.BLACK]
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} opening book tests passed")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Positions answered without a search of their own: settled_result and
+forced_result in position_search.py.
+Run with pytest or directly: python test_position_rules.py
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import chess
+from position_search import settled_result, forced_result, forced_move, record_forced_move, SearchCounter
+
+# White to move, mated by the queen on h4 (fool's mate)
+MATED = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
+STALEMATE = "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1"
+BARE_KINGS_AND_BISHOP = "8/8/4k3/8/8/3KB3/8/8 w - - 0 1"
+# Black's king on h8 has one legal move, Kg8, and Ra8 mates after it
+FORCED = "7k/8/6K1/8/8/8/8/R7 b - - 0 1"
+
+def reply(score_type, value, **fields):
+    result = {"best_move": "a1a8", "ponder": None, "score_type": score_type, "score_value": value,
+              "depth": 10, "seldepth": 12, "nodes": 1000, "nps": 1000, "time_ms": 1, "pv": ["a1a8"]}
+    result.update(fields)
+    return result
+
+def test_checkmate_is_mate_zero():
+    settled = settled_result(chess.Board(MATED), 12)
+    assert (settled["score_type"], settled["score_value"]) == ("mate", 0)
+    assert settled["result"] == "0-1"
+    assert settled["terminal"] == "checkmate"
+    assert settled["best_move"] is None and settled["pv"] == []
+    assert settled["depth"] == 12
+
+def test_stalemate_is_drawn():
+    settled = settled_result(chess.Board(STALEMATE), 8)
+    assert (settled["score_type"], settled["score_value"], settled["result"]) == ("cp", 0, "1/2-1/2")
+    assert settled["terminal"] == "stalemate"
+
+def test_insufficient_material_keeps_a_move():
+    board = chess.Board(BARE_KINGS_AND_BISHOP)
+    settled = settled_result(board, 8)
+    assert settled["terminal"] == "insufficient material"
+    assert chess.Move.from_uci(settled["best_move"]) in board.legal_moves
+    assert settled["pv"] == [settled["best_move"]]
+
+def test_history_draw_only_when_given():
+    board = chess.Board()
+    assert settled_result(board, 8) is None
+    settled = settled_result(board, 8, draw="threefold repetition")
+    assert (settled["terminal"], settled["result"], settled["score_value"]) == ("threefold repetition", "1/2-1/2", 0)
+    # The rules come first: a mate stays a mate whatever the history says
+    assert settled_result(chess.Board(MATED), 8, draw="fifty-move rule")["terminal"] == "checkmate"
+
+def test_forced_move():
+    assert forced_move(chess.Board(FORCED)) == chess.Move.from_uci("h8g8")
+    assert forced_move(chess.Board()) is None
+    assert forced_move(chess.Board(MATED)) is None
+
+def test_forced_result_flips_centipawns():
+    move = chess.Move.from_uci("h8g8")
+    result = forced_result(FORCED, move, reply("cp", 250, opening="x", terminal="y"))
+    assert result["score_value"] == -250
+    assert result["evaluation"] == {"type": "cp", "value": 250}
+    assert result["best_move"] == "h8g8" and result["ponder"] == "a1a8"
+    assert result["pv"] == ["h8g8", "a1a8"]
+    assert result["depth"] == 11
+    assert result["forced"] is True
+    assert "opening" not in result and "terminal" not in result
+
+def test_forced_result_flips_mates():
+    move = chess.Move.from_uci("h8g8")
+    # Mating in 3 after the move: the mover is mated in 3
+    assert forced_result(FORCED, move, reply("mate", 3))["score_value"] == -3
+    # Mated in 2 after the move: the mover mates in 3
+    assert forced_result(FORCED, move, reply("mate", -2))["score_value"] == 3
+    # Mated on the board after the move: the move itself mates
+    mated = forced_result(FORCED, move, reply("mate", 0, result="1-0", terminal="checkmate"))
+    assert mated["score_value"] == 1
+    assert "result" not in mated
+    # Black to move, so a black mate is negative for white
+    assert mated["evaluation"] == {"type": "mate", "value": -1}
+
+def test_record_forced_move_counts_shared_searches():
+    counter = SearchCounter()
+    move = chess.Move.from_uci("h8g8")
+    record_forced_move(FORCED, move, reply("cp", 10, source="engine"), counter)
+    record_forced_move(FORCED, move, reply("cp", 10, source="cache"), counter)
+    assert counter.snapshot() == {"forced": 2, "forced_shared": 1}
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} position rule tests passed")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tablebase wins on the frontend's mate scale, in ultra_fast_pgn_analyzer.py.
+Run with pytest or directly: python test_tablebase_scores.py
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+from tablebase import TB_WIN_CP
+from ultra_fast_pgn_analyzer import search_to_raw
+
+def search(score_type, value):
+    return {"evaluation": {"type": score_type, "value": value}}
+
+def test_tablebase_win_counts_as_mate():
+    assert search_to_raw(search("cp", TB_WIN_CP - 12)) == 1000
+    assert search_to_raw(search("cp", -TB_WIN_CP + 12)) == -1000
+    # An engine probing SyzygyPath reports 20000 less the plies to the table
+    assert search_to_raw(search("cp", 19950)) == 1000
+
+def test_ordinary_scores_are_unchanged():
+    assert search_to_raw(search("cp", 35)) == 35
+    assert search_to_raw(search("cp", -1450)) == -1450
+
+def test_mate_tablebase_mate_plies_do_not_swing():
+    plies = [
+        search("mate", 7),                # engine finds a long mate
+        search("cp", TB_WIN_CP - 9),      # tablebase answers the next position
+        search("cp", 19980),              # engine search hitting the tables
+        search("mate", 3),
+        {"evaluation": {"type": "mate", "value": 0}, "result": "1-0"},
+    ]
+    raw = [search_to_raw(ply) for ply in plies]
+    assert raw == [1000] * len(plies)
+
+def test_losing_side_sequence():
+    plies = [search("mate", -5), search("cp", -TB_WIN_CP + 30), search("mate", -2)]
+    assert [search_to_raw(ply) for ply in plies] == [-1000, -1000, -1000]
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} tablebase score tests passed")
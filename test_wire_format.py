@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Columnar result frames: encode_columns / decode_columns in wire_format.py.
+Run with pytest or directly: python test_wire_format.py
+"""
+
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+from wire_format import encode_columns, decode_columns, COLUMNS_HEADER
+
+def ply(move_number, **fields):
+    result = {
+        "move_number": move_number,
+        "fen": f"fen {move_number}",
+        "best_move": "e2e4",
+        "evaluation": 35,
+        "previous_position_evaluation": 20,
+        "move_played_evaluation": -10,
+        "best_move_evaluation": 35,
+        "depth": 18,
+        "pv": ["e2e4", "e7e5", "g1f3"],
+        "opening": None,
+        "terminal": None,
+        "worker_id": "engine-1",
+        "move_played": "e4",
+        "success": True,
+    }
+    result.update(fields)
+    return result
+
+def without_fen(plies):
+    return [{name: value for name, value in p.items() if name != "fen"} for p in plies]
+
+def message(results):
+    return {"id": 7, "ok": True, "result": {"success": True, "total_positions": len(results), "results": results}}
+
+def test_round_trip():
+    plies = [
+        ply(0, fen="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", best_move=None,
+            previous_position_evaluation=0, move_played_evaluation=None, best_move_evaluation=None, move_played=None),
+        ply(1, opening="King's Pawn Game", worker_id="engine-2"),
+        ply(2, best_move="a7a8q", pv=["a7a8q", "h7h8n"], evaluation=-1000, terminal="checkmate", move_played="Qxf7#"),
+        {"move_number": 3, "fen": "fen 3", "error": "Engine timeout", "worker_id": "engine-1", "success": False},
+        ply(4, pv=[], depth=0),
+    ]
+    decoded = decode_columns(encode_columns(message(plies)))
+    assert decoded["id"] == 7 and decoded["ok"] is True
+    assert decoded["result"]["total_positions"] == 5
+    assert decoded["result"]["results"] == without_fen(plies)
+
+def test_dict_results_come_back_in_game_order():
+    plies = {"2": ply(2), "0": ply(0), "10": ply(10), "1": ply(1)}
+    payload = encode_columns(message(plies))
+    numbers = [p["move_number"] for p in decode_columns(payload)["result"]["results"]]
+    assert numbers == [0, 1, 2, 10]
+
+def test_columns_are_aligned_and_strings_shared():
+    plies = [ply(i, worker_id=f"engine-{i % 2}") for i in range(6)]
+    payload = encode_columns(message(plies))
+    _, _, _, meta_length = COLUMNS_HEADER.unpack_from(payload, 0)
+    assert meta_length % 4 == 0
+    assert len(payload) % 4 == 0
+    meta = json.loads(payload[COLUMNS_HEADER.size:COLUMNS_HEADER.size + meta_length])
+    # Every repeated string is stored once
+    assert sorted(meta["columns"]["dictionary"]) == ["e4", "engine-0", "engine-1"]
+    assert all(offset % 4 == 0 for _, _, offset, _ in meta["columns"]["layout"])
+
+def test_other_key_and_empty_results():
+    original = {"type": "final", "payload": {"job_id": "x", "results": []}}
+    decoded = decode_columns(encode_columns(original, key="payload"), key="payload")
+    assert decoded == {"type": "final", "payload": {"job_id": "x", "results": []}}
+
+def test_rejects_other_payloads():
+    payload = bytearray(encode_columns(message([ply(0)])))
+    payload[0:4] = b"JSON"
+    try:
+        decode_columns(bytes(payload))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a payload without the magic should be rejected")
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} wire format tests passed")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+CPU list and cgroup quota parsing, and CPU set assignment, in worker_placement.py.
+Run with pytest or directly: python test_worker_placement.py
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import worker_placement
+from worker_placement import parse_cpu_list, cgroup_cpu_limit, _assign_cpu_sets, plan_placement, clear_placement_cache
+
+def write_files(root, files):
+    for name, text in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as handle:
+            handle.write(text)
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpu_list("5") == [5]
+    assert parse_cpu_list("") == []
+
+def test_cgroup_v2_quota():
+    with tempfile.TemporaryDirectory() as root:
+        write_files(root, {"cpu.max": "250000 100000\n"})
+        assert cgroup_cpu_limit(root) == 2.5
+
+def test_cgroup_v2_unlimited():
+    with tempfile.TemporaryDirectory() as root:
+        write_files(root, {"cpu.max": "max 100000\n"})
+        assert cgroup_cpu_limit(root) is None
+
+def test_cgroup_v1_quota():
+    with tempfile.TemporaryDirectory() as root:
+        write_files(root, {"cpu/cpu.cfs_quota_us": "400000\n", "cpu/cpu.cfs_period_us": "100000\n"})
+        assert cgroup_cpu_limit(root) == 4.0
+
+def test_cgroup_v1_unlimited():
+    with tempfile.TemporaryDirectory() as root:
+        write_files(root, {"cpu/cpu.cfs_quota_us": "-1\n", "cpu/cpu.cfs_period_us": "100000\n"})
+        assert cgroup_cpu_limit(root) is None
+
+def test_no_cgroup_files():
+    with tempfile.TemporaryDirectory() as root:
+        assert cgroup_cpu_limit(root) is None
+
+def test_cpu_sets_stay_on_one_numa_node():
+    nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+    assert _assign_cpu_sets(nodes, 8, 1) == [[cpu] for cpu in range(8)]
+    assert _assign_cpu_sets(nodes, 8, 4) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    # A quota of 6 cores leaves the second node two CPUs
+    assert _assign_cpu_sets(nodes, 6, 2) == [[0, 1], [2, 3], [4, 5]]
+
+def test_cpu_sets_wider_than_a_node():
+    nodes = {0: [0, 1], 1: [2, 3]}
+    assert _assign_cpu_sets(nodes, 4, 4) == [[0, 1, 2, 3]]
+
+def test_plan_is_probed_once():
+    clear_placement_cache()
+    probes = []
+    original = worker_placement.usable_core_count
+
+    def counting_usable_core_count():
+        probes.append(1)
+        return original()
+
+    worker_placement.usable_core_count = counting_usable_core_count
+    try:
+        first = plan_placement("throughput")
+        second = plan_placement("throughput")
+        assert first is second
+        assert len(probes) == 1
+        plan_placement("latency")
+        assert len(probes) == 2
+    finally:
+        worker_placement.usable_core_count = original
+        clear_placement_cache()
+
+if __name__ == "__main__":
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"All {len(tests)} worker placement tests passed")